@@ -0,0 +1,108 @@
+# Load shedding under a traffic spike: a burst of analyses of different pages hits an LLM that allows only a few
+# concurrent calls and fails the others like a quota error. Without admission control every request calls the LLM and
+# the retries add to the overload, with it the calls are capped, some requests wait in the queue and the rest get a
+# 503 right away. Reports successes, failures, shed requests, LLM calls and latencies per outcome.
+#
+#   python -m benchmarks.bench_admission [requests]
+
+import asyncio
+import logging
+import sys
+import time
+from collections import defaultdict
+
+from fastapi import HTTPException
+
+from benchmarks.util import FakeGeminiClient, percentile
+from biasight.admission import AdmissionController
+from biasight.bias import BiasAnalyzer
+from biasight.cache import ContentCache, MemoryCacheBackend
+from biasight.limit import RateLimiter
+from biasight.notify import NoopNotifier
+from biasight.parse import ParsedPage
+from biasight.resilience import RetryPolicy
+from biasight.service import AnalysisService
+
+QUOTA = 8
+LLM_LATENCY = 0.2
+
+
+class QuotaError(Exception):
+    pass
+
+
+# fails calls beyond QUOTA concurrent ones after a short delay, like a quota error of the LLM API
+class QuotaGeminiClient(FakeGeminiClient):
+
+    def __init__(self):
+        super().__init__(LLM_LATENCY)
+        self.running = 0
+
+    async def get_chat_response_async(self, chat, prompt: str) -> str:
+        if self.running >= QUOTA:
+            self.calls += 1
+            await asyncio.sleep(0.02)
+            raise QuotaError('Quota exceeded')
+        self.running += 1
+        try:
+            return await super().get_chat_response_async(chat, prompt)
+        finally:
+            self.running -= 1
+
+
+class FakeWebParser:
+
+    async def parse_page(self, uri: str) -> ParsedPage:
+        return ParsedPage(uri, f'Text of {uri}')
+
+
+async def run(admission: AdmissionController | None, requests: int) -> tuple[dict[str, list[float]], int]:
+    client = QuotaGeminiClient()
+    bias_analyzer = BiasAnalyzer(client, retry_policy=RetryPolicy('LLM call', attempts=3, base_delay=0.2, seed=1))
+    service = AnalysisService(
+        FakeWebParser(),
+        bias_analyzer,
+        RateLimiter(10 ** 9),
+        NoopNotifier(),
+        MemoryCacheBackend(requests, 60),
+        ContentCache(MemoryCacheBackend(requests, 60), 'model', bias_analyzer.prompt_fingerprint),
+        admission=admission
+    )
+    latencies = defaultdict(list)
+
+    async def analyze(i: int):
+        start = time.perf_counter()
+        try:
+            await service.analyze(f'https://example.com/{i}')
+            outcome = 'ok'
+        except HTTPException as e:
+            outcome = 'shed' if e.status_code == 503 else 'failed'
+        latencies[outcome].append(time.perf_counter() - start)
+
+    await asyncio.gather(*(analyze(i) for i in range(requests)))
+    return latencies, client.calls
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    # every shed request and retry is logged
+    logging.disable(logging.WARNING)
+
+    print(f'{"admission":<16} {"ok":>5} {"failed":>7} {"shed":>5} {"LLM calls":>10} {"ok p50 ms":>10} '
+          f'{"ok p99 ms":>10} {"shed p99 ms":>12}')
+    for name, admission in [
+        ('off', None),
+        (f'{QUOTA} slots', AdmissionController(QUOTA, queue_size=64, max_wait=5.0)),
+        (f'{QUOTA} slots, 1 s', AdmissionController(QUOTA, queue_size=64, max_wait=1.0))
+    ]:
+        latencies, calls = asyncio.run(run(admission, requests))
+        ok, shed = latencies['ok'], latencies['shed']
+        print(
+            f'{name:<16} {len(ok):>5} {len(latencies["failed"]):>7} {len(shed):>5} {calls:>10} '
+            f'{percentile(ok, 50) * 1000 if ok else 0:>10.0f} {percentile(ok, 99) * 1000 if ok else 0:>10.0f} '
+            f'{percentile(shed, 99) * 1000 if shed else 0:>12.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
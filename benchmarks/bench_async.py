@@ -0,0 +1,78 @@
+# Compares how many concurrent /analyze requests a single worker sustains with the sync (threadpool) pipeline
+# versus the async pipeline. Fetch and LLM latency are simulated locally, so no GCP access is needed.
+#
+#   python -m benchmarks.bench_async
+
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.util import FakeGeminiClient, percentile, serve_pages
+from biasight.bias import BiasAnalyzer
+from biasight.model import AnalyzeRequest, AnalyzeResponse
+from biasight.parse import AsyncWebParser, WebParser
+
+FETCH_LATENCY = 0.05
+LLM_LATENCY = 2.0
+CONCURRENCY_LEVELS = [10, 40, 80, 160, 320]
+PAGE = ('<html><body><main>' + '<p>She and he both work as engineers.</p>' * 20 + '</main></body></html>').encode()
+
+
+def create_sync_app(uri: str) -> FastAPI:
+    app = FastAPI()
+    web_parser = WebParser(1048576, 8192)
+    bias_analyzer = BiasAnalyzer(FakeGeminiClient(LLM_LATENCY))
+
+    @app.post('/analyze')
+    def analyze(analyze_request: AnalyzeRequest) -> AnalyzeResponse:
+        text = web_parser.parse(uri)
+        return AnalyzeResponse(uri=analyze_request.uri, result=bias_analyzer.analyze(text))
+
+    return app
+
+
+def create_async_app(uri: str) -> FastAPI:
+    app = FastAPI()
+    web_parser = AsyncWebParser(1048576, 8192, httpx.AsyncClient(limits=httpx.Limits(max_connections=None)))
+    bias_analyzer = BiasAnalyzer(FakeGeminiClient(LLM_LATENCY))
+
+    @app.post('/analyze')
+    async def analyze(analyze_request: AnalyzeRequest) -> AnalyzeResponse:
+        text = await web_parser.parse(uri)
+        return AnalyzeResponse(uri=analyze_request.uri, result=await bias_analyzer.analyze_async(text))
+
+    return app
+
+
+async def run_level(app: FastAPI, concurrency: int) -> tuple[float, list[float]]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        async def one(i: int) -> float:
+            start = time.perf_counter()
+            response = await client.post('/analyze', json={'uri': f'https://example.com/{i}'})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        return time.perf_counter() - start, list(latencies)
+
+
+def main():
+    with serve_pages({'/': PAGE}, latency=FETCH_LATENCY) as base_url:
+        print(f'simulated fetch latency {FETCH_LATENCY * 1000:.0f} ms, LLM latency {LLM_LATENCY * 1000:.0f} ms')
+        print(f'{"pipeline":<8} {"concurrency":>11} {"wall s":>8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8}')
+
+        for name, factory in [('sync', create_sync_app), ('async', create_async_app)]:
+            for concurrency in CONCURRENCY_LEVELS:
+                wall, latencies = asyncio.run(run_level(factory(base_url + '/'), concurrency))
+                print(
+                    f'{name:<8} {concurrency:>11} {wall:>8.2f} {concurrency / wall:>8.1f} '
+                    f'{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 99) * 1000:>8.0f}'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Throughput of the bulk CLI pipeline: pages of the checked-in corpus are served locally under many URIs and
+# analyzed with a simulated LLM, extracting on the event loop versus in process pools of increasing size. With
+# extraction on the event loop, the parsing of large pages holds up the downloads and the LLM calls; with a pool it
+# runs next to them on the other cores. Prints the stage summary of every run.
+#
+#   python -m benchmarks.bench_batch [pages]
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from benchmarks.suite import load_corpus
+from benchmarks.util import FakeGeminiClient, serve_pages
+from biasight.batch import BatchAnalysis
+from biasight.bias import BiasAnalyzer
+from biasight.clean import ContentCleaner
+from biasight.parse import AsyncWebParser
+
+LLM_LATENCY = 0.5
+LLM_CONCURRENCY = 32
+
+
+async def run(base: str, paths: list[str], processes: int, output_path: str) -> tuple[BatchAnalysis, float]:
+    web_parser = AsyncWebParser(
+        1048576,
+        8192,
+        httpx.AsyncClient(limits=httpx.Limits(max_connections=None)),
+        max_connections_per_host=64
+    )
+    executor = ProcessPoolExecutor(processes) if processes else None
+    batch = BatchAnalysis(
+        web_parser,
+        BiasAnalyzer(FakeGeminiClient(LLM_LATENCY)),
+        output_path,
+        content_cleaner=ContentCleaner(),
+        executor=executor,
+        fetch_concurrency=64,
+        extract_concurrency=processes or 1,
+        analyze_concurrency=LLM_CONCURRENCY
+    )
+    start = time.perf_counter()
+    await batch.run(base + path for path in paths)
+    seconds = time.perf_counter() - start
+
+    if executor:
+        executor.shutdown()
+    await web_parser.aclose()
+    return batch, seconds
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    # every failed page and the progress are logged
+    logging.disable(logging.WARNING)
+
+    corpus = load_corpus()
+    # the same pages under different paths, query strings make every URI distinct
+    served = {f'/{name}': content for name, content in corpus.items()}
+    paths = [f'/{name}?copy={i}' for i in range(pages // len(corpus) + 1) for name in corpus][:pages]
+    print(f'{len(paths)} pages, {sum(map(len, corpus.values())) // len(corpus) // 1024} KB on average, '
+          f'LLM latency {LLM_LATENCY} s with {LLM_CONCURRENCY} concurrent calls, {os.cpu_count()} CPUs\n')
+
+    with serve_pages(served) as base, tempfile.TemporaryDirectory() as directory:
+        for processes in sorted({0, 1, 2, os.cpu_count() or 1}):
+            output_path = os.path.join(directory, f'{processes}.jsonl')
+            batch, seconds = asyncio.run(run(base, paths, processes, output_path))
+            print(f'{processes} processes' if processes else 'event loop')
+            print(batch.summary(seconds) + '\n')
+
+
+if __name__ == '__main__':
+    main()
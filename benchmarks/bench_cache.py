@@ -0,0 +1,85 @@
+# Compares the in-process TTLCache holding AnalyzeResponse objects with the pluggable cache backends at 100k+
+# entries: write throughput while filling the cache and hit latency including (de)serialization.
+#
+#   python -m benchmarks.bench_cache [entries]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from cachetools import TTLCache
+
+from benchmarks.util import FAKE_RESULT, percentile
+from biasight.cache import MemoryCacheBackend, SQLiteCacheBackend
+from biasight.model import AnalyzeResponse, AnalyzeResult
+
+LOOKUPS = 20000
+
+
+def create_response(i: int) -> AnalyzeResponse:
+    # realistic feedback texts make an entry roughly 3 KB of JSON
+    result = dict(FAKE_RESULT, summary=f'Summary {i} ' + 'lorem ipsum dolor sit amet ' * 20)
+    for field in ['stereotyping', 'representation', 'language', 'framing']:
+        result[f'{field}_feedback'] = 'feedback ' * 40
+        result[f'{field}_example'] = 'example ' * 15
+    return AnalyzeResponse(uri=f'https://example.com/{i}', result=AnalyzeResult.model_validate(result))
+
+
+def bench_ttlcache(responses: list[AnalyzeResponse]) -> tuple[float, list[float]]:
+    cache = TTLCache(maxsize=len(responses), ttl=3600)
+
+    start = time.perf_counter()
+    for response in responses:
+        cache[response.uri] = response
+    write = time.perf_counter() - start
+
+    latencies = []
+    for response in random.sample(responses, LOOKUPS):
+        start = time.perf_counter()
+        cache.get(response.uri)
+        latencies.append(time.perf_counter() - start)
+    return write, latencies
+
+
+def bench_backend(backend, responses: list[AnalyzeResponse]) -> tuple[float, list[float]]:
+    start = time.perf_counter()
+    for response in responses:
+        backend.set(response.uri, response.model_dump_json().encode())
+    write = time.perf_counter() - start
+
+    latencies = []
+    for response in random.sample(responses, LOOKUPS):
+        start = time.perf_counter()
+        AnalyzeResponse.model_validate_json(backend.get(response.uri))
+        latencies.append(time.perf_counter() - start)
+    return write, latencies
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(42)
+    responses = [create_response(i) for i in range(entries)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cache.db')
+        runs = [
+            ('TTLCache (objects)', lambda: bench_ttlcache(responses)),
+            ('memory backend', lambda: bench_backend(MemoryCacheBackend(entries, 3600), responses)),
+            ('sqlite backend', lambda: bench_backend(SQLiteCacheBackend(path, 'results', entries, 2 ** 40, 3600), responses)),
+        ]
+
+        print(f'{entries} entries, {LOOKUPS} random hits')
+        print(f'{"cache":<20} {"writes/s":>10} {"hit p50 us":>11} {"hit p99 us":>11}')
+        for name, run in runs:
+            write, latencies = run()
+            print(
+                f'{name:<20} {entries / write:>10.0f} '
+                f'{percentile(latencies, 50) * 1e6:>11.1f} {percentile(latencies, 99) * 1e6:>11.1f}'
+            )
+        print(f'sqlite file size: {os.path.getsize(path) / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# Wall-clock time of BiasAnalyzer.analyze_async against page size, with a single prompt versus chunked map-reduce.
+# The fake LLM takes a fixed overhead plus time proportional to the prompt size.
+#
+#   python -m benchmarks.bench_chunking
+
+import asyncio
+import time
+
+from benchmarks.util import FakeGeminiClient
+from biasight.bias import BiasAnalyzer
+
+LLM_LATENCY = 0.3
+# 100k prompt tokens take 5 seconds
+LLM_LATENCY_PER_TOKEN = 0.00005
+CHUNK_TOKENS = 16000
+SENTENCE = 'The chairman thanked every engineer, whether she or he worked on the bridge. '
+
+
+async def measure(bias_analyzer: BiasAnalyzer, text: str) -> float:
+    start = time.perf_counter()
+    await bias_analyzer.analyze_async(text)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f'{"text KiB":>9} {"tokens":>8} {"chunks":>7} {"single s":>9} {"chunked s":>10}')
+    for sentences in [500, 2000, 8000, 16000, 32000]:
+        text = SENTENCE * sentences
+        single = BiasAnalyzer(FakeGeminiClient(LLM_LATENCY, LLM_LATENCY_PER_TOKEN))
+        chunked = BiasAnalyzer(FakeGeminiClient(LLM_LATENCY, LLM_LATENCY_PER_TOKEN), chunk_tokens=CHUNK_TOKENS, chunk_concurrency=8)
+
+        single_time = asyncio.run(measure(single, text))
+        chunked_time = asyncio.run(measure(chunked, text))
+        print(
+            f'{len(text) / 1024:>9.0f} {len(text) // 4:>8} {len(chunked._split_text(text)):>7} '
+            f'{single_time:>9.2f} {chunked_time:>10.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# Size reduction and time cost of the ContentCleaner preprocessing stage on a corpus of generated pages, modelled
+# after common layouts: a news article, a blog post with comments, a product listing and a careers page. Every page
+# carries a cookie banner, a menu, related links and a footer around its main content.
+#
+#   python -m benchmarks.bench_clean
+
+import random
+import statistics
+import time
+
+from biasight.clean import ContentCleaner
+from biasight.extract import TextExtractor
+from biasight.parse import ParsedPage
+
+WORDS = (
+    'the team engineer nurse manager she he they chairman chairperson worked built designed led supported hired '
+    'project community families customers report quarter growth results leadership care strong gentle decisive '
+    'policy service research market school hospital office field data workers everyone people staff members'
+).split()
+
+CHROME = (
+    '<div id="cookie-consent"><p>We use cookies to personalise content and ads, to provide social media features '
+    'and to analyse our traffic. By continuing to use this site you agree to our cookie policy.</p>'
+    '<button>Accept all</button><button>Settings</button></div>'
+    '<div class="site-menu"><ul>{menu}</ul></div>'
+    '<div class="breadcrumbs"><a href="/">Home</a> / <a href="/news">News</a></div>'
+    '<main>{content}</main>'
+    '<aside class="sidebar"><h3>Most read</h3><ul>{related}</ul></aside>'
+    '<div class="newsletter"><p>Sign up for our weekly newsletter and never miss a story from our editors.</p></div>'
+    '<div class="links"><a href="/imprint">Imprint</a> <a href="/privacy">Privacy</a> <a href="/terms">Terms</a> '
+    '<a href="/contact">Contact</a></div>'
+)
+
+
+def sentence(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+
+
+def paragraph(rng: random.Random) -> str:
+    return ' '.join(sentence(rng) for _ in range(rng.randint(2, 6)))
+
+
+def article(rng: random.Random) -> str:
+    paragraphs = ''.join(f'<p>{paragraph(rng)}</p>' for _ in range(rng.randint(5, 30)))
+    return f'<article><h1>{sentence(rng)}</h1>{paragraphs}</article>'
+
+
+def blog_post(rng: random.Random) -> str:
+    comments = ''.join(
+        f'<div class="comment"><p>{sentence(rng)}</p><a href="/reply">Reply</a></div>' for _ in range(rng.randint(3, 20))
+    )
+    share = '<div class="share-buttons"><a href="#">Share on X</a> <a href="#">Share on LinkedIn</a></div>'
+    return article(rng) + share + f'<section class="comments">{comments}</section>'
+
+
+def listing(rng: random.Random) -> str:
+    cards = ''.join(
+        f'<div class="card"><h2>Product {i}</h2><p>Designed for every engineer, whether she or he works in the field '
+        f'or the office. Rated {rng.randint(1, 5)} of 5.</p><a href="/p/{i}">Details</a></div>'
+        for i in range(rng.randint(10, 60))
+    )
+    return f'<h1>{sentence(rng)}</h1><p>{paragraph(rng)}</p>{cards}'
+
+
+def careers(rng: random.Random) -> str:
+    jobs = ''.join(
+        f'<li><a href="/jobs/{i}">{" ".join(rng.choice(WORDS) for _ in range(3)).title()}</a></li>' for i in range(15)
+    )
+    sections = ''.join(
+        f'<h2>{sentence(rng)}</h2><p>{paragraph(rng)}</p><ul><li>{sentence(rng)}</li><li>{sentence(rng)}</li></ul>'
+        for _ in range(rng.randint(2, 6))
+    )
+    return f'{sections}<h2>Open positions</h2><ul class="jobs">{jobs}</ul>'
+
+
+def create_corpus(pages: int) -> list[str]:
+    rng = random.Random(42)
+    layouts = [article, blog_post, listing, careers]
+    corpus = []
+    for i in range(pages):
+        menu = ''.join(f'<li><a href="/s/{j}">{rng.choice(WORDS).title()}</a></li>' for j in range(12))
+        related = ''.join(f'<li><a href="/r/{j}">{sentence(rng)}</a></li>' for j in range(8))
+        content = layouts[i % len(layouts)](rng)
+        corpus.append('<html><body>' + CHROME.format(menu=menu, content=content, related=related) + '</body></html>')
+    return corpus
+
+
+def main():
+    corpus = create_corpus(200)
+    cleaner = ContentCleaner()
+
+    reductions = []
+    extract_times = []
+    clean_times = []
+    saved_tokens = 0
+    for html_content in corpus:
+        start = time.perf_counter()
+        extractor = TextExtractor()
+        extractor.feed(html_content)
+        extractor.close()
+        extracted = time.perf_counter()
+
+        cleaned = cleaner.clean(ParsedPage('https://example.com/', extractor.text, extractor.links, extractor.blocks))
+        extract_times.append(extracted - start)
+        clean_times.append(time.perf_counter() - extracted)
+
+        reductions.append(cleaned.saved_characters / len(extractor.text))
+        saved_tokens += cleaned.saved_tokens
+
+    print(f'pages: {len(corpus)}')
+    print(f'characters: {cleaner.original_characters} -> {cleaner.original_characters - cleaner.saved_characters} '
+          f'({cleaner.reduction:.1%} saved, ~{saved_tokens} tokens, ~{saved_tokens // len(corpus)} per page)')
+    print(f'reduction per page: median {statistics.median(reductions):.1%}, '
+          f'min {min(reductions):.1%}, max {max(reductions):.1%}')
+    print(f'extract ms per page: median {statistics.median(extract_times) * 1000:.2f}')
+    print(f'clean ms per page: median {statistics.median(clean_times) * 1000:.2f}, '
+          f'max {max(clean_times) * 1000:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Compares BeautifulSoup extraction (WebParser._text_from_html) with the streaming TextExtractor on generated pages:
+# wall time and peak traced memory per page.
+#
+#   python -m benchmarks.bench_extract
+
+import time
+import tracemalloc
+
+from biasight.extract import TextExtractor
+from biasight.parse import WebParser
+
+CHUNK_SIZE = 8192
+
+
+def create_page(cards: int) -> str:
+    card = (
+        '<div class="card"><h2 class="title">Product {i}</h2><p>Designed for every engineer, whether she or he '
+        'works in the field or the office. <a href="/p/{i}">Details</a></p><span aria-hidden="true">*</span>'
+        '<script>track({i});</script></div>'
+    )
+    return '<html><head><title>Shop</title></head><body>' + ''.join(card.format(i=i) for i in range(cards)) + '</body></html>'
+
+
+def soup(html_content: str) -> str:
+    return WebParser._text_from_html(html_content)
+
+
+def streaming(html_content: str) -> str:
+    extractor = TextExtractor()
+    for i in range(0, len(html_content), CHUNK_SIZE):
+        extractor.feed(html_content[i:i + CHUNK_SIZE])
+    extractor.close()
+    return extractor.text
+
+
+def measure(extract, html_content: str) -> tuple[float, int]:
+    start = time.perf_counter()
+    extract(html_content)
+    elapsed = time.perf_counter() - start
+
+    # memory is traced in a separate run, tracing slows down allocation heavy code considerably
+    tracemalloc.start()
+    extract(html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    print(f'{"page KiB":>9} {"soup ms":>9} {"soup MiB":>9} {"stream ms":>10} {"stream MiB":>11}')
+    for cards in [100, 1000, 5000, 15000]:
+        html_content = create_page(cards)
+        assert soup(html_content) == streaming(html_content)
+        soup_time, soup_peak = measure(soup, html_content)
+        stream_time, stream_peak = measure(streaming, html_content)
+        print(
+            f'{len(html_content) / 1024:>9.0f} {soup_time * 1000:>9.1f} {soup_peak / 2 ** 20:>9.1f} '
+            f'{stream_time * 1000:>10.1f} {stream_peak / 2 ** 20:>11.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
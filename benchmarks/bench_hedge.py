@@ -0,0 +1,50 @@
+# Tail latency of LLM calls with and without hedging. The replay backend draws latencies from a heavy tailed
+# log-normal distribution, the hedger starts a second call once a call is slower than the given percentile of recent
+# calls. Reports latency percentiles and the share of extra LLM calls.
+#
+#   python -m benchmarks.bench_hedge [calls]
+
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks.util import FAKE_RESULT, percentile
+from biasight.bias import BiasAnalyzer
+from biasight.llm import ReplayBackend
+from biasight.resilience import Hedger
+
+CONCURRENCY = 20
+
+
+async def run(hedger: Hedger | None, calls: int) -> tuple[list[float], int]:
+    backend = ReplayBackend([(None, json.dumps(FAKE_RESULT))], latency=0.1, latency_sigma=0.8, token_rate=0, seed=1)
+    bias_analyzer = BiasAnalyzer(backend, hedger=hedger)
+    slots = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def call(i: int):
+        async with slots:
+            start = time.perf_counter()
+            await bias_analyzer.analyze_async(f'Page {i}')
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(call(i) for i in range(calls)))
+    return latencies, backend.calls
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    print(f'{"hedging":<10} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8} {"LLM calls":>10}')
+    for name, hedger in [('off', None), ('p90', Hedger(90)), ('p95', Hedger(95))]:
+        latencies, llm_calls = asyncio.run(run(hedger, calls))
+        print(
+            f'{name:<10} {percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 95) * 1000:>8.0f} '
+            f'{percentile(latencies, 99) * 1000:>8.0f} {max(latencies) * 1000:>8.0f} '
+            f'{llm_calls:>6} ({llm_calls / calls - 1:+.0%})'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# Result cache hits of /analyze: memory per cached entry and the time the app spends on a hit, for entries held as
+# AnalyzeResponse objects, as JSON validated into a response model that FastAPI serializes again (before) and as JSON
+# sent as it is, plain or compressed (after). Hits go through a FastAPI app in process, the time is measured around
+# the ASGI call, so the HTTP client is not part of it. The variants take turns in several rounds, so a noisy moment
+# does not favor one of them. Entries hold the recorded LLM replies, filler text would compress unrealistically well.
+#
+#   python -m benchmarks.bench_hits [entries]
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import httpx
+from cachetools import TTLCache
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from benchmarks.util import FakeGeminiClient, percentile
+from biasight.bias import BiasAnalyzer
+from biasight.cache import CacheBackend, CompressedCacheBackend, ContentCache, MemoryCacheBackend
+from biasight.limit import RateLimiter
+from biasight.model import AnalyzeRequest, AnalyzeResponse, AnalyzeResult
+from biasight.notify import NoopNotifier
+from biasight.service import AnalysisService
+
+RECORDINGS_PATH = os.path.join(os.path.dirname(__file__), 'recordings', 'responses.jsonl')
+HITS = 20000
+ROUNDS = 5
+
+
+def create_responses(entries: int) -> list[AnalyzeResponse]:
+    with open(RECORDINGS_PATH) as f:
+        results = [AnalyzeResult.model_validate_json(json.loads(line)['response']) for line in f]
+    return [
+        AnalyzeResponse(uri=f'https://example.com/{i}', result=results[i % len(results)]) for i in range(entries)
+    ]
+
+
+def create_service(result_cache: CacheBackend) -> AnalysisService:
+    bias_analyzer = BiasAnalyzer(FakeGeminiClient(0))
+    return AnalysisService(
+        None,
+        bias_analyzer,
+        RateLimiter(10 ** 9),
+        NoopNotifier(),
+        result_cache,
+        ContentCache(MemoryCacheBackend(1, 60), 'model', bias_analyzer.prompt_fingerprint)
+    )
+
+
+def create_app(variant: str, cache) -> FastAPI:
+    app = FastAPI()
+
+    if variant == 'objects':
+        @app.post('/analyze')
+        async def analyze_objects(analyze_request: AnalyzeRequest) -> AnalyzeResponse:
+            return cache[analyze_request.uri].model_copy(update={'uri': analyze_request.uri})
+    elif variant == 'validated':
+        service = create_service(cache)
+
+        @app.post('/analyze')
+        async def analyze_validated(analyze_request: AnalyzeRequest) -> AnalyzeResponse:
+            return await service.analyze(analyze_request.uri)
+    else:
+        service = create_service(cache)
+
+        @app.post('/analyze')
+        async def analyze_encoded(analyze_request: AnalyzeRequest) -> Response:
+            return Response(await service.analyze_json(analyze_request.uri), media_type='application/json')
+
+    return app
+
+
+def fill(variant: str, level: int, responses: list[AnalyzeResponse]) -> tuple[object, int]:
+    # traced allocations of the filled cache, every entry is a copy of its own like after an analysis
+    tracemalloc.start()
+    if variant == 'objects':
+        cache = TTLCache(maxsize=len(responses), ttl=3600)
+        for response in responses:
+            cache[response.uri] = AnalyzeResponse.model_validate_json(response.model_dump_json())
+    else:
+        cache = MemoryCacheBackend(len(responses), 3600)
+        if level:
+            cache = CompressedCacheBackend(cache, level)
+        for response in responses:
+            cache.set(response.uri, AnalysisService._encode(response))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return cache, size
+
+
+async def hit_latencies(apps: dict[str, FastAPI], uris: list[str]) -> dict[str, list[float]]:
+    latencies = {name: [] for name in apps}
+
+    def timed(name: str):
+        async def call(scope, receive, send):
+            start = time.perf_counter()
+            await apps[name](scope, receive, send)
+            latencies[name].append(time.perf_counter() - start)
+        return call
+
+    clients = {
+        name: httpx.AsyncClient(transport=httpx.ASGITransport(timed(name)), base_url='http://bench') for name in apps
+    }
+    for name, client in clients.items():
+        for uri in uris[:100]:
+            await client.post('/analyze', json={'uri': uri})
+        latencies[name].clear()
+
+    for i in range(ROUNDS):
+        for client in clients.values():
+            for uri in uris[i::ROUNDS]:
+                response = await client.post('/analyze', json={'uri': uri})
+                assert response.status_code == 200 and response.json()['uri'] == uri
+
+    for client in clients.values():
+        await client.aclose()
+    return latencies
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    random.seed(42)
+    logging.disable(logging.INFO)
+
+    responses = create_responses(entries)
+    size = sum(len(AnalysisService._encode(response)) for response in responses) // entries
+    uris = [random.choice(responses).uri for _ in range(HITS)]
+
+    runs = [
+        ('objects', 'objects', 0),
+        ('JSON, validated', 'validated', 0),
+        ('JSON', 'encoded', 0),
+        ('zlib 1', 'encoded', 1),
+        ('zlib 6', 'encoded', 6),
+        ('zlib 9', 'encoded', 9)
+    ]
+
+    apps = {}
+    sizes = {}
+    for name, variant, level in runs:
+        cache, sizes[name] = fill(variant, level, responses)
+        apps[name] = create_app(variant, cache)
+    latencies = asyncio.run(hit_latencies(apps, uris))
+
+    print(f'{entries} entries of {size} bytes of JSON, {HITS} hits')
+    print(f'{"entries":<16} {"bytes/entry":>12} {"MB total":>9} {"hit p50 us":>11} {"hit p99 us":>11}')
+    for name in apps:
+        print(
+            f'{name:<16} {sizes[name] / entries:>12.0f} {sizes[name] / 2 ** 20:>9.1f} '
+            f'{percentile(latencies[name], 50) * 1e6:>11.0f} {percentile(latencies[name], 99) * 1e6:>11.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Throughput of the local gender-language counts on multi-megabyte texts built from the extracted corpus pages, for
+# GenderLexicon (one trie-shaped regex over the lowercased text) and the straightforward alternatives: a flat
+# case-insensitive alternation of all terms, one regex per term and a Python loop over the words (which cannot match
+# multi-word terms). The flat alternation is checked to find the same terms as GenderLexicon.
+#
+#   python -m benchmarks.bench_lexicon [megabytes ...]
+
+import re
+import sys
+import time
+from collections import Counter
+
+from benchmarks.suite import extract, load_corpus
+from biasight.lexicon import GenderLexicon
+from biasight.parse import WebParser
+
+REPEAT = 3
+
+
+def flat_alternation(lexicon: GenderLexicon):
+    # longest terms first, so "policemen" is not matched as "police"
+    terms = sorted(lexicon.kinds, key=len, reverse=True)
+    pattern = re.compile(rf'\b(?:{"|".join(re.escape(term).replace(" ", r"\s+") for term in terms)})\b', re.IGNORECASE)
+    return lambda text: Counter(' '.join(match.lower().split()) for match in pattern.findall(text))
+
+
+def regex_per_term(lexicon: GenderLexicon):
+    patterns = {term: re.compile(rf'\b{re.escape(term).replace(" ", r"\s+")}\b') for term in lexicon.kinds}
+
+    def count(text: str) -> Counter:
+        text = text.lower()
+        return +Counter({term: len(pattern.findall(text)) for term, pattern in patterns.items()})
+
+    return count
+
+
+def word_loop(lexicon: GenderLexicon):
+    word = re.compile(r"[\w'-]+")
+    kinds = lexicon.kinds
+    return lambda text: Counter(token for token in word.findall(text.lower()) if token in kinds)
+
+
+def best_of(function, text: str) -> float:
+    seconds = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(text)
+        seconds.append(time.perf_counter() - start)
+        # slow variants are not repeated
+        if seconds[-1] > 1:
+            break
+    return min(seconds)
+
+
+def main():
+    sizes = [float(size) for size in sys.argv[1:]] or [1, 4, 16]
+    web_parser = WebParser(max_content_length=2 ** 31, chunk_size=8192)
+    corpus_text = '\n'.join(extract(web_parser, content).text for content in load_corpus().values())
+    lexicon = GenderLexicon()
+
+    variants = {
+        'GenderLexicon': lexicon.analyze,
+        'flat alternation': flat_alternation(lexicon),
+        'regex per term': regex_per_term(lexicon),
+        'word loop': word_loop(lexicon)
+    }
+    metrics = lexicon.analyze(corpus_text)
+    print(f'{len(lexicon.kinds)} terms, corpus: {metrics.male_mentions} male, {metrics.female_mentions} female, '
+          f'{metrics.neutral_terms} neutral, {metrics.gendered_term_count} gendered terms in {metrics.words} words\n')
+    found = Counter()
+    for term, count in variants['flat alternation'](corpus_text).items():
+        found[lexicon.kinds[term]] += count
+    assert (found['male'], found['female'], found['neutral'], found['gendered']) == (
+        metrics.male_mentions, metrics.female_mentions, metrics.neutral_terms, metrics.gendered_term_count
+    )
+
+    print(f'{"variant":<18} ' + ' '.join(f'{f"{size:g} MB ms":>12} {"MB/s":>7}' for size in sizes))
+    texts = [(corpus_text * int(size * 2 ** 20 // len(corpus_text) + 1))[:int(size * 2 ** 20)] for size in sizes]
+    for name, function in variants.items():
+        row = []
+        for size, text in zip(sizes, texts):
+            seconds = best_of(function, text)
+            row.append(f'{seconds * 1000:>12.0f} {size / seconds:>7.1f}')
+        print(f'{name:<18} ' + ' '.join(row))
+
+
+if __name__ == '__main__':
+    main()
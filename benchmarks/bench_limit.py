@@ -0,0 +1,107 @@
+# Measures what the rate limit check adds to a request: latency of RateLimiter.increment with the memory and the
+# SQLite store, from one thread, from several threads sharing a store and from several processes sharing the
+# database like uvicorn workers. Clients are either spread over many keys or all hit one hot key. Finally checks
+# that concurrent processes never allow more requests than a bucket holds.
+#
+#   python -m benchmarks.bench_limit [checks per worker]
+
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from benchmarks.util import percentile
+from biasight.limit import MemoryRateLimitStore, RateLimiter, RateLimitStore, SQLiteRateLimitStore
+
+CLIENTS = 1000
+WORKERS = 4
+
+
+def check(rate_limiter: RateLimiter, checks: int, hot: bool, seed: int) -> list[float]:
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(checks):
+        client = 'ip:hot' if hot else f'ip:{rng.randrange(CLIENTS)}'
+        start = time.perf_counter()
+        try:
+            rate_limiter.increment(client)
+        except HTTPException:
+            pass
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_threads(store: RateLimitStore, checks: int, threads: int, hot: bool) -> tuple[float, list[float]]:
+    rate_limiter = RateLimiter(10 ** 9, store)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(lambda i: check(rate_limiter, checks, hot, i), range(threads)))
+    return time.perf_counter() - start, [latency for latencies in results for latency in latencies]
+
+
+def process_worker(path: str, checks: int, hot: bool, seed: int) -> list[float]:
+    return check(RateLimiter(10 ** 9, SQLiteRateLimitStore(path)), checks, hot, seed)
+
+
+def run_processes(path: str, checks: int, hot: bool) -> tuple[float, list[float]]:
+    with multiprocessing.get_context('spawn').Pool(WORKERS) as pool:
+        # the pool is started before timing, spawning interpreters is not part of the check
+        pool.map(abs, range(WORKERS))
+        start = time.perf_counter()
+        results = pool.starmap(process_worker, [(path, checks, hot, i) for i in range(WORKERS)])
+        elapsed = time.perf_counter() - start
+    return elapsed, [latency for latencies in results for latency in latencies]
+
+
+def allowed_by_processes(path: str, capacity: int, attempts: int) -> int:
+    with multiprocessing.get_context('spawn').Pool(WORKERS) as pool:
+        return sum(pool.starmap(acquire_all, [(path, capacity, attempts) for _ in range(WORKERS)]))
+
+
+def acquire_all(path: str, capacity: int, attempts: int) -> int:
+    rate_limiter = RateLimiter(capacity, SQLiteRateLimitStore(path, 'capacity'), period=10 ** 9)
+    allowed = 0
+    for _ in range(attempts):
+        try:
+            rate_limiter.increment('ip:hot')
+            allowed += 1
+        except HTTPException:
+            pass
+    return allowed
+
+
+def main():
+    checks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'limits.db')
+        print(f'{"store":<8} {"workers":<12} {"clients":<8} {"checks/s":>10} {"p50 us":>8} {"p99 us":>8}')
+
+        for hot in (False, True):
+            clients = 'hot' if hot else str(CLIENTS)
+            runs = [
+                ('memory', '1 thread', lambda: run_threads(MemoryRateLimitStore(), checks, 1, hot)),
+                ('memory', '8 threads', lambda: run_threads(MemoryRateLimitStore(), checks, 8, hot)),
+                ('sqlite', '1 thread', lambda: run_threads(SQLiteRateLimitStore(path), checks, 1, hot)),
+                ('sqlite', '8 threads', lambda: run_threads(SQLiteRateLimitStore(path), checks, 8, hot)),
+                ('sqlite', f'{WORKERS} processes', lambda: run_processes(path, checks, hot))
+            ]
+            for store, workers, run in runs:
+                elapsed, latencies = run()
+                print(
+                    f'{store:<8} {workers:<12} {clients:<8} {len(latencies) / elapsed:>10.0f} '
+                    f'{percentile(latencies, 50) * 10 ** 6:>8.1f} {percentile(latencies, 99) * 10 ** 6:>8.1f}'
+                )
+
+        capacity = 1000
+        allowed = allowed_by_processes(path, capacity, capacity)
+        print(f'\n{WORKERS} processes, {WORKERS * capacity} attempts on a bucket of {capacity}: {allowed} allowed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Overhead of the instrumentation: the cost of recording a stage duration, with and without a request collecting
+# Server-Timing, and the added latency of MetricsMiddleware per request.
+#
+#   python -m benchmarks.bench_metrics [requests]
+
+import asyncio
+import sys
+import time
+import timeit
+
+from benchmarks.util import percentile
+from biasight import metrics
+
+
+def per_call(func, number: int = 100000) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+async def app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'ok'})
+
+
+async def requests(handler, count: int) -> list[float]:
+    scope = {'type': 'http', 'method': 'GET', 'path': '/limit', 'headers': []}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        pass
+
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await handler(scope, receive, send)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(f'observe              {per_call(lambda: metrics.observe("bench", 0.01)) * 1e6:>6.2f} µs')
+    token = metrics.stage_timings.set({})
+    print(f'observe in request   {per_call(lambda: metrics.observe("bench", 0.01)) * 1e6:>6.2f} µs')
+    metrics.stage_timings.reset(token)
+
+    def timed():
+        with metrics.timed('bench'):
+            pass
+
+    print(f'timed                {per_call(timed) * 1e6:>6.2f} µs')
+
+    print(f'\n{"middleware":<20} {"p50 µs":>8} {"p99 µs":>8}')
+    for name, handler in [
+        ('none', app),
+        ('metrics', metrics.MetricsMiddleware(app)),
+        ('+ Server-Timing', metrics.MetricsMiddleware(app, add_server_timing=True))
+    ]:
+        latencies = asyncio.run(requests(handler, count))
+        print(f'{name:<20} {percentile(latencies, 50) * 1e6:>8.1f} {percentile(latencies, 99) * 1e6:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
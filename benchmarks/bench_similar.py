@@ -0,0 +1,125 @@
+# Near-duplicate detection with the SimHash index. A synthetic corpus of pages, their near-duplicates (a changed
+# date line, a few edited words, a related-articles block) and unrelated pages is fingerprinted and every variant
+# looked up in an index of the originals. Reports the fingerprint time per page, recall (near-duplicates found) per
+# kind of change and precision (found pages that are the original of the variant) per max_distance, then lookup
+# latency and memory of an index filled with random fingerprints up to the given size.
+#
+#   python -m benchmarks.bench_similar [pages] [max index size]
+
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.util import percentile
+from biasight.similar import SimilarityIndex
+
+WORDS = 600
+LOOKUPS = 20000
+CHANGES = ['date', 'edits', 'related']
+
+
+def vocabulary(rng: random.Random, size: int = 5000) -> list[str]:
+    return [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(2, 10))) for _ in range(size)]
+
+
+def create_page(rng: random.Random, words: list[str], weights: list[float]) -> list[str]:
+    return rng.choices(words, weights, k=WORDS)
+
+
+def variants(rng: random.Random, page: list[str], words: list[str]) -> list[str]:
+    # the kind of changes between a page and its copy on a mirror or its next version
+    dated = page + ['last', 'updated', 'on', 'may', str(rng.randint(1, 28))]
+    edited = list(page)
+    for _ in range(5):
+        edited[rng.randrange(len(edited))] = rng.choice(words)
+    related = page + ['related', 'articles'] + rng.choices(words, k=20)
+    return [' '.join(dated), ' '.join(edited), ' '.join(related)]
+
+
+def bench_detection(pages: int):
+    rng = random.Random(1)
+    words = vocabulary(rng)
+    # word frequencies of natural text roughly follow Zipf's law
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    originals = [create_page(rng, words, weights) for _ in range(pages)]
+    texts = [' '.join(page) for page in originals]
+    duplicates = [
+        (i, change, variant)
+        for i, page in enumerate(originals)
+        for change, variant in zip(CHANGES, variants(rng, page, words))
+    ]
+    unrelated = [' '.join(create_page(rng, words, weights)) for _ in range(pages)]
+
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    fingerprints = [index.fingerprint(text) for text in texts]
+    fingerprint_seconds = (time.perf_counter() - start) / len(texts)
+    duplicate_fingerprints = [(i, change, index.fingerprint(text)) for i, change, text in duplicates]
+    unrelated_fingerprints = [index.fingerprint(text) for text in unrelated]
+    print(f'{len(texts)} pages of {WORDS} words, fingerprint {fingerprint_seconds * 1000:.2f} ms per page\n')
+
+    print(
+        f'{"max distance":>12} {"recall":>8} ' + ' '.join(f'{change:>8}' for change in CHANGES) +
+        f' {"precision":>10} {"false hits":>11} {"lookup us":>10}'
+    )
+    for max_distance in [2, 3, 4, 6, 8]:
+        index = SimilarityIndex(max_distance, max_entries=pages)
+        for i, fingerprint in enumerate(fingerprints):
+            index.put(fingerprint, str(i), f'https://example.com/{i}')
+
+        found = 0
+        correct = dict.fromkeys(CHANGES, 0)
+        start = time.perf_counter()
+        for i, change, fingerprint in duplicate_fingerprints:
+            similar = index.get(fingerprint)
+            if similar:
+                found += 1
+                correct[change] += similar.key == str(i)
+        lookup = (time.perf_counter() - start) / len(duplicate_fingerprints)
+        total = sum(correct.values())
+        false_hits = sum(1 for fingerprint in unrelated_fingerprints if index.get(fingerprint)) + found - total
+        print(
+            f'{max_distance:>12} {total / len(duplicates):>8.1%} ' +
+            ' '.join(f'{correct[change] / pages:>8.1%}' for change in CHANGES) +
+            f' {total / (total + false_hits or 1):>10.1%} {false_hits:>11} {lookup * 1e6:>10.1f}'
+        )
+
+
+def bench_size(max_size: int):
+    print(f'\n{"entries":>10} {"lookup p50 us":>14} {"lookup p99 us":>14} {"MB":>8}')
+    rng = random.Random(2)
+    size = 10000
+    while size <= max_size:
+        tracemalloc.start()
+        index = SimilarityIndex(max_entries=size)
+        fingerprints = [rng.getrandbits(64) for _ in range(size)]
+        for i, fingerprint in enumerate(fingerprints):
+            # content cache keys are sha256 hex digests
+            index.put(fingerprint, f'{i:064x}', f'https://example.com/{i}')
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        latencies = []
+        for fingerprint in rng.choices(fingerprints, k=LOOKUPS):
+            # two bits off, found through the bands
+            query = fingerprint ^ 0b1001
+            start = time.perf_counter()
+            index.get(query)
+            latencies.append(time.perf_counter() - start)
+        print(
+            f'{size:>10} {percentile(latencies, 50) * 1e6:>14.1f} {percentile(latencies, 99) * 1e6:>14.1f} '
+            f'{memory / 1e6:>8.1f}'
+        )
+        size *= 10
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    bench_detection(pages)
+    bench_size(max_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# Cold start of the API: every run starts a fresh process. Reports the time to import biasight.main, the time from
+# starting uvicorn until /limit answers, and the latency of the first /analyze (replay LLM backend, local fixture
+# page), which includes creating the components. Fails if a median is above the given budget, so startup regressions
+# show up in CI. The Gemini client must not be imported on startup, this is checked as well.
+#
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --runs 10 --max-import-ms 1500 --max-ready-ms 3000
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.load_test import RECORDINGS, free_port
+from benchmarks.util import serve_pages
+
+ENV = {
+    'GCP_PROJECT_ID': 'startup',
+    'GCP_LOCATION': 'local',
+    'GCP_SERVICE_ACCOUNT_FILE': '/nonexistent.json',
+    'CACHE_BACKEND': 'memory',
+    'TELEGRAM_ENABLED': 'false'
+}
+HEAVY_MODULES = ('vertexai', 'google.cloud.aiplatform')
+IMPORT = '''
+import json, sys, time
+start = time.perf_counter()
+import biasight.main
+print(json.dumps([time.perf_counter() - start, [m for m in sys.modules if m.startswith({modules})]]))
+'''
+
+
+def measure_import() -> tuple[float, list[str]]:
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT.format(modules=HEAVY_MODULES)],
+        env=os.environ | ENV,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    seconds, modules = json.loads(output.stdout.splitlines()[-1])
+    return seconds, modules
+
+
+def measure_ready(uri: str) -> tuple[float, float]:
+    # seconds until /limit answers and seconds of the first /analyze
+    port = free_port()
+    env = os.environ | ENV | {
+        'LLM_BACKEND': 'replay',
+        'LLM_REPLAY_PATH': RECORDINGS,
+        'LLM_REPLAY_LATENCY': '0',
+        'LLM_REPLAY_TOKEN_RATE': '0'
+    }
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'biasight.main:app', '--port', str(port), '--log-level', 'warning'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=60) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError('App exited during startup')
+                try:
+                    client.get('/limit')
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            ready = time.perf_counter() - start
+
+            start = time.perf_counter()
+            response = client.post('/analyze', json={'uri': uri})
+            response.raise_for_status()
+            return ready, time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, help='fail if the median import time is higher')
+    parser.add_argument('--max-ready-ms', type=float, help='fail if the median time to the first response is higher')
+    args = parser.parse_args()
+
+    imports, readies, analyses = [], [], []
+    heavy = set()
+    page = b'<html><body><main><p>The engineers and nurses of the team built the project.</p></main></body></html>'
+    with serve_pages({'/page': page}) as base_uri:
+        for _ in range(args.runs):
+            seconds, modules = measure_import()
+            imports.append(seconds)
+            heavy.update(modules)
+            ready, analysis = measure_ready(f'{base_uri}/page')
+            readies.append(ready)
+            analyses.append(analysis)
+
+    print(f'{"":<22} {"median ms":>10} {"max ms":>8}')
+    for name, values in [('import', imports), ('first response', readies), ('first analysis', analyses)]:
+        print(f'{name:<22} {statistics.median(values) * 1000:>10.0f} {max(values) * 1000:>8.0f}')
+
+    failures = []
+    if heavy:
+        failures.append(f'imported on startup: {", ".join(sorted(heavy))}')
+    if args.max_import_ms and statistics.median(imports) * 1000 > args.max_import_ms:
+        failures.append(f'import above {args.max_import_ms:.0f} ms')
+    if args.max_ready_ms and statistics.median(readies) * 1000 > args.max_ready_ms:
+        failures.append(f'first response above {args.max_ready_ms:.0f} ms')
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Time until the first field and category reach the client with BiasAnalyzer.analyze_stream, compared to waiting for
+# the whole reply with analyze_async. The fake LLM takes LLM_LATENCY to the first chunk and then generates
+# OUTPUT_RATE characters per second, about 200 tokens per second.
+#
+#   python -m benchmarks.bench_stream
+
+import asyncio
+import time
+
+from benchmarks.util import FAKE_RESULT, FakeGeminiClient
+from biasight.bias import BiasAnalyzer
+
+LLM_LATENCY = 0.5
+OUTPUT_RATE = 800
+FEEDBACK = (
+    'The webpage mostly uses gender-neutral job titles, but the leadership section only features men and '
+    'describes them with agentic terms, while the only woman mentioned is introduced through her family role.'
+)
+RESULT = {key: FEEDBACK if value == 'x' else value for key, value in FAKE_RESULT.items()}
+TEXT = 'The chairman thanked every engineer, whether she or he worked on the bridge. ' * 100
+
+
+async def blocking() -> float:
+    bias_analyzer = BiasAnalyzer(FakeGeminiClient(LLM_LATENCY, result=RESULT, output_rate=OUTPUT_RATE))
+    start = time.perf_counter()
+    await bias_analyzer.analyze_async(TEXT)
+    return time.perf_counter() - start
+
+
+async def streaming() -> tuple[float, float, float]:
+    bias_analyzer = BiasAnalyzer(FakeGeminiClient(LLM_LATENCY, result=RESULT, output_rate=OUTPUT_RATE))
+    first_field = first_category = None
+    start = time.perf_counter()
+    async for event, _ in bias_analyzer.analyze_stream(TEXT):
+        elapsed = time.perf_counter() - start
+        if first_field is None:
+            first_field = elapsed
+        if event == 'category' and first_category is None:
+            first_category = elapsed
+    return first_field, first_category, time.perf_counter() - start
+
+
+def main():
+    blocking_time = asyncio.run(blocking())
+    first_field, first_category, stream_time = asyncio.run(streaming())
+    print(f'reply: {len(RESULT)} fields, {len(FakeGeminiClient(0, result=RESULT).reply)} characters')
+    print(f'blocking: result after {blocking_time:.2f} s')
+    print(f'streaming: first field after {first_field:.2f} s, first category after {first_category:.2f} s, '
+          f'result after {stream_time:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
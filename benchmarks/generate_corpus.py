@@ -0,0 +1,200 @@
+# Writes the HTML corpus used by benchmarks.suite to benchmarks/corpus as gzipped files. The pages are generated
+# deterministically and reproduce the structure of common real-world pages (markup density, scripts, nesting, link
+# lists and entity use) from a small landing page to a multi-megabyte reference article. Run it again only when
+# pages are added or changed, the baselines refer to the checked-in files.
+#
+#   python -m benchmarks.generate_corpus
+
+import gzip
+import json
+import os
+import random
+
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'corpus')
+
+WORDS = (
+    'the a of and to in is that for it as with was on be by at this from are or have an they which one you were all '
+    'we when there can been has more if will would about their what so up out them into some could time these two '
+    'engineer nurse manager chairman chairperson spokesperson businessman firefighter team leadership community '
+    'she he her his they women men girls boys people staff customers families workers mothers fathers parents '
+    'strong gentle decisive caring ambitious emotional assertive bossy supportive brilliant hardworking nurturing'
+).split()
+
+
+def sentence(rng: random.Random, words: int = 0) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words or rng.randint(6, 24))).capitalize() + '.'
+
+
+def paragraph(rng: random.Random, sentences: int = 0) -> str:
+    return ' '.join(sentence(rng) for _ in range(sentences or rng.randint(2, 7)))
+
+
+def inline_text(rng: random.Random) -> str:
+    # running text with the inline markup and references real articles use
+    parts = []
+    for _ in range(rng.randint(3, 8)):
+        text = sentence(rng)
+        kind = rng.random()
+        if kind < 0.2:
+            text = f'<a href="/wiki/{rng.choice(WORDS)}_{rng.randint(1, 9999)}" title="{rng.choice(WORDS)}">{text}</a>'
+        elif kind < 0.3:
+            text = f'<b>{text}</b>'
+        elif kind < 0.4:
+            note = rng.randint(1, 500)
+            text = f'{text}<sup class="reference"><a href="#cite_note-{note}">[{note}]</a></sup>'
+        elif kind < 0.45:
+            text = text.replace(' the ', ' the&nbsp;', 1).replace(' and ', ' &amp; ', 1) + ' &#8212; &copy;&eacute;'
+        parts.append(text)
+    return ' '.join(parts)
+
+
+def page(title: str, head: str, body: str) -> str:
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{title}</title>'
+        f'<meta name="viewport" content="width=device-width, initial-scale=1">{head}</head><body>{body}</body></html>'
+    )
+
+
+def site_chrome(rng: random.Random, content: str) -> str:
+    menu = ''.join(f'<li class="menu-item"><a href="/{w}">{w.title()}</a></li>' for w in rng.sample(WORDS, 15))
+    footer = ''.join(f'<li><a href="/{w}">{w.title()}</a></li>' for w in rng.sample(WORDS, 25))
+    return (
+        f'<div id="cookie-consent" class="banner"><p>{paragraph(rng, 2)}</p><button>Accept</button></div>'
+        f'<header class="site-header"><a class="logo" href="/"><svg viewBox="0 0 24 24"><path d="M0 0h24v24H0z"/>'
+        f'</svg></a><nav><ul>{menu}</ul></nav></header>{content}'
+        f'<footer><ul>{footer}</ul><p>&copy; 2024 Example Media</p></footer>'
+    )
+
+
+def analytics_script(rng: random.Random, size: int) -> str:
+    data = {f'k{i}': [rng.randint(0, 10 ** 6) for _ in range(8)] for i in range(size // 64)}
+    return f'<script>window.dataLayer = {json.dumps(data)}; if (a < b && c > d) {{ track("<p>"); }}</script>'
+
+
+def small_landing(rng: random.Random) -> str:
+    features = ''.join(
+        f'<div class="feature"><h3>{sentence(rng, 3)}</h3><p>{sentence(rng)}</p></div>' for _ in range(6)
+    )
+    body = site_chrome(rng, f'<main><section class="hero"><h1>{sentence(rng, 5)}</h1><p>{paragraph(rng)}</p>'
+                            f'<a class="button" href="/signup">Get started</a></section>{features}</main>')
+    return page('Landing', '<style>.hero{padding:4rem}</style>', body)
+
+
+def news_article(rng: random.Random) -> str:
+    paragraphs = ''.join(f'<p>{inline_text(rng)}</p>' for _ in range(40))
+    related = ''.join(
+        f'<li><a href="/news/{rng.randint(1, 99999)}"><img src="/img/{i}.jpg" alt="">{sentence(rng)}</a></li>'
+        for i in range(12)
+    )
+    comments = ''.join(
+        f'<div class="comment" id="c{i}"><span class="author">{rng.choice(WORDS)}</span><p>{paragraph(rng, 2)}</p>'
+        f'<a href="#reply-{i}">Reply</a></div>'
+        for i in range(30)
+    )
+    content = (
+        f'<main><article><h1>{sentence(rng)}</h1><p class="byline">By {rng.choice(WORDS).title()}</p>'
+        f'<figure><img src="/lead.jpg" alt="{sentence(rng)}"><figcaption>{sentence(rng)}</figcaption></figure>'
+        f'{paragraphs}</article><aside class="related"><h2>Related</h2><ul>{related}</ul></aside>'
+        f'<section class="comments">{comments}</section></main>'
+    )
+    return page('News', analytics_script(rng, 20000), site_chrome(rng, content))
+
+
+def ecommerce_listing(rng: random.Random) -> str:
+    icon = '<svg class="icon" viewBox="0 0 16 16"><path d="M8 0l2 5h6l-5 4 2 6-5-4-5 4 2-6-5-4h6z"/></svg>'
+    cards = ''.join(
+        f'<div class="product-card" data-sku="{rng.randint(10 ** 6, 10 ** 7)}" data-price="{rng.randint(5, 500)}">'
+        f'<a href="/p/{i}"><img src="/img/p{i}.webp" loading="lazy" alt="{sentence(rng, 4)}"></a>'
+        f'<h2 class="title"><a href="/p/{i}">{sentence(rng, 5)}</a></h2><div class="rating">{icon * 5}</div>'
+        f'<p class="description">{sentence(rng)}</p><span class="price">&euro;{rng.randint(5, 500)},99</span>'
+        f'<button class="add-to-cart" aria-label="Add to cart">{icon}</button></div>'
+        for i in range(800)
+    )
+    json_ld = json.dumps({'@context': 'https://schema.org', '@type': 'ItemList', 'itemListElement': [
+        {'@type': 'ListItem', 'position': i, 'url': f'/p/{i}'} for i in range(800)
+    ]})
+    filters = ''.join(
+        f'<label><input type="checkbox" name="f{i}"> {rng.choice(WORDS)}</label>' for i in range(120)
+    )
+    content = f'<main><h1>{sentence(rng, 4)}</h1><aside class="filters">{filters}</aside>{cards}</main>'
+    return page('Shop', f'<script type="application/ld+json">{json_ld}</script>', site_chrome(rng, content))
+
+
+def spa_shell(rng: random.Random) -> str:
+    bundle = ';'.join(
+        f'function f{i}(a,b){{return a<b?"<div>"+a+"</div>":b&&a>{i}}}' for i in range(6000)
+    )
+    state = json.dumps({'props': {'pageProps': {'items': [paragraph(rng, 2) for _ in range(150)]}}})
+    body = (
+        '<noscript>You need to enable JavaScript to run this app.</noscript><div id="root"></div>'
+        f'<script id="__NEXT_DATA__" type="application/json">{state}</script><script>{bundle}</script>'
+    )
+    return page('App', '<link rel="stylesheet" href="/static/app.css">', body)
+
+
+def nested_markup(rng: random.Random) -> str:
+    def nest(depth: int) -> str:
+        if depth == 0:
+            return f'<span>{sentence(rng, 4)}</span>'
+        tag = rng.choice(['div', 'section', 'span', 'div', 'div'])
+        children = ''.join(nest(depth - 1) for _ in range(2 if depth % 6 == 0 else 1))
+        return f'<{tag} class="wrapper-{depth}">{children}</{tag}>'
+
+    blocks = ''.join(nest(40) for _ in range(40))
+    rows = ''.join(
+        '<tr>' + ''.join(f'<td><div><span>{rng.choice(WORDS)}</span></div></td>' for _ in range(12)) + '</tr>'
+        for _ in range(150)
+    )
+    # unclosed and stray tags as produced by legacy CMS templates
+    legacy = ''.join(f'<p>{sentence(rng)}<b>{sentence(rng, 4)}<i>{sentence(rng, 3)}</p></span>' for _ in range(200))
+    return page('Nested', '', site_chrome(rng, f'<main>{blocks}<table>{rows}</table>{legacy}</main>'))
+
+
+def reference_article(rng: random.Random) -> str:
+    sections = []
+    for s in range(350):
+        paragraphs = ''.join(f'<p>{inline_text(rng)}</p>' for _ in range(rng.randint(6, 14)))
+        table = ''
+        if s % 4 == 0:
+            rows = ''.join(
+                f'<tr><th>{rng.choice(WORDS)}</th>' + ''.join(f'<td>{rng.randint(0, 10 ** 5)}</td>' for _ in range(6))
+                + '</tr>'
+                for _ in range(30)
+            )
+            table = f'<table class="wikitable">{rows}</table>'
+        sections.append(f'<h2 id="s{s}">{sentence(rng, 4)}</h2>{paragraphs}{table}')
+    references = ''.join(
+        f'<li id="cite_note-{i}"><a href="https://example.org/{i}">{sentence(rng, 8)}</a> Retrieved 2024.</li>'
+        for i in range(4000)
+    )
+    content = (
+        f'<main><h1>{sentence(rng, 5)}</h1><div class="toc">'
+        + ''.join(f'<a href="#s{i}">{i}</a>' for i in range(350))
+        + f'</div>{"".join(sections)}<ol class="references">{references}</ol></main>'
+    )
+    return page('Reference', analytics_script(rng, 50000), site_chrome(rng, content))
+
+
+PAGES = {
+    'small_landing': small_landing,
+    'news_article': news_article,
+    'ecommerce_listing': ecommerce_listing,
+    'spa_shell': spa_shell,
+    'nested_markup': nested_markup,
+    'reference_article': reference_article
+}
+
+
+def main():
+    os.makedirs(CORPUS_DIRECTORY, exist_ok=True)
+    for name, generate in PAGES.items():
+        html_content = generate(random.Random(name)).encode()
+        path = os.path.join(CORPUS_DIRECTORY, f'{name}.html.gz')
+        # mtime 0 keeps the files identical across runs
+        with open(path, 'wb') as f:
+            f.write(gzip.compress(html_content, mtime=0))
+        print(f'{name}: {len(html_content) / 1024:.0f} KiB, {os.path.getsize(path) / 1024:.0f} KiB compressed')
+
+
+if __name__ == '__main__':
+    main()
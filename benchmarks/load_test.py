@@ -0,0 +1,161 @@
+# End-to-end load test of the API: the app runs under uvicorn in its own process with the replay LLM backend, pages
+# come from a local fixture server and every request analyzes a different page, so caches do not hide the pipeline.
+# Reports throughput, latency percentiles and the error rate per concurrency level. No GCP access is needed.
+#
+#   python -m benchmarks.load_test
+#   python -m benchmarks.load_test --levels 1,8,32 --failure-rate 0.05 --malformed-rate 0.02
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.util import percentile, serve_pages
+
+RECORDINGS = os.path.join(os.path.dirname(__file__), 'recordings', 'responses.jsonl')
+WORDS = (
+    'the team engineer nurse manager she he they chairman chairperson worked built designed led supported hired '
+    'project community families customers report quarter growth results leadership care strong gentle decisive'
+).split()
+
+
+def create_pages(count: int) -> dict[str, bytes]:
+    rng = random.Random(1)
+    pages = {}
+    for i in range(count):
+        paragraphs = ''.join(
+            '<p>' + ' '.join(rng.choice(WORDS) for _ in range(60)).capitalize() + '.</p>' for _ in range(8)
+        )
+        pages[f'/page/{i}'] = f'<html><body><main><h1>Page {i}</h1>{paragraphs}</main></body></html>'.encode()
+    return pages
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, args: argparse.Namespace) -> subprocess.Popen:
+    env = os.environ | {
+        'GCP_PROJECT_ID': 'load-test',
+        'GCP_LOCATION': 'local',
+        'GCP_SERVICE_ACCOUNT_FILE': '/nonexistent.json',
+        'LLM_BACKEND': 'replay',
+        'LLM_REPLAY_PATH': RECORDINGS,
+        'LLM_REPLAY_LATENCY': str(args.llm_latency),
+        'LLM_REPLAY_TOKEN_RATE': str(args.token_rate),
+        'LLM_FAILURE_RATE': str(args.failure_rate),
+        'LLM_MALFORMED_RATE': str(args.malformed_rate),
+        'CACHE_BACKEND': 'memory',
+        'DAILY_LIMIT': str(10 ** 9),
+        # all fixture pages are on one host
+        'PARSE_MAX_CONNECTIONS_PER_HOST': '1000',
+        'TELEGRAM_ENABLED': 'false'
+    }
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'biasight.main:app', '--port', str(port), '--log-level', 'warning'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, process: subprocess.Popen):
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError('App exited during startup')
+        try:
+            await client.get('/limit')
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError('App did not start')
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    uris: list[str],
+    concurrency: int
+) -> tuple[float, list[float], Counter]:
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for uri in uris:
+        queue.put_nowait(uri)
+    latencies = []
+    statuses = Counter()
+
+    async def worker():
+        while not queue.empty():
+            uri = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post('/analyze', json={'uri': uri})
+                statuses[response.status_code] += 1
+            except httpx.HTTPError:
+                statuses['error'] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+async def run(base_uri: str, args: argparse.Namespace, levels: list[int]):
+    port = free_port()
+    process = start_app(port, args)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f'http://127.0.0.1:{port}',
+            timeout=120,
+            limits=httpx.Limits(max_connections=None)
+        ) as client:
+            await wait_until_ready(client, process)
+
+            print(
+                f'{"conc":>5} {"reqs":>5} {"req/s":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}  '
+                f'statuses'
+            )
+            page = 0
+            for concurrency in levels:
+                requests = max(args.requests, concurrency * 4)
+                uris = [f'{base_uri}/page/{i}' for i in range(page, page + requests)]
+                page += requests
+
+                elapsed, latencies, statuses = await run_level(client, uris, concurrency)
+                errors = requests - statuses[200]
+                print(
+                    f'{concurrency:>5} {requests:>5} {requests / elapsed:>7.1f} '
+                    f'{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 95) * 1000:>8.0f} '
+                    f'{percentile(latencies, 99) * 1000:>8.0f} {errors / requests:>7.1%}  {dict(statuses)}'
+                )
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end load test with replayed LLM responses')
+    parser.add_argument('--levels', default='1,4,16,64', help='comma separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=20, help='minimum requests per level')
+    parser.add_argument('--fetch-latency', type=float, default=0.05, help='seconds per page fetch')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='median seconds to the first LLM chunk')
+    parser.add_argument('--token-rate', type=float, default=200.0, help='median LLM output tokens per second')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of LLM calls failing')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='share of LLM replies cut off')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(',')]
+    pages = create_pages(sum(max(args.requests, level * 4) for level in levels))
+    with serve_pages(pages, args.fetch_latency) as base_uri:
+        asyncio.run(run(base_uri, args, levels))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# Regression benchmarks for the parsing and scoring hot paths. Every stage is timed (best of several runs) and its
+# peak traced memory recorded on each page of the checked-in corpus (benchmarks/corpus), and compared with the stored
+# baselines (benchmarks/baselines.json). Exits with 1 if a stage got slower or uses more memory than the thresholds
+# allow. Times are scaled by a calibration loop, so baselines recorded on another machine stay comparable.
+#
+#   python -m benchmarks.suite            compare with the baselines (make bench)
+#   python -m benchmarks.suite --update   record new baselines (make bench-baseline)
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from collections.abc import Callable
+
+from benchmarks.util import FAKE_RESULT
+from biasight.bias import BiasAnalyzer
+from biasight.clean import ContentCleaner
+from biasight.lexicon import GenderLexicon
+from biasight.llm import ReplayBackend
+from biasight.parse import ParsedPage, WebParser
+
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'corpus')
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+CHUNK_SIZE = 8192
+REPEAT = 3
+# differences below these are noise, whatever the relative change
+MIN_TIME_DIFFERENCE = 0.00001
+MIN_MEMORY_DIFFERENCE = 16384
+REPLY = json.dumps(FAKE_RESULT)
+
+
+def load_corpus() -> dict[str, bytes]:
+    corpus = {}
+    for file_name in sorted(os.listdir(CORPUS_DIRECTORY)):
+        if file_name.endswith('.html.gz'):
+            with gzip.open(os.path.join(CORPUS_DIRECTORY, file_name)) as f:
+                corpus[file_name.removesuffix('.html.gz')] = f.read()
+    return corpus
+
+
+def calibrate():
+    # pure Python work of the same kind as the stages: string building, dict lookups and small allocations
+    counts = {}
+    for i in range(200000):
+        word = f'word{i % 1000}'
+        counts[word] = counts.get(word, 0) + len(word)
+    return counts
+
+
+def extract(web_parser: WebParser, content: bytes) -> ParsedPage:
+    # the chunk loop of WebParser.parse_page without the network
+    reader = web_parser._reader('https://example.com/', 'utf-8')
+    for i in range(0, len(content), CHUNK_SIZE):
+        if not reader.feed(content[i:i + CHUNK_SIZE]):
+            break
+    return reader.page('https://example.com/')
+
+
+def stages(corpus: dict[str, bytes]) -> dict[str, Callable]:
+    web_parser = WebParser(max_content_length=2 ** 31, chunk_size=CHUNK_SIZE)
+    bias_analyzer = BiasAnalyzer(ReplayBackend([(None, REPLY)]), chunk_tokens=16000)
+    cleaner = ContentCleaner()
+    lexicon = GenderLexicon()
+    result = bias_analyzer._parse_response(REPLY)
+
+    benchmarks = {
+        'calculate_score': lambda: [bias_analyzer._calculate_score(result) for _ in range(1000)],
+        'parse_response': lambda: [bias_analyzer._parse_response(REPLY) for _ in range(100)]
+    }
+    for name, content in corpus.items():
+        html_content = content.decode()
+        page = extract(web_parser, content)
+        text = cleaner.clean(page).text
+        benchmarks |= {
+            # BeautifulSoup reference implementation, including _tag_visible
+            f'text_from_html/{name}': lambda html_content=html_content: web_parser._text_from_html(html_content),
+            f'extract/{name}': lambda content=content: extract(web_parser, content),
+            f'clean/{name}': lambda page=page: cleaner.clean(page),
+            f'render_template/{name}': lambda text=text: bias_analyzer._render_template(text),
+            f'split_text/{name}': lambda text=text: bias_analyzer._split_text(text),
+            f'lexicon/{name}': lambda text=text: lexicon.analyze(text)
+        }
+    return benchmarks
+
+
+def measure(benchmark: Callable) -> dict[str, float]:
+    timer = timeit.Timer(benchmark)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=REPEAT, number=number)) / number
+
+    # memory is traced in a separate run, tracing slows down allocation heavy code considerably
+    tracemalloc.start()
+    benchmark()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': seconds, 'peak_bytes': peak}
+
+
+def compare(name: str, current: dict, baseline: dict | None, scale: float, threshold: float, memory_threshold: float):
+    if baseline is None:
+        return 'new', []
+
+    regressions = []
+    expected_seconds = baseline['seconds'] * scale
+    if (
+        current['seconds'] > expected_seconds * (1 + threshold)
+        and current['seconds'] - expected_seconds > MIN_TIME_DIFFERENCE
+    ):
+        regressions.append(f'{name}: {current["seconds"] * 1000:.3f} ms, expected {expected_seconds * 1000:.3f} ms')
+    if (
+        current['peak_bytes'] > baseline['peak_bytes'] * (1 + memory_threshold)
+        and current['peak_bytes'] - baseline['peak_bytes'] > MIN_MEMORY_DIFFERENCE
+    ):
+        regressions.append(
+            f'{name}: {current["peak_bytes"] / 1024:.0f} KiB peak, baseline {baseline["peak_bytes"] / 1024:.0f} KiB'
+        )
+    return ('REGRESSED' if regressions else 'ok'), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the parsing and scoring hot paths')
+    parser.add_argument('--update', action='store_true', help='store the results as new baselines')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='allowed relative memory growth')
+    parser.add_argument('--filter', default='', help='only run benchmarks containing this text')
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+    calibration = measure(calibrate)['seconds']
+    scale = calibration / baselines['calibration_seconds'] if baselines else 1.0
+    print(f'calibration: {calibration * 1000:.2f} ms, baselines scaled by {scale:.2f}')
+    print(f'{"benchmark":<40} {"ms":>10} {"base ms":>10} {"change":>8} {"peak KiB":>10} {"base KiB":>10}  status')
+
+    results = {}
+    regressions = []
+    for name, benchmark in stages(load_corpus()).items():
+        if args.filter not in name:
+            continue
+        current = results[name] = measure(benchmark)
+        baseline = baselines.get('benchmarks', {}).get(name)
+        status, failed = compare(name, current, baseline, scale, args.threshold, args.memory_threshold)
+        regressions.extend(failed)
+
+        base_ms = f'{baseline["seconds"] * scale * 1000:>10.3f}' if baseline else f'{"-":>10}'
+        base_kib = f'{baseline["peak_bytes"] / 1024:>10.0f}' if baseline else f'{"-":>10}'
+        change = f'{current["seconds"] / (baseline["seconds"] * scale) - 1:>+8.0%}' if baseline else f'{"-":>8}'
+        print(
+            f'{name:<40} {current["seconds"] * 1000:>10.3f} {base_ms} {change} '
+            f'{current["peak_bytes"] / 1024:>10.0f} {base_kib}  {status}'
+        )
+
+    if args.update:
+        # benchmarks left out by --filter keep their previous baseline, scaled to this machine
+        benchmarks = {
+            name: {'seconds': baseline['seconds'] * scale, 'peak_bytes': baseline['peak_bytes']}
+            for name, baseline in baselines.get('benchmarks', {}).items()
+        } | results
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump({'calibration_seconds': calibration, 'benchmarks': benchmarks}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baselines written to {BASELINES_PATH}')
+        return
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s):')
+        for regression in regressions:
+            print(f'  {regression}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import multiprocessing
+import time
+from contextlib import contextmanager
+
+from biasight.util import estimate_tokens
+
+FAKE_RESULT = {
+    'summary': 'x',
+    'stereotyping_feedback': 'x',
+    'stereotyping_score': 70,
+    'stereotyping_example': 'x',
+    'representation_feedback': 'x',
+    'representation_score': 60,
+    'representation_example': 'x',
+    'language_feedback': 'x',
+    'language_score': 80,
+    'language_example': 'x',
+    'framing_feedback': 'x',
+    'framing_score': 75,
+    'framing_example': 'x',
+    'positive_aspects': 'x',
+    'improvement_suggestions': 'x',
+    'male_to_female_mention_ratio': 1.2,
+    'gender_neutral_language_percentage': 70,
+}
+
+
+# stands in for GeminiClient, replying with a fixed result after a simulated latency, optionally growing with the
+# prompt size. When streaming, the latency is the time to the first chunk and the rest of the reply follows at
+# output_rate characters per second.
+class FakeGeminiClient:
+
+    def __init__(self, latency: float, latency_per_token: float = 0.0, result: dict = None, output_rate: float = 0.0):
+        self.latency = latency
+        self.latency_per_token = latency_per_token
+        self.reply = json.dumps(result or FAKE_RESULT)
+        self.output_rate = output_rate
+        self.calls = 0
+
+    def _latency(self, prompt: str) -> float:
+        return self.latency + estimate_tokens(prompt) * self.latency_per_token
+
+    def start_chat(self, system_instruction: str | None = None):
+        return None
+
+    def get_chat_response(self, chat, prompt: str) -> str:
+        self.calls += 1
+        time.sleep(self._latency(prompt))
+        return self.reply
+
+    async def get_chat_response_async(self, chat, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self._latency(prompt) + (len(self.reply) / self.output_rate if self.output_rate else 0))
+        return self.reply
+
+    async def stream_chat_response_async(self, chat, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self._latency(prompt))
+        chunk_size = 64
+        for i in range(0, len(self.reply), chunk_size):
+            if i and self.output_rate:
+                await asyncio.sleep(chunk_size / self.output_rate)
+            yield self.reply[i:i + chunk_size]
+
+
+async def _serve(pages: dict[str, bytes], latency: float, ports: multiprocessing.Queue):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # minimal HTTP/1.1 keep-alive loop, enough for GET requests from the benchmarks
+            while request := await reader.readuntil(b'\r\n\r\n'):
+                path = request.split(b' ', 2)[1].decode().split('?')[0]
+                if latency:
+                    await asyncio.sleep(latency)
+                body = pages.get(path)
+                if body is None:
+                    writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+                else:
+                    writer.write(
+                        b'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n'
+                        + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+                    )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0, backlog=1024)
+    ports.put(server.sockets[0].getsockname()[1])
+    await server.serve_forever()
+
+
+def _run_server(pages: dict[str, bytes], latency: float, ports: multiprocessing.Queue):
+    asyncio.run(_serve(pages, latency, ports))
+
+
+# serves the given path -> HTML mapping on a local port, yielding the base URL; the server runs in its own
+# process so it does not compete with the code under test for the GIL
+@contextmanager
+def serve_pages(pages: dict[str, bytes], latency: float = 0.0):
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_server, args=(pages, latency, ports), daemon=True)
+    process.start()
+    try:
+        yield f'http://127.0.0.1:{ports.get(timeout=10)}'
+    finally:
+        process.terminate()
+        process.join()
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
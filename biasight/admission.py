@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from biasight import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f'Rejected ({reason}), retry in {retry_after:.0f} s')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# caps the analyses calling the LLM at the same time. Further requests wait in a bounded FIFO queue for at most
+# max_wait seconds. A request is rejected right away if the queue is full or if the expected wait, estimated from
+# the queue length and the recent time a slot is held, is longer than max_wait, instead of timing out later.
+# Requests answered from a cache never ask for a slot.
+class AdmissionController:
+
+    def __init__(self, max_concurrent: int = 8, queue_size: int = 64, max_wait: float = 15.0, window: int = 1000):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        # moving average of the seconds a slot is held, None until the first slot was released
+        self.hold_seconds: float | None = None
+        self.waits: deque[float] = deque(maxlen=window)
+
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.timed_out = 0
+        self.max_queued = 0
+
+    def expected_wait(self, position: int) -> float:
+        # seconds until the waiter at position (counted from 0) gets a slot
+        if self.hold_seconds is None:
+            return 0.0
+        return (position + 1) / self.max_concurrent * self.hold_seconds
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        logger.warning('Shedding analysis (%s), %d active, %d queued', reason, self.active, len(self.waiters))
+        return AdmissionRejected(reason, max(retry_after, 1.0))
+
+    async def acquire(self):
+        start = time.monotonic()
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+        else:
+            await self._wait()
+
+        wait = time.monotonic() - start
+        self.admitted += 1
+        self.waits.append(wait)
+        metrics.observe('queue', wait)
+
+    async def _wait(self):
+        position = len(self.waiters)
+        if position >= self.queue_size:
+            self.rejected_full += 1
+            raise self._reject('queue full', self.expected_wait(position))
+        expected = self.expected_wait(position)
+        if expected > self.max_wait:
+            self.rejected_deadline += 1
+            raise self._reject('deadline', expected)
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        self.max_queued = max(self.max_queued, len(self.waiters))
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just as the wait ended
+                self.release()
+            elif future in self.waiters:
+                self.waiters.remove(future)
+            if isinstance(e, TimeoutError):
+                self.timed_out += 1
+                raise self._reject('timed out', self.expected_wait(len(self.waiters)))
+            raise
+
+    def release(self, hold_seconds: float | None = None):
+        if hold_seconds is not None:
+            self.hold_seconds = hold_seconds if self.hold_seconds is None else (
+                0.8 * self.hold_seconds + 0.2 * hold_seconds
+            )
+        # the slot goes to the longest waiting request instead of back to the pool, so new requests cannot overtake
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    @property
+    def queued(self) -> int:
+        return len(self.waiters)
+
+    @property
+    def rejected(self) -> int:
+        return self.rejected_full + self.rejected_deadline + self.timed_out
+
+    def wait_percentile(self, percentile: int) -> float:
+        if len(self.waits) < 2:
+            return self.waits[0] if self.waits else 0.0
+        return statistics.quantiles(self.waits, n=100)[percentile - 1]
@@ -0,0 +1,386 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import statistics
+import time
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import httpx
+from fastapi import HTTPException
+
+from biasight.bias import BiasAnalyzer
+from biasight.clean import ContentCleaner
+from biasight.limit import DEFAULT_CLIENT
+from biasight.model import AnalyzeResult, AuditPage, AuditProgress, CategoryAverages, SiteReport
+from biasight.parse import AsyncWebParser
+from biasight.service import AnalysisService
+from biasight.util import normalize_uri
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'BiaSight'
+SITEMAP_NAMESPACE = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+# links to these are not pages that can be analyzed
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.css', '.js', '.json', '.zip', '.gz', '.mp3',
+    '.mp4', '.avi', '.mov', '.woff', '.woff2', '.ttf', '.xml'
+)
+CATEGORY_FIELDS = [
+    'stereotyping_score',
+    'representation_score',
+    'language_score',
+    'framing_score',
+    'male_to_female_mention_ratio',
+    'gender_neutral_language_percentage',
+    'overall_score'
+]
+
+
+class HostThrottle:
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.next_request: dict[str, float] = {}
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    async def wait(self, host: str, delay: float | None = None):
+        # requests to the same host are spaced by at least delay seconds, other hosts are not affected
+        async with self.locks.setdefault(host, asyncio.Lock()):
+            wait = self.next_request.get(host, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.next_request[host] = time.monotonic() + (self.delay if delay is None else delay)
+
+
+class AuditJob:
+
+    def __init__(
+        self,
+        root: str,
+        web_parser: AsyncWebParser,
+        analysis_service: AnalysisService,
+        client: str = DEFAULT_CLIENT,
+        state_path: str | None = None,
+        max_pages: int = 50,
+        max_depth: int = 3,
+        concurrency: int = 4,
+        analyze_concurrency: int = 2,
+        delay: float = 1.0,
+        worst_pages: int = 10,
+        content_cleaner: ContentCleaner | None = None
+    ):
+        self.root = root
+        self.host = urlsplit(normalize_uri(root)).netloc
+        self.web_parser = web_parser
+        # pages are analyzed like /analyze requests of the client that started the audit: they count against its rate
+        # limit, wait for LLM slots and reuse the content cache and near-duplicate results
+        self.analysis_service = analysis_service
+        self.client = client
+        # progress is written here after every page, a job started with an existing state file resumes from it
+        self.state_path = state_path
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.analyze_slots = asyncio.Semaphore(analyze_concurrency)
+        self.throttle = HostThrottle(delay)
+        self.worst_pages = worst_pages
+        self.content_cleaner = content_cleaner
+
+        self.robots: RobotFileParser | None = None
+        self.crawl_delay: float | None = None
+        self.queue: asyncio.Queue[tuple[str, int]] = asyncio.Queue()
+        # every URI admitted to the frontier, bounded by max_pages
+        self.seen: set[str] = set()
+        # admitted but not finished yet, saved so an interrupted job picks them up again
+        self.pending: dict[str, int] = {}
+        self.results: dict[str, AnalyzeResult] = {}
+        self.failed: dict[str, str] = {}
+        # pages with the same text as an already analyzed one (e.g. / and /index.html) are recorded, not analyzed
+        self.content_hashes: dict[str, str] = {}
+        self.duplicates: dict[str, str] = {}
+        self.status = 'pending'
+
+    @property
+    def progress(self) -> AuditProgress:
+        return AuditProgress(
+            discovered=len(self.seen),
+            analyzed=len(self.results),
+            failed=len(self.failed),
+            duplicates=len(self.duplicates),
+            pending=len(self.pending)
+        )
+
+    def _enqueue(self, uri: str, depth: int):
+        uri = normalize_uri(uri)
+        parts = urlsplit(uri)
+
+        if parts.scheme not in ('http', 'https') or parts.netloc != self.host:
+            return
+        if parts.path.lower().endswith(SKIPPED_EXTENSIONS) or uri in self.seen or len(self.seen) >= self.max_pages:
+            return
+        if self.robots and not self.robots.can_fetch(USER_AGENT, uri):
+            logger.info('Skipping %s, disallowed by robots.txt', uri)
+            return
+
+        self.seen.add(uri)
+        self.pending[uri] = depth
+        self.queue.put_nowait((uri, depth))
+
+    async def _get(self, uri: str) -> httpx.Response | None:
+        try:
+            await self.throttle.wait(urlsplit(uri).netloc, self.crawl_delay)
+            return await self.web_parser.client.get(uri)
+        except httpx.HTTPError as e:
+            logger.warning('Could not fetch %s: %s', uri, e)
+            return None
+
+    async def _load_robots(self):
+        parts = urlsplit(normalize_uri(self.root))
+        response = await self._get(f'{parts.scheme}://{parts.netloc}/robots.txt')
+
+        # without a readable robots.txt everything is allowed
+        if response is None or response.status_code != 200:
+            return
+
+        self.robots = RobotFileParser()
+        self.robots.parse(response.text.splitlines())
+        self.crawl_delay = self.robots.crawl_delay(USER_AGENT)
+
+    async def _load_sitemap(self, uri: str, nesting: int = 0):
+        response = await self._get(uri)
+        if response is None or response.status_code != 200:
+            return
+
+        try:
+            sitemap = ElementTree.fromstring(response.content)
+        except ElementTree.ParseError as e:
+            logger.warning('Invalid sitemap %s: %s', uri, e)
+            return
+
+        for location in sitemap.iter(f'{SITEMAP_NAMESPACE}loc'):
+            location_uri = (location.text or '').strip()
+            if sitemap.tag == f'{SITEMAP_NAMESPACE}sitemapindex':
+                # sitemap indexes are followed one level deep
+                if nesting < 1:
+                    await self._load_sitemap(location_uri, nesting + 1)
+            else:
+                self._enqueue(location_uri, 0)
+
+    def _load_state(self) -> bool:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+
+        with open(self.state_path) as f:
+            state = json.load(f)
+
+        self.seen = set(state['seen'])
+        self.results = {uri: AnalyzeResult.model_validate(result) for uri, result in state['results'].items()}
+        self.failed = state['failed']
+        self.content_hashes = state['content_hashes']
+        self.duplicates = state['duplicates']
+        for uri, depth in state['pending'].items():
+            self.pending[uri] = depth
+            self.queue.put_nowait((uri, depth))
+
+        logger.info('Resuming audit of %s with %d pages done', self.root, len(self.results) + len(self.failed))
+        return True
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+
+        state = {
+            'root': self.root,
+            'seen': sorted(self.seen),
+            'pending': self.pending,
+            'results': {uri: result.model_dump(mode='json') for uri, result in self.results.items()},
+            'failed': self.failed,
+            'content_hashes': self.content_hashes,
+            'duplicates': self.duplicates
+        }
+
+        # write to a temporary file first, so an interrupted write never corrupts the previous state
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    async def _process(self, uri: str, depth: int):
+        try:
+            await self.throttle.wait(urlsplit(uri).netloc, self.crawl_delay)
+            page = await self.web_parser.parse_page(uri)
+
+            if page is None:
+                self.failed[uri] = 'Could not fetch page'
+            else:
+                if depth < self.max_depth:
+                    for link in page.links:
+                        self._enqueue(urljoin(page.uri, link), depth + 1)
+
+                content_hash = hashlib.sha256(page.text.encode()).hexdigest()
+
+                if not page.text:
+                    self.failed[uri] = 'No text content'
+                elif content_hash in self.content_hashes:
+                    self.duplicates[uri] = self.content_hashes[content_hash]
+                else:
+                    self.content_hashes[content_hash] = uri
+                    text = self.content_cleaner.clean(page).text if self.content_cleaner else page.text
+                    async with self.analyze_slots:
+                        self.results[uri] = await self.analysis_service.analyze_text(text, uri, self.client)
+        except HTTPException as e:
+            # rate limit reached or the LLM is unavailable
+            logger.warning('Could not analyze %s: %s', uri, e.detail)
+            self.failed[uri] = e.detail
+        except Exception as e:
+            logger.error('Could not analyze %s: %s', uri, e)
+            self.failed[uri] = 'Could not analyze page'
+
+        del self.pending[uri]
+        self._save_state()
+
+        progress = self.progress
+        logger.info(
+            'Audit of %s: %d analyzed, %d failed, %d duplicates, %d pending',
+            self.root,
+            progress.analyzed,
+            progress.failed,
+            progress.duplicates,
+            progress.pending
+        )
+
+    async def _worker(self):
+        while True:
+            uri, depth = await self.queue.get()
+            try:
+                await self._process(uri, depth)
+            finally:
+                self.queue.task_done()
+
+    async def run(self) -> SiteReport:
+        self.status = 'running'
+        await self._load_robots()
+
+        if not self._load_state():
+            if urlsplit(self.root).path.lower().endswith('.xml'):
+                await self._load_sitemap(self.root)
+            else:
+                self._enqueue(self.root, 0)
+                for sitemap in (self.robots.site_maps() if self.robots else None) or []:
+                    await self._load_sitemap(sitemap)
+            self._save_state()
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            await self.queue.join()
+        except BaseException:
+            self.status = 'interrupted'
+            raise
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+        self.status = 'done'
+        return self.report()
+
+    def report(self) -> SiteReport:
+        scores = sorted(result.overall_score for result in self.results.values())
+
+        # scores are between 1 and 100, bucketed in steps of ten
+        distribution = {f'{low}-{low + 9}': 0 for low in range(1, 100, 10)}
+        for score in scores:
+            low = min((score - 1) // 10, 9) * 10 + 1
+            distribution[f'{low}-{low + 9}'] += 1
+
+        worst = sorted(self.results.items(), key=lambda item: (item[1].overall_score, item[0]))[:self.worst_pages]
+
+        averages = None
+        site_score = None
+        if self.results:
+            averages = CategoryAverages(**{
+                name: statistics.fmean(getattr(result, name) for result in self.results.values())
+                for name in CATEGORY_FIELDS
+            })
+            # the site score applies the same boosts as a single page, to the averaged categories
+            site_score = BiasAnalyzer._calculate_score(AnalyzeResult.model_construct(**averages.model_dump()))
+
+        return SiteReport(
+            root=self.root,
+            pages_analyzed=len(self.results),
+            pages_failed=len(self.failed),
+            pages_duplicate=len(self.duplicates),
+            site_score=site_score,
+            mean_score=statistics.fmean(scores) if scores else None,
+            median_score=statistics.median(scores) if scores else None,
+            min_score=scores[0] if scores else None,
+            max_score=scores[-1] if scores else None,
+            score_distribution=distribution,
+            worst_pages=[AuditPage(uri=uri, overall_score=result.overall_score) for uri, result in worst],
+            category_averages=averages
+        )
+
+
+class AuditJobs:
+
+    def __init__(self, state_directory: str, **job_options):
+        self.state_directory = state_directory
+        self.job_options = job_options
+        self.jobs: dict[str, AuditJob] = {}
+        self.tasks: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def job_id(root: str) -> str:
+        return hashlib.sha256(normalize_uri(root).encode()).hexdigest()[:16]
+
+    def start(
+        self,
+        root: str,
+        web_parser: AsyncWebParser,
+        analysis_service: AnalysisService,
+        client: str = DEFAULT_CLIENT,
+        force: bool = False,
+        **options
+    ) -> str:
+        job_id = self.job_id(root)
+        task = self.tasks.get(job_id)
+
+        # a running audit is not started twice, a finished or interrupted one continues from its saved state unless
+        # forced to start over
+        if task is None or task.done():
+            state_path = os.path.join(self.state_directory, f'{job_id}.json')
+            if force and os.path.exists(state_path):
+                os.remove(state_path)
+            job = AuditJob(
+                root,
+                web_parser,
+                analysis_service,
+                client,
+                state_path=state_path,
+                **(self.job_options | options)
+            )
+            self.jobs[job_id] = job
+            self.tasks[job_id] = asyncio.create_task(self._run(job))
+
+        return job_id
+
+    @staticmethod
+    async def _run(job: AuditJob):
+        try:
+            await job.run()
+        except Exception as e:
+            logger.error('Audit of %s failed: %s', job.root, e)
+            job.status = 'failed'
+
+    def get(self, job_id: str) -> AuditJob | None:
+        return self.jobs.get(job_id)
+
+    async def aclose(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
@@ -0,0 +1,308 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import statistics
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+
+from biasight.bias import BiasAnalyzer
+from biasight.cache import ContentCache
+from biasight.clean import ContentCleaner
+from biasight.model import AnalyzeResult
+from biasight.parse import AsyncWebParser, extract_page
+from biasight.resilience import CircuitOpenError
+from biasight.util import estimate_tokens, normalize_uri
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['fetch', 'extract', 'analyze']
+
+
+def read_uris(path: str, column: str = 'uri') -> Iterator[str]:
+    # CSV files need a header, the column falls back to the first one. JSONL lines are objects with the column as key
+    # or plain strings.
+    with open(path, newline='') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.reader(f)
+            header = next(reader, [])
+            index = header.index(column) if column in header else 0
+            for row in reader:
+                if len(row) > index and row[index].strip():
+                    yield row[index].strip()
+            return
+
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            value = json.loads(line)
+            uri = value.get(column) if isinstance(value, dict) else value
+            if isinstance(uri, str) and uri.strip():
+                yield uri.strip()
+            else:
+                logger.warning('No %s on line %d of %s, skipping', column, number, path)
+
+
+def _extract(
+    uri: str,
+    content: bytes,
+    encoding: str | None,
+    max_content_length: int,
+    max_text_length: int,
+    content_cleaner: ContentCleaner | None
+) -> str:
+    # runs in a worker process, only the text to analyze is sent back
+    page = extract_page(uri, content, encoding, max_content_length, max_text_length)
+    return content_cleaner.clean(page).text if content_cleaner else page.text
+
+
+@dataclass
+class StageStats:
+    done: int = 0
+    failed: int = 0
+    seconds: list[float] = field(default_factory=list)
+    # first start and last end of an item, throughput is measured between them
+    started: float | None = None
+    finished: float | None = None
+
+    def record(self, start: float, success: bool = True):
+        end = time.perf_counter()
+        self.started = start if self.started is None else min(self.started, start)
+        self.finished = end if self.finished is None else max(self.finished, end)
+        self.seconds.append(end - start)
+        if success:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    @property
+    def throughput(self) -> float:
+        if self.started is None or self.finished <= self.started:
+            return 0.0
+        return (self.done + self.failed) / (self.finished - self.started)
+
+    def percentile(self, percentile: int) -> float:
+        if len(self.seconds) < 2:
+            return self.seconds[0] if self.seconds else 0.0
+        return statistics.quantiles(self.seconds, n=100)[percentile - 1]
+
+
+# analyzes a list of URIs in three stages connected by bounded queues: pages are downloaded concurrently, extracted
+# and cleaned in a process pool (or on the event loop without one) and analyzed by a bounded number of concurrent LLM
+# calls. Every finished URI is appended to the output JSONL file right away, which is also the checkpoint: a run
+# started again with the same output skips the URIs found in it. Failed URIs are retried with retry_failed.
+class BatchAnalysis:
+
+    def __init__(
+        self,
+        web_parser: AsyncWebParser,
+        bias_analyzer: BiasAnalyzer,
+        output_path: str,
+        content_cleaner: ContentCleaner | None = None,
+        content_cache: ContentCache | None = None,
+        executor: Executor | None = None,
+        fetch_concurrency: int = 32,
+        extract_concurrency: int = 4,
+        analyze_concurrency: int = 8,
+        queue_size: int = 64,
+        retry_failed: bool = False,
+        sync_interval: float = 5.0
+    ):
+        self.web_parser = web_parser
+        self.bias_analyzer = bias_analyzer
+        self.output_path = output_path
+        self.content_cleaner = content_cleaner
+        # results of texts analyzed before, by this tool or the API, are reused
+        self.content_cache = content_cache
+        self.executor = executor
+        self.fetch_concurrency = fetch_concurrency
+        self.extract_concurrency = extract_concurrency
+        self.analyze_concurrency = analyze_concurrency
+        # bounds the downloaded pages and texts held in memory while a later stage is busy
+        self.queue_size = queue_size
+        self.retry_failed = retry_failed
+        # the output is flushed after every line, written to disk at least this often
+        self.sync_interval = sync_interval
+
+        self.stats = {stage: StageStats() for stage in STAGES}
+        self.skipped = 0
+        self.cached = 0
+        self.written = 0
+        self.output = None
+        self.synced = 0.0
+
+    def load_checkpoint(self) -> set[str]:
+        # normalized URIs with a line in the output. A line cut off by a killed run is removed.
+        done = set()
+        if not os.path.exists(self.output_path):
+            return done
+
+        with open(self.output_path, 'rb+') as f:
+            valid = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid += len(line)
+                if self.retry_failed and 'error' in record:
+                    continue
+                done.add(normalize_uri(record['uri']))
+            if valid < f.seek(0, os.SEEK_END):
+                logger.warning('Removing incomplete last line of %s', self.output_path)
+                f.truncate(valid)
+
+        logger.info('Resuming with %d URIs done in %s', len(done), self.output_path)
+        return done
+
+    def _write(self, record: dict):
+        self.output.write(json.dumps(record) + '\n')
+        self.output.flush()
+        if time.monotonic() - self.synced > self.sync_interval:
+            os.fsync(self.output.fileno())
+            self.synced = time.monotonic()
+
+        self.written += 1
+        if self.written % 100 == 0:
+            analyzed = self.stats['analyze'].done
+            logger.info('%d URIs done, %d failed', analyzed, self.written - analyzed)
+
+    def _fail(self, stage: str, uri: str, start: float, error: str):
+        self.stats[stage].record(start, success=False)
+        self._write({'uri': uri, 'error': error, 'stage': stage})
+
+    async def _fetch(self, uri: str) -> tuple[str, bytes, str | None] | None:
+        start = time.perf_counter()
+        try:
+            download = await self.web_parser.download(uri)
+        except Exception as e:
+            logger.warning('Could not fetch %s: %s', uri, e)
+            self._fail('fetch', uri, start, 'Could not fetch page')
+            return None
+        self.stats['fetch'].record(start)
+        return download
+
+    async def _extract(self, uri: str, download: tuple[str, bytes, str | None]) -> str | None:
+        final_uri, content, encoding = download
+        arguments = (
+            final_uri,
+            content,
+            encoding,
+            self.web_parser.max_content_length,
+            self.web_parser.max_text_length,
+            self.content_cleaner
+        )
+        start = time.perf_counter()
+        try:
+            if self.executor:
+                text = await asyncio.get_running_loop().run_in_executor(self.executor, _extract, *arguments)
+            else:
+                text = _extract(*arguments)
+        except Exception as e:
+            logger.warning('Could not extract %s: %s', uri, e)
+            self._fail('extract', uri, start, 'Could not extract text')
+            return None
+
+        if not text:
+            self._fail('extract', uri, start, 'No text content')
+            return None
+        self.stats['extract'].record(start)
+        return text
+
+    async def _analyze(self, uri: str, text: str):
+        start = time.perf_counter()
+        result = self.content_cache.get(text) if self.content_cache else None
+        if result:
+            self.cached += 1
+        else:
+            try:
+                result = await self._analyze_text(text)
+            except Exception as e:
+                logger.warning('Could not analyze %s: %s', uri, e)
+                self._fail('analyze', uri, start, 'Could not analyze page')
+                return
+            if self.content_cache:
+                self.content_cache.put(
+                    text,
+                    result,
+                    time.perf_counter() - start,
+                    input_tokens=self.bias_analyzer.prompt_tokens + estimate_tokens(text),
+                    output_tokens=estimate_tokens(result.model_dump_json())
+                )
+
+        self.stats['analyze'].record(start)
+        self._write({'uri': uri, 'result': result.model_dump(mode='json')})
+
+    async def _analyze_text(self, text: str) -> AnalyzeResult:
+        # an open circuit would fail every remaining URI within seconds, so the run waits for it instead
+        while True:
+            try:
+                return await self.bias_analyzer.analyze_async(text)
+            except CircuitOpenError as e:
+                logger.warning('LLM circuit is open, pausing for %.0f s', e.retry_after)
+                await asyncio.sleep(e.retry_after)
+
+    async def _worker(self, queue: asyncio.Queue, process, next_queue: asyncio.Queue | None = None):
+        while True:
+            item = await queue.get()
+            try:
+                value = await process(*item)
+                if next_queue is not None and value is not None:
+                    await next_queue.put((item[0], value))
+            finally:
+                queue.task_done()
+
+    async def run(self, uris: Iterable[str]):
+        done = self.load_checkpoint()
+        fetch_queue = asyncio.Queue(self.queue_size)
+        extract_queue = asyncio.Queue(self.queue_size)
+        analyze_queue = asyncio.Queue(self.queue_size)
+
+        workers = [
+            *(self._worker(fetch_queue, self._fetch, extract_queue) for _ in range(self.fetch_concurrency)),
+            *(self._worker(extract_queue, self._extract, analyze_queue) for _ in range(self.extract_concurrency)),
+            *(self._worker(analyze_queue, self._analyze) for _ in range(self.analyze_concurrency))
+        ]
+        tasks = [asyncio.create_task(worker) for worker in workers]
+
+        self.output = open(self.output_path, 'a')
+        with self.output:
+            try:
+                for uri in uris:
+                    key = normalize_uri(uri)
+                    # duplicates in the input are skipped as well
+                    if key in done:
+                        self.skipped += 1
+                        continue
+                    done.add(key)
+                    await fetch_queue.put((uri,))
+
+                # every stage hands its items to the next before marking them done
+                for queue in (fetch_queue, extract_queue, analyze_queue):
+                    await queue.join()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                os.fsync(self.output.fileno())
+
+    def summary(self, seconds: float) -> str:
+        lines = [
+            f'{"stage":<8} {"done":>7} {"failed":>7} {"per s":>8} {"p50 ms":>8} {"p95 ms":>8}'
+        ]
+        for stage, stats in self.stats.items():
+            lines.append(
+                f'{stage:<8} {stats.done:>7} {stats.failed:>7} {stats.throughput:>8.1f} '
+                f'{stats.percentile(50) * 1000:>8.0f} {stats.percentile(95) * 1000:>8.0f}'
+            )
+        analyzed = self.stats['analyze'].done
+        lines.append(
+            f'{analyzed} URIs analyzed in {seconds:.1f} s ({analyzed / seconds if seconds else 0:.1f} per s), '
+            f'{self.cached} from the content cache, {self.skipped} skipped as done'
+        )
+        return '\n'.join(lines)
@@ -1,22 +1,72 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
 from jinja2 import Environment, PackageLoader, select_autoescape
 from pydantic_core import from_json
-from vertexai.generative_models import ChatSession
 
-from biasight.gemini import GeminiClient
+from biasight import metrics
+from biasight.lexicon import GenderLexicon
+from biasight.llm import LLMBackend
 from biasight.model import AnalyzeResult
+from biasight.resilience import CircuitBreaker, Hedger, RetryPolicy
+from biasight.stream import JSONObjectStream
+from biasight.util import estimate_tokens
+
+CATEGORIES = ['stereotyping', 'representation', 'language', 'framing']
+CATEGORY_FIELDS = ['score', 'feedback', 'example']
+
+# split points for long texts, from the most to the least preferred boundary
+BOUNDARIES = [re.compile(r'\n\s*\n'), re.compile(r'\n'), re.compile(r'(?<=[.!?])\s+'), re.compile(r'\s+')]
 
 
 class BiasAnalyzer:
 
-    def __init__(self, gemini_client: GeminiClient):
-        self.gemini_client = gemini_client
+    def __init__(
+        self,
+        llm_backend: LLMBackend,
+        chunk_tokens: int = 0,
+        chunk_concurrency: int = 4,
+        retry_policy: RetryPolicy | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        hedger: Hedger | None = None,
+        lexicon: GenderLexicon | None = None,
+        lexicon_mode: str = 'check'
+    ):
+        self.llm_backend = llm_backend
+        # async LLM calls are retried on their own, including malformed replies, without fetching the page again.
+        # The breaker fails calls fast while the LLM is down and the hedger races a second call against slow ones.
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.hedger = hedger
+        # texts longer than chunk_tokens are analyzed in parts and merged, 0 always uses a single prompt
+        self.chunk_tokens = chunk_tokens
+        self.chunk_concurrency = chunk_concurrency
+        # the mention ratio and the share of neutral language are counted locally and either replace the estimates
+        # of the LLM (replace) or are added to the result next to them (check)
+        self.lexicon = lexicon
+        self.lexicon_mode = lexicon_mode
         self.env = Environment(
             loader=PackageLoader('biasight'),
             autoescape=select_autoescape()
         )
+        # the fixed instructions are sent as system instruction and cached by the client, only the page text is
+        # rendered per request
+        self.instructions = self.env.get_template('instructions.jinja').render()
+        self.template = self.env.get_template('analyze.jinja')
+        template_source, _, _ = self.env.loader.get_source(self.env, 'analyze.jinja')
+        # identifies the prompt version, results produced with different instructions or template are not reused
+        fingerprint = f'{self.instructions}\0{template_source}\0{chunk_tokens}'
+        if lexicon and lexicon_mode == 'replace':
+            fingerprint += f'\0{lexicon.fingerprint}'
+        self.prompt_fingerprint = hashlib.sha256(fingerprint.encode()).hexdigest()
+        self.prompt_tokens = estimate_tokens(self.instructions) + estimate_tokens(template_source)
 
     def _render_template(self, text: str) -> str:
-        return self.env.get_template('analyze.jinja').render(text=text)
+        return self.template.render(text=text)
 
     @staticmethod
     def _calculate_score(analyze_result: AnalyzeResult) -> int:
@@ -46,14 +96,244 @@ class BiasAnalyzer:
         final_score = int(round(max(1, min(100, boosted_score))))
         return final_score
 
-    def analyze(self, text: str) -> AnalyzeResult:
-        prompt = self._render_template(text)
-        chat: ChatSession = self.gemini_client.start_chat()
-        chat_response: str = self.gemini_client.get_chat_response(chat, prompt)
-
+    def _parse_response(self, chat_response: str) -> AnalyzeResult:
         analyze_result = AnalyzeResult.model_validate(from_json(chat_response))
 
         # overall score is calculated via Python instead of using the LLM to ensure deterministic results
         analyze_result.overall_score = self._calculate_score(analyze_result)
 
         return analyze_result
+
+    def _split_text(self, text: str) -> list[str]:
+        max_length = self.chunk_tokens * 4
+        if not self.chunk_tokens or len(text) <= max_length:
+            return [text]
+
+        chunks = []
+        self._pack(text, BOUNDARIES, max_length, chunks)
+        return chunks
+
+    @classmethod
+    def _pack(cls, text: str, boundaries: list[re.Pattern], max_length: int, chunks: list[str]):
+        # greedily joins segments split at the preferred boundary, segments that are still too long are split at
+        # the next boundary
+        if len(text) <= max_length:
+            chunks.append(text)
+            return
+        if not boundaries:
+            chunks.extend(text[i:i + max_length] for i in range(0, len(text), max_length))
+            return
+
+        current = ''
+        for segment in boundaries[0].split(text):
+            if not segment.strip():
+                continue
+            if len(segment) > max_length:
+                if current:
+                    chunks.append(current)
+                    current = ''
+                cls._pack(segment, boundaries[1:], max_length, chunks)
+            elif current and len(current) + 1 + len(segment) > max_length:
+                chunks.append(current)
+                current = segment
+            else:
+                current = f'{current} {segment}' if current else segment
+        if current:
+            chunks.append(current)
+
+    @staticmethod
+    def _merge_results(results: list[AnalyzeResult], weights: list[int]) -> AnalyzeResult:
+        total = sum(weights)
+
+        def weighted_mean(values) -> float:
+            return sum(value * weight for value, weight in zip(values, weights)) / total
+
+        merged = {}
+        for category in CATEGORIES:
+            scores = [getattr(result, f'{category}_score') for result in results]
+            merged[f'{category}_score'] = int(round(weighted_mean(scores)))
+            # feedback and example of the most biased part are the most useful ones
+            worst = results[scores.index(min(scores))]
+            merged[f'{category}_feedback'] = getattr(worst, f'{category}_feedback')
+            merged[f'{category}_example'] = getattr(worst, f'{category}_example')
+
+        # a ratio r splits a part's mentions into r / (1 + r) male and 1 / (1 + r) female, assuming mentions scale
+        # with text length, the shares are summed over all parts. A ratio of 0 means no gendered mentions, those
+        # parts are left out, the merged ratio is only 0 if no part has any.
+        ratios = [
+            (result.male_to_female_mention_ratio, weight)
+            for result, weight in zip(results, weights)
+            if result.male_to_female_mention_ratio > 0
+        ]
+        male = sum(weight * r / (1 + r) for r, weight in ratios)
+        female = sum(weight / (1 + r) for r, weight in ratios)
+        merged['male_to_female_mention_ratio'] = male / female if ratios else 0
+        merged['gender_neutral_language_percentage'] = weighted_mean(
+            result.gender_neutral_language_percentage for result in results
+        )
+
+        # the overall texts are taken from the largest part
+        largest = results[weights.index(max(weights))]
+        merged['summary'] = largest.summary
+        merged['positive_aspects'] = largest.positive_aspects
+        merged['improvement_suggestions'] = largest.improvement_suggestions
+
+        analyze_result = AnalyzeResult.model_validate(merged)
+        analyze_result.overall_score = BiasAnalyzer._calculate_score(analyze_result)
+        return analyze_result
+
+    def count_language(self, text: str, result: AnalyzeResult) -> AnalyzeResult:
+        if not self.lexicon:
+            return result
+
+        with metrics.timed('lexicon'):
+            language = self.lexicon.analyze(text)
+        metrics.lexicon_deviation.labels('mention_ratio').observe(
+            abs(result.male_to_female_mention_ratio - language.male_to_female_mention_ratio)
+        )
+        metrics.lexicon_deviation.labels('neutral_percentage').observe(
+            abs(result.gender_neutral_language_percentage - language.gender_neutral_language_percentage)
+        )
+
+        update = {'language_metrics': language}
+        if self.lexicon_mode == 'replace':
+            update['male_to_female_mention_ratio'] = language.male_to_female_mention_ratio
+            update['gender_neutral_language_percentage'] = language.gender_neutral_language_percentage
+        result = result.model_copy(update=update)
+        result.overall_score = self._calculate_score(result)
+        return result
+
+    def analyze(self, text: str) -> AnalyzeResult:
+        chunks = self._split_text(text)
+        if len(chunks) > 1:
+            results = [self._analyze_chunk(chunk) for chunk in chunks]
+            return self.count_language(text, self._merge_results(results, [len(chunk) for chunk in chunks]))
+
+        return self.count_language(text, self._analyze_chunk(text))
+
+    def _analyze_chunk(self, text: str) -> AnalyzeResult:
+        prompt = self._render_template(text)
+        chat = self.llm_backend.start_chat(self.instructions)
+        chat_response: str = self.llm_backend.get_chat_response(chat, prompt)
+
+        return self._parse_response(chat_response)
+
+    async def analyze_async(self, text: str) -> AnalyzeResult:
+        chunks = self._split_text(text)
+        if len(chunks) > 1:
+            # parts are analyzed in parallel, latency follows the largest part instead of the whole page
+            slots = asyncio.Semaphore(self.chunk_concurrency)
+
+            async def analyze_chunk(chunk: str) -> AnalyzeResult:
+                async with slots:
+                    return await self._analyze_chunk_async(chunk)
+
+            results = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks))
+            return self.count_language(text, self._merge_results(list(results), [len(chunk) for chunk in chunks]))
+
+        return self.count_language(text, await self._analyze_chunk_async(text))
+
+    def _render(self, text: str) -> str:
+        with metrics.timed('render'):
+            return self._render_template(text)
+
+    def _count_prompt(self, prompt: str):
+        # every attempt and hedge sends the prompt again
+        metrics.prompt_tokens.inc(estimate_tokens(self.instructions) + estimate_tokens(prompt))
+
+    def _validate(self, chat_response: str) -> AnalyzeResult:
+        metrics.response_tokens.inc(estimate_tokens(chat_response))
+        with metrics.timed('validate'):
+            return self._parse_response(chat_response)
+
+    async def _analyze_chunk_async(self, text: str) -> AnalyzeResult:
+        prompt = self._render(text)
+
+        async def attempt() -> AnalyzeResult:
+            if self.circuit_breaker:
+                return self._validate(await self.circuit_breaker.call(lambda: self._request(prompt)))
+            return self._validate(await self._request(prompt))
+
+        return await self.retry_policy.run(attempt) if self.retry_policy else await attempt()
+
+    async def _request(self, prompt: str) -> str:
+        async def ask() -> str:
+            # starting a chat may upload the instructions to the context cache, which must not block the event
+            # loop. A hedged call starts its own chat, chats keep a history.
+            self._count_prompt(prompt)
+            with metrics.timed('llm'):
+                chat = await asyncio.to_thread(self.llm_backend.start_chat, self.instructions)
+                return await self.llm_backend.get_chat_response_async(chat, prompt)
+
+        return await self.hedger.run(ask) if self.hedger else await ask()
+
+    @staticmethod
+    def _stream_events(name: str, value: Any, categories: dict[str, dict]) -> list[tuple[str, dict]]:
+        # category fields are collected and sent together once the category is complete
+        category, _, field_name = name.partition('_')
+        if category in CATEGORIES and field_name in CATEGORY_FIELDS:
+            fields = categories.setdefault(category, {})
+            fields[field_name] = value
+            if len(fields) == len(CATEGORY_FIELDS):
+                return [('category', {'category': category, **fields})]
+            return []
+        return [('field', {'name': name, 'value': value})]
+
+    async def analyze_stream(self, text: str) -> AsyncIterator[tuple[str, dict | AnalyzeResult]]:
+        # yields (event, data) pairs: field and category events while the response is generated, then the
+        # validated result
+        categories: dict[str, dict] = {}
+
+        chunks = self._split_text(text)
+        if len(chunks) > 1:
+            # parts are merged at the end, so there is nothing to show before all of them are done
+            result = await self.analyze_async(text)
+            for name, value in result.model_dump(mode='json', exclude={'overall_score'}).items():
+                for event in self._stream_events(name, value, categories):
+                    yield event
+            yield 'result', result
+            return
+
+        prompt = self._render(text)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            events = 0
+            try:
+                parser = JSONObjectStream()
+                async for chunk in self._stream(prompt):
+                    for name, value in parser.feed(chunk):
+                        for event in self._stream_events(name, value, categories):
+                            events += 1
+                            yield event
+                result = self._validate(parser.text)
+                break
+            except Exception as e:
+                # events already sent cannot be taken back, only a stream failing before the first one is retried
+                if events or not self.retry_policy or not await self.retry_policy.backoff(e, attempt, started):
+                    raise
+                attempt += 1
+                categories.clear()
+
+        yield 'result', self.count_language(text, result)
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        if self.circuit_breaker:
+            self.circuit_breaker.before_call()
+        try:
+            self._count_prompt(prompt)
+            start = time.perf_counter()
+            first_chunk = True
+            chat = await asyncio.to_thread(self.llm_backend.start_chat, self.instructions)
+            async for chunk in self.llm_backend.stream_chat_response_async(chat, prompt):
+                if first_chunk:
+                    metrics.observe('llm_first_chunk', time.perf_counter() - start)
+                    first_chunk = False
+                yield chunk
+            metrics.observe('llm', time.perf_counter() - start)
+        except Exception:
+            if self.circuit_breaker:
+                self.circuit_breaker.record_failure()
+            raise
+        if self.circuit_breaker:
+            self.circuit_breaker.record_success()
@@ -0,0 +1,411 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from cachetools import TTLCache
+
+from biasight.config import Settings
+from biasight.model import AnalyzeResult
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_busy(e: sqlite3.OperationalError) -> bool:
+    # another connection held the lock for longer than the busy timeout
+    return (e.sqlite_errorcode & 0xff) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+class CacheBackend(ABC):
+
+    evictions: int = 0
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def close(self):
+        pass
+
+
+class _CountingTTLCache(TTLCache):
+
+    def __init__(self, maxsize: int, ttl: int):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+
+    def popitem(self):
+        # only called when the cache is full, expired entries are dropped via expire()
+        self.evictions += 1
+        return super().popitem()
+
+
+class MemoryCacheBackend(CacheBackend):
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.cache = _CountingTTLCache(maxsize, ttl)
+
+    def get(self, key: str) -> bytes | None:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: bytes):
+        self.cache[key] = value
+
+    def delete(self, key: str):
+        self.cache.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    @property
+    def evictions(self) -> int:
+        return self.cache.evictions
+
+
+class SQLiteCacheBackend(CacheBackend):
+
+    # only refresh the LRU timestamp of an entry once per interval, so reads rarely need a write
+    touch_interval = 1.0
+
+    def __init__(self, path: str, table: str, max_entries: int, max_bytes: int, ttl: int, busy_timeout: float = 0.1):
+        if not table.isidentifier():
+            raise ValueError(f'Invalid cache table name: {table}')
+
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # calls block the event loop while they wait for the lock of another worker, a cache that stays locked for
+        # longer is skipped: reads miss, writes are dropped
+        self.busy_timeout = busy_timeout
+        self.evictions = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # connections must not be shared with forked worker processes, each process opens its own
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        # WAL lets readers in all workers proceed while one writer commits
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+
+        t = self.table
+        connection.executescript(f'''
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS {t} (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS {t}_accessed_at ON {t} (accessed_at);
+            CREATE INDEX IF NOT EXISTS {t}_expires_at ON {t} (expires_at);
+            -- entry count and total size of every cache in the file are maintained by triggers, so limits are checked
+            -- without a table scan
+            CREATE TABLE IF NOT EXISTS cache_usage (
+                name TEXT PRIMARY KEY,
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_usage SELECT '{t}', COUNT(*), COALESCE(SUM(size), 0) FROM {t};
+            CREATE TRIGGER IF NOT EXISTS {t}_usage_insert AFTER INSERT ON {t} BEGIN
+                UPDATE cache_usage SET entries = entries + 1, bytes = bytes + NEW.size WHERE name = '{t}';
+            END;
+            CREATE TRIGGER IF NOT EXISTS {t}_usage_delete AFTER DELETE ON {t} BEGIN
+                UPDATE cache_usage SET entries = entries - 1, bytes = bytes - OLD.size WHERE name = '{t}';
+            END;
+            CREATE TRIGGER IF NOT EXISTS {t}_usage_update AFTER UPDATE OF size ON {t} BEGIN
+                UPDATE cache_usage SET bytes = bytes - OLD.size + NEW.size WHERE name = '{t}';
+            END;
+            COMMIT;
+        ''')
+
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _unless_busy(self):
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if not sqlite_busy(e):
+                raise
+            self.busy += 1
+            logger.warning('Cache %s is busy, skipped: %s', self.table, e)
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self._lock:
+            row = None
+            with self._unless_busy():
+                connection = self._connect()
+                row = connection.execute(
+                    f'SELECT value, expires_at, accessed_at FROM {self.table} WHERE key = ?', (key,)
+                ).fetchone()
+
+            if row is None:
+                return None
+
+            value, expires_at, accessed_at = row
+            if expires_at <= now:
+                with self._unless_busy():
+                    connection.execute(f'DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?', (key, now))
+                return None
+
+            if now - accessed_at > self.touch_interval:
+                with self._unless_busy():
+                    connection.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+
+            return value
+
+    def set(self, key: str, value: bytes):
+        now = time.time()
+        with self._lock, self._unless_busy():
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute(
+                    f'''
+                    INSERT INTO {self.table} (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        value = excluded.value,
+                        size = excluded.size,
+                        expires_at = excluded.expires_at,
+                        accessed_at = excluded.accessed_at
+                    ''',
+                    (key, value, len(value), now + self.ttl, now)
+                )
+                self._evict(connection, now)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    def _usage(self, connection: sqlite3.Connection) -> tuple[int, int]:
+        # entries of this cache, bytes of all caches in the file
+        return connection.execute(
+            'SELECT (SELECT entries FROM cache_usage WHERE name = ?), (SELECT SUM(bytes) FROM cache_usage)',
+            (self.table,)
+        ).fetchone()
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        entries, size = self._usage(connection)
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+
+        # expired entries go first, then the least recently used ones
+        tables = [self.table]
+        if size > self.max_bytes:
+            tables = [name for name, in connection.execute('SELECT name FROM cache_usage WHERE entries > 0')]
+        for table in tables:
+            connection.execute(f'DELETE FROM {table} WHERE expires_at <= ?', (now,))
+        entries, size = self._usage(connection)
+
+        while entries > self.max_entries:
+            # evict a small batch at once, so a full cache does not pay for eviction on every write
+            batch = max(entries - self.max_entries, self.max_entries // 100)
+            self.evictions += self._evict_batch(connection, self.table, batch)
+            entries, size = self._usage(connection)
+
+        while size > self.max_bytes:
+            # the size limit is shared by the caches in the file, the least recently used entries of any of them go
+            table, table_entries, table_bytes = self._least_recently_used(connection)
+            batch = max(1, self.max_entries // 100, (size - self.max_bytes) * table_entries // max(table_bytes, 1) + 1)
+            self.evictions += self._evict_batch(connection, table, batch)
+            entries, size = self._usage(connection)
+
+    @staticmethod
+    def _least_recently_used(connection: sqlite3.Connection) -> tuple[str, int, int]:
+        # the cache holding the least recently used entry, its oldest entry is found with the accessed_at index
+        caches = connection.execute('SELECT name, entries, bytes FROM cache_usage WHERE entries > 0').fetchall()
+        return min(
+            caches,
+            key=lambda cache: connection.execute(f'SELECT MIN(accessed_at) FROM {cache[0]}').fetchone()[0]
+        )
+
+    @staticmethod
+    def _evict_batch(connection: sqlite3.Connection, table: str, batch: int) -> int:
+        return connection.execute(
+            f'''
+            DELETE FROM {table} WHERE key IN (
+                SELECT key FROM {table} ORDER BY accessed_at LIMIT ?
+            )
+            ''',
+            (batch,)
+        ).rowcount
+
+    def delete(self, key: str):
+        with self._lock, self._unless_busy():
+            self._connect().execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._usage(self._connect())[0]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+# compresses the values of another backend with zlib, so more entries fit in the memory or the size limit of the
+# SQLite file. Values are JSON, which starts with '{' while zlib output starts with 'x': both kinds are read, so the
+# level can be changed for an existing cache. Level 0 stores values as they are.
+class CompressedCacheBackend(CacheBackend):
+
+    def __init__(self, backend: CacheBackend, level: int = 6):
+        self.backend = backend
+        self.level = level
+
+    def get(self, key: str) -> bytes | None:
+        value = self.backend.get(key)
+        if value is None or value[:1] != b'x':
+            return value
+        return zlib.decompress(value)
+
+    def set(self, key: str, value: bytes):
+        self.backend.set(key, zlib.compress(value, self.level) if self.level else value)
+
+    def delete(self, key: str):
+        self.backend.delete(key)
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    @property
+    def evictions(self) -> int:
+        return self.backend.evictions
+
+    def close(self):
+        self.backend.close()
+
+
+def create_cache_backend(
+    settings: Settings,
+    table: str,
+    maxsize: int,
+    ttl: int,
+    compression_level: int | None = None
+) -> CacheBackend:
+    if settings.cache_backend == 'sqlite':
+        backend = SQLiteCacheBackend(
+            settings.cache_path,
+            table,
+            maxsize,
+            settings.cache_max_bytes,
+            ttl,
+            settings.cache_busy_timeout
+        )
+    elif settings.cache_backend == 'memory':
+        backend = MemoryCacheBackend(maxsize, ttl)
+    else:
+        raise ValueError(f'Unknown cache backend: {settings.cache_backend}')
+    # without a level values are never compressed, with level 0 compressed values written before are still read
+    if compression_level is None:
+        return backend
+    return CompressedCacheBackend(backend, compression_level)
+
+
+class ContentCache:
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        model: str,
+        prompt_fingerprint: str,
+        input_token_cost: float = 0.0,
+        output_token_cost: float = 0.0
+    ):
+        # entries are addressed by what is sent to the LLM, so there is no staleness to expire, the backend ttl
+        # only bounds how long unused entries are kept
+        self.backend = backend
+        self.namespace = f'{model}\0{prompt_fingerprint}\0'
+        # costs in USD per million tokens
+        self.input_token_cost = input_token_cost
+        self.output_token_cost = output_token_cost
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_llm_seconds = 0.0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256((self.namespace + text).encode()).hexdigest()
+
+    def get(self, text: str) -> AnalyzeResult | None:
+        return self.get_key(self.key(text))
+
+    def get_key(self, key: str, count: bool = True) -> AnalyzeResult | None:
+        # lookups of near-duplicates are not counted, their text was already counted as a miss and the similarity
+        # index counts their hits. The analysis they save is.
+        value = self.backend.get(key)
+
+        if value is None:
+            if count:
+                self.misses += 1
+            return None
+
+        entry = json.loads(value)
+
+        if count:
+            self.hits += 1
+        self.saved_llm_seconds += entry['llm_seconds']
+        self.saved_input_tokens += entry['input_tokens']
+        self.saved_output_tokens += entry['output_tokens']
+        return AnalyzeResult.model_validate(entry['result'])
+
+    def put(self, text: str, result: AnalyzeResult, llm_seconds: float, input_tokens: int, output_tokens: int):
+        value = json.dumps({
+            'result': result.model_dump(mode='json'),
+            'llm_seconds': llm_seconds,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens
+        })
+        self.backend.set(self.key(text), value.encode())
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def saved_cost(self) -> float:
+        return (
+            self.saved_input_tokens * self.input_token_cost + self.saved_output_tokens * self.output_token_cost
+        ) / 1_000_000
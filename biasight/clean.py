@@ -0,0 +1,143 @@
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+from biasight.extract import Block
+from biasight.parse import ParsedPage
+from biasight.util import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# id and class words of elements that hold page furniture rather than content
+BOILERPLATE_LABELS = frozenset([
+    'ad', 'ads', 'advert', 'advertisement', 'banner', 'breadcrumb', 'breadcrumbs', 'comments', 'consent', 'cookie',
+    'cookies', 'gdpr', 'masthead', 'menu', 'modal', 'navbar', 'navigation', 'newsletter', 'pagination', 'popup',
+    'promo', 'related', 'share', 'sharing', 'sidebar', 'social', 'sponsored', 'subscribe', 'toolbar'
+])
+
+WORD = re.compile(r'\w+')
+LABEL_SEPARATOR = re.compile(r'[\s_-]+')
+
+
+@dataclass
+class CleanedText:
+    text: str
+    original: str
+
+    @property
+    def saved_characters(self) -> int:
+        return max(len(self.original) - len(self.text), 0)
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(estimate_tokens(self.original) - estimate_tokens(self.text), 0)
+
+
+# reduces the extracted text to the main content before it is sent to the LLM. Blocks inside boilerplate elements
+# (cookie banners, related articles, sharing widgets) and link-heavy blocks (menus, tag clouds) are dropped, as are
+# blocks repeating an earlier one word for word or nearly so (cards, "Read more"). Blocks shorter than min_words
+# are only kept when they are next to a run of longer content blocks, like headings and list items in an article.
+class ContentCleaner:
+
+    def __init__(self, min_words: int = 10, max_link_density: float = 0.5, duplicate_threshold: float = 0.8):
+        self.min_words = min_words
+        self.max_link_density = max_link_density
+        # minimum Jaccard similarity of word trigrams for a block to count as a near-duplicate
+        self.duplicate_threshold = duplicate_threshold
+
+        self.requests = 0
+        self.original_characters = 0
+        self.saved_characters = 0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def _is_boilerplate(block: Block) -> bool:
+        return any(word in BOILERPLATE_LABELS for word in LABEL_SEPARATOR.split(block.labels))
+
+    def _is_link_dense(self, block: Block) -> bool:
+        return block.link_length > len(block.text) * self.max_link_density
+
+    @staticmethod
+    def _shingles(words: list[str]) -> set[tuple[str, ...]]:
+        if len(words) < 3:
+            return {tuple(words)}
+        return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+    def _deduplicate(self, texts: list[str]) -> list[tuple[str, int]]:
+        # returns the first occurrence of each block with its word count, candidates for near-duplicates are found
+        # through the trigrams they share with kept blocks
+        kept: list[tuple[str, int]] = []
+        kept_shingles: list[set[tuple[str, ...]]] = []
+        index: dict[tuple[str, ...], list[int]] = {}
+
+        for text in texts:
+            # numbers are masked, so cards only differing in a date or a count match
+            words = ['#' if word.isdigit() else word for word in WORD.findall(text.lower())]
+            if not words:
+                continue
+            shingles = self._shingles(words)
+
+            shared = Counter(i for shingle in shingles for i in index.get(shingle, ()))
+            if any(
+                count / (len(shingles) + len(kept_shingles[i]) - count) >= self.duplicate_threshold
+                for i, count in shared.items()
+            ):
+                continue
+
+            for shingle in shingles:
+                index.setdefault(shingle, []).append(len(kept))
+            kept.append((text, len(words)))
+            kept_shingles.append(shingles)
+
+        return kept
+
+    def _main_content(self, blocks: list[tuple[str, int]]) -> list[str]:
+        long = [words >= self.min_words for _, words in blocks]
+        if not any(long):
+            return [text for text, _ in blocks]
+
+        # a run of short blocks is kept when it borders a long block on either side
+        texts = []
+        start = 0
+        while start < len(blocks):
+            end = start
+            while end < len(blocks) and long[end] == long[start]:
+                end += 1
+            if long[start] or (start > 0 and long[start - 1]) or (end < len(blocks) and long[end]):
+                texts.extend(text for text, _ in blocks[start:end])
+            start = end
+        return texts
+
+    def clean(self, page: ParsedPage) -> CleanedText:
+        blocks = page.blocks or [Block(page.text)]
+
+        texts = [
+            ' '.join(block.text.split())
+            for block in blocks
+            if not self._is_boilerplate(block) and not self._is_link_dense(block)
+        ]
+        # blocks are put on separate lines so that long pages are chunked on block boundaries
+        text = '\n'.join(self._main_content(self._deduplicate(texts)))
+
+        if not text:
+            # nothing looked like content, better send the whole page than nothing
+            text = ' '.join(page.text.split())
+
+        cleaned = CleanedText(text, page.text)
+        self.requests += 1
+        self.original_characters += len(page.text)
+        self.saved_characters += cleaned.saved_characters
+        self.saved_tokens += cleaned.saved_tokens
+        logger.info(
+            'Preprocessing saved %d characters (~%d tokens) of %d for %s',
+            cleaned.saved_characters,
+            cleaned.saved_tokens,
+            len(page.text),
+            page.uri
+        )
+        return cleaned
+
+    @property
+    def reduction(self) -> float:
+        return self.saved_characters / self.original_characters if self.original_characters else 0.0
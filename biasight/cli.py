@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from biasight.batch import BatchAnalysis, read_uris
+from biasight.config import Settings
+from biasight.container import Container
+from biasight.util import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='biasight',
+        description='Analyzes the URIs of a JSONL or CSV file and writes the results as JSONL. Settings are read from '
+                    'the environment and .env like the API. A run started again with the same output resumes.'
+    )
+    parser.add_argument('input', help='JSONL file with one object or string per line, or CSV file with a header')
+    parser.add_argument('-o', '--output', help='JSONL output and checkpoint (default: <input>.results.jsonl)')
+    parser.add_argument('--column', default='uri', help='key or CSV column holding the URI (default: uri)')
+    parser.add_argument('--fetch-concurrency', type=int, default=32, help='concurrent downloads (default: 32)')
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='extraction processes, 0 extracts on the event loop (default: CPU count)'
+    )
+    parser.add_argument(
+        '--llm-concurrency',
+        type=int,
+        help='concurrent analyses calling the LLM (default: LLM_MAX_CONCURRENT)'
+    )
+    parser.add_argument('--retry-failed', action='store_true', help='analyze URIs that failed in a previous run again')
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace, settings: Settings) -> BatchAnalysis:
+    container = Container(settings)
+    executor = ProcessPoolExecutor(args.processes) if args.processes else None
+    batch = BatchAnalysis(
+        container.web_parser,
+        container.bias_analyzer,
+        args.output or f'{os.path.splitext(args.input)[0]}.results.jsonl',
+        content_cleaner=container.content_cleaner,
+        content_cache=container.content_cache,
+        executor=executor,
+        fetch_concurrency=args.fetch_concurrency,
+        extract_concurrency=args.processes or 1,
+        analyze_concurrency=args.llm_concurrency or settings.llm_max_concurrent or 8,
+        retry_failed=args.retry_failed
+    )
+    try:
+        await batch.run(read_uris(args.input, args.column))
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        await container.aclose()
+    return batch
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    setup_logging()
+    # a line per request would drown the progress
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    start = time.perf_counter()
+    try:
+        batch = asyncio.run(run(args, Settings()))
+    except KeyboardInterrupt:
+        logger.warning('Interrupted, run the same command again to resume')
+        sys.exit(130)
+    print(batch.summary(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,83 @@ class Settings(BaseSettings):
     gcp_location: str
     gcp_service_account_file: str
     gcp_gemini_model: str = 'gemini-2.0-flash'
+    gcp_context_cache_ttl: int = 3600
+    llm_backend: str = 'gemini'
+    llm_record_path: str = ''
+    llm_replay_path: str = 'benchmarks/recordings/responses.jsonl'
+    llm_replay_latency: float = 1.0
+    llm_replay_latency_sigma: float = 0.3
+    llm_replay_token_rate: float = 200.0
+    llm_replay_token_rate_sigma: float = 0.2
+    llm_failure_rate: float = 0.0
+    llm_malformed_rate: float = 0.0
     parse_max_content_length: int = 1048576
     parse_chunk_size: int = 8192
+    parse_max_text_length: int = 262144
+    parse_connect_timeout: float = 5.0
+    parse_read_timeout: float = 15.0
+    parse_max_connections: int = 100
+    parse_max_connections_per_host: int = 6
+    validator_cache_size: int = 10000
+    validator_cache_ttl: int = 604800
+    fetch_retry_attempts: int = 3
+    fetch_retry_base_delay: float = 0.5
+    fetch_retry_deadline: float = 20.0
+    llm_retry_attempts: int = 3
+    llm_retry_base_delay: float = 1.0
+    llm_retry_deadline: float = 90.0
+    llm_breaker_failures: int = 5
+    llm_breaker_reset_timeout: float = 30.0
+    llm_hedge_percentile: int = 0
+    llm_hedge_min_samples: int = 20
+    llm_max_concurrent: int = 8
+    llm_queue_size: int = 64
+    llm_queue_max_wait: float = 15.0
+    analyze_chunk_tokens: int = 16000
+    analyze_chunk_concurrency: int = 4
+    lexicon_mode: str = 'check'
+    similar_enabled: bool = True
+    similar_max_distance: int = 3
+    similar_max_entries: int = 100000
+    similar_min_words: int = 50
+    preprocess_enabled: bool = True
+    preprocess_min_words: int = 10
+    preprocess_max_link_density: float = 0.5
+    preprocess_duplicate_threshold: float = 0.8
+    warm_up: bool = False
+    metrics_enabled: bool = True
+    metrics_server_timing: bool = False
     daily_limit: int = 20
+    quick_daily_limit: int = 200
+    rate_limit_period: int = 86400
+    rate_limit_api_keys: str = ''
+    rate_limit_trust_forwarded: bool = False
+    rate_limit_trusted_proxies: int = 1
+    cache_backend: str = 'sqlite'
+    cache_path: str = '.cache/biasight.db'
+    cache_max_bytes: int = 268435456
+    cache_compression_level: int = 0
+    cache_busy_timeout: float = 0.1
     cache_size: int = 1000
     cache_ttl: int = 3600
+    content_cache_size: int = 10000
+    content_cache_ttl: int = 604800
+    llm_input_token_cost: float = 0.10
+    llm_output_token_cost: float = 0.40
+    audit_enabled: bool = False
+    audit_path: str = '.cache/audits'
+    audit_max_pages: int = 50
+    audit_max_depth: int = 3
+    audit_concurrency: int = 4
+    audit_analyze_concurrency: int = 2
+    audit_delay: float = 1.0
     telegram_enabled: bool = False
     telegram_token: str = ''
     telegram_chat_id: int = 0
+    telegram_timeout: float = 10.0
+    notify_queue_size: int = 1000
+    notify_batch_size: int = 20
+    notify_batch_interval: float = 5.0
+    notify_min_interval: float = 3.0
+    notify_overflow: str = 'drop_oldest'
+    notify_flush_timeout: float = 5.0
@@ -0,0 +1,281 @@
+import logging
+import threading
+from collections.abc import Callable
+from typing import Generic, TypeVar
+
+from biasight.admission import AdmissionController
+from biasight.audit import AuditJobs
+from biasight.bias import BiasAnalyzer
+from biasight.cache import CacheBackend, ContentCache, create_cache_backend
+from biasight.clean import ContentCleaner
+from biasight.config import Settings
+from biasight.lexicon import GenderLexicon
+from biasight.limit import RateLimiter, create_rate_limiter
+from biasight.llm import LLMBackend, create_llm_backend
+from biasight.notify import Notifier, create_notifier
+from biasight.parse import AsyncWebParser, retryable_fetch_error
+from biasight.resilience import CircuitBreaker, CircuitOpenError, Hedger, RetryPolicy
+from biasight.service import AnalysisService
+from biasight.similar import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+# like functools.cached_property, but the component is only created once when several threads ask for it at the same
+# time (the warm-up runs in a thread). Components depend on each other without cycles, so the locks cannot deadlock.
+class component(Generic[T]):
+
+    def __init__(self, create: Callable[['Container'], T]):
+        self.create = create
+        self.name = create.__name__
+
+    def __get__(self, container: 'Container', owner: type | None = None) -> T:
+        if container is None:
+            return self
+        # created components are found in the instance dict before this descriptor is asked again
+        with container.locks.setdefault(self.name, threading.RLock()):
+            if self.name not in container.__dict__:
+                container.__dict__[self.name] = self.create(container)
+        return container.__dict__[self.name]
+
+
+# creates the components of the app from the settings on first use. Nothing is opened or imported before a request
+# needs it, so requests like /limit are served without waiting for the LLM client, and the Gemini client itself is
+# only initialized with the first LLM call or the warm-up.
+class Container:
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.locks: dict[str, threading.RLock] = {}
+
+    def created(self, name: str) -> bool:
+        return name in self.__dict__
+
+    @component
+    def llm_backend(self) -> LLMBackend:
+        # Gemini by default, recorded responses can be replayed for load tests without GCP credentials
+        return create_llm_backend(self.settings)
+
+    @component
+    def fetch_retry_policy(self) -> RetryPolicy:
+        # fetching and LLM calls are retried separately with backoff, so a failed LLM call does not fetch the page again
+        return RetryPolicy(
+            'Fetch',
+            attempts=self.settings.fetch_retry_attempts,
+            base_delay=self.settings.fetch_retry_base_delay,
+            deadline=self.settings.fetch_retry_deadline,
+            retryable=retryable_fetch_error
+        )
+
+    @component
+    def llm_retry_policy(self) -> RetryPolicy:
+        return RetryPolicy(
+            'LLM call',
+            attempts=self.settings.llm_retry_attempts,
+            base_delay=self.settings.llm_retry_base_delay,
+            deadline=self.settings.llm_retry_deadline,
+            retryable=lambda e: not isinstance(e, CircuitOpenError)
+        )
+
+    @component
+    def circuit_breaker(self) -> CircuitBreaker:
+        return CircuitBreaker(self.settings.llm_breaker_failures, self.settings.llm_breaker_reset_timeout)
+
+    @component
+    def hedger(self) -> Hedger | None:
+        # hedging doubles the LLM calls of the slowest requests, so it is off unless a percentile is configured
+        if not self.settings.llm_hedge_percentile:
+            return None
+        return Hedger(self.settings.llm_hedge_percentile, self.settings.llm_hedge_min_samples)
+
+    @component
+    def lexicon(self) -> GenderLexicon:
+        return GenderLexicon()
+
+    @component
+    def bias_analyzer(self) -> BiasAnalyzer:
+        return BiasAnalyzer(
+            self.llm_backend,
+            chunk_tokens=self.settings.analyze_chunk_tokens,
+            chunk_concurrency=self.settings.analyze_chunk_concurrency,
+            retry_policy=self.llm_retry_policy,
+            circuit_breaker=self.circuit_breaker,
+            hedger=self.hedger,
+            # counts gendered language locally to check (or replace) the estimates of the LLM, off sends only them
+            lexicon=self.lexicon if self.settings.lexicon_mode != 'off' else None,
+            lexicon_mode=self.settings.lexicon_mode
+        )
+
+    @component
+    def web_parser(self) -> AsyncWebParser:
+        settings = self.settings
+        return AsyncWebParser(
+            settings.parse_max_content_length,
+            settings.parse_chunk_size,
+            connect_timeout=settings.parse_connect_timeout,
+            read_timeout=settings.parse_read_timeout,
+            max_connections=settings.parse_max_connections,
+            max_connections_per_host=settings.parse_max_connections_per_host,
+            max_text_length=settings.parse_max_text_length,
+            retry_policy=self.fetch_retry_policy,
+            # ETag / Last-Modified per URI, unchanged pages are revalidated instead of downloaded again
+            validators=create_cache_backend(
+                settings,
+                'validators',
+                settings.validator_cache_size,
+                settings.validator_cache_ttl
+            )
+        )
+
+    @component
+    def rate_limiter(self) -> RateLimiter:
+        # per client token buckets, the default SQLite store is shared by all workers on the host
+        return create_rate_limiter(self.settings)
+
+    @component
+    def quick_rate_limiter(self) -> RateLimiter:
+        # quick analyses only fetch the page, they get a larger bucket of their own
+        return create_rate_limiter(self.settings, self.settings.quick_daily_limit, 'quick_rate_limits')
+
+    @component
+    def api_keys(self) -> frozenset[str]:
+        return frozenset(key.strip() for key in self.settings.rate_limit_api_keys.split(',') if key.strip())
+
+    @component
+    def notifier(self) -> Notifier:
+        # notifications are queued and sent in batches by a background task, pending ones are flushed on shutdown
+        return create_notifier(self.settings)
+
+    @component
+    def result_cache(self) -> CacheBackend:
+        # cache for results to avoid analyzing the same URI again in a short amount of time
+        # ttl = seconds after which results will be invalidated
+        # the default SQLite backend is shared by all workers on the host and survives restarts
+        # entries are the encoded responses, optionally compressed, so hits are sent without serializing them again
+        settings = self.settings
+        return create_cache_backend(
+            settings,
+            'results',
+            settings.cache_size,
+            settings.cache_ttl,
+            settings.cache_compression_level
+        )
+
+    @component
+    def quick_cache(self) -> CacheBackend:
+        # local counts of quick analyses, so repeated quick requests do not fetch the page again
+        settings = self.settings
+        return create_cache_backend(settings, 'quick_results', settings.cache_size, settings.cache_ttl)
+
+    @component
+    def content_cache(self) -> ContentCache:
+        # second level cache keyed by the extracted page text, the model and the prompt template
+        settings = self.settings
+        return ContentCache(
+            create_cache_backend(
+                settings,
+                'contents',
+                settings.content_cache_size,
+                settings.content_cache_ttl,
+                settings.cache_compression_level
+            ),
+            settings.gcp_gemini_model,
+            self.bias_analyzer.prompt_fingerprint,
+            settings.llm_input_token_cost,
+            settings.llm_output_token_cost
+        )
+
+    @component
+    def content_cleaner(self) -> ContentCleaner | None:
+        # strips menus, banners and repeated blocks from the page text to save input tokens
+        if not self.settings.preprocess_enabled:
+            return None
+        return ContentCleaner(
+            min_words=self.settings.preprocess_min_words,
+            max_link_density=self.settings.preprocess_max_link_density,
+            duplicate_threshold=self.settings.preprocess_duplicate_threshold
+        )
+
+    @component
+    def admission(self) -> AdmissionController | None:
+        # bounds concurrent LLM calls and sheds requests that would wait too long, 0 leaves them unbounded
+        if not self.settings.llm_max_concurrent:
+            return None
+        return AdmissionController(
+            self.settings.llm_max_concurrent,
+            self.settings.llm_queue_size,
+            self.settings.llm_queue_max_wait
+        )
+
+    @component
+    def similar_pages(self) -> SimilarityIndex | None:
+        # SimHash fingerprints of analyzed texts, near-duplicates reuse the cached result of the page they resemble
+        if not self.settings.similar_enabled:
+            return None
+        return SimilarityIndex(
+            self.settings.similar_max_distance,
+            self.settings.similar_max_entries,
+            self.settings.similar_min_words
+        )
+
+    @component
+    def analysis_service(self) -> AnalysisService:
+        return AnalysisService(
+            self.web_parser,
+            self.bias_analyzer,
+            self.rate_limiter,
+            self.notifier,
+            self.result_cache,
+            self.content_cache,
+            self.content_cleaner,
+            self.admission,
+            self.similar_pages,
+            self.lexicon,
+            self.quick_rate_limiter,
+            self.quick_cache
+        )
+
+    @component
+    def audit_jobs(self) -> AuditJobs:
+        # site audits crawl a whole domain in the background, disabled by default as every page costs an LLM call
+        settings = self.settings
+        return AuditJobs(
+            settings.audit_path,
+            max_pages=settings.audit_max_pages,
+            max_depth=settings.audit_max_depth,
+            concurrency=settings.audit_concurrency,
+            analyze_concurrency=settings.audit_analyze_concurrency,
+            delay=settings.audit_delay,
+            content_cleaner=self.content_cleaner
+        )
+
+    def warm_up(self):
+        # blocking, run in a thread: creates the components an analysis needs and initializes the LLM client, which
+        # also uploads the cached system instruction
+        try:
+            self.analysis_service.bias_analyzer.llm_backend.start_chat(self.bias_analyzer.instructions)
+            logger.info('Warm-up done')
+        except Exception as e:
+            logger.warning('Warm-up failed, components are created with the first request: %s', e)
+
+    async def aclose(self):
+        # only components that were created are closed
+        if self.created('audit_jobs'):
+            await self.audit_jobs.aclose()
+        if self.created('web_parser'):
+            await self.web_parser.aclose()
+            self.web_parser.validators.close()
+        if self.created('notifier'):
+            await self.notifier.aclose()
+        if self.created('result_cache'):
+            self.result_cache.close()
+        if self.created('rate_limiter'):
+            self.rate_limiter.store.close()
+        if self.created('quick_rate_limiter'):
+            self.quick_rate_limiter.store.close()
+        if self.created('quick_cache'):
+            self.quick_cache.close()
+        if self.created('content_cache'):
+            self.content_cache.backend.close()
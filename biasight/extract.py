@@ -0,0 +1,204 @@
+from dataclasses import dataclass
+from html.entities import html5
+from html.parser import HTMLParser
+
+# text directly inside these elements is never visible
+SKIPPED_TAGS = frozenset(['style', 'script', 'head', 'title', 'meta', 'svg', 'path', 'noscript', 'header', 'footer', 'nav'])
+
+# elements without content, closed as soon as they are opened (same list as BeautifulSoup)
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param',
+    'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'
+])
+
+# elements that start a new block of text, e.g. a paragraph, a list item or a card
+BLOCK_TAGS = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'details', 'dialog', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'li', 'main', 'ol', 'p', 'pre',
+    'section', 'summary', 'table', 'td', 'th', 'tr', 'ul'
+])
+
+
+@dataclass
+class Block:
+    text: str
+    # characters of the text inside links
+    link_length: int = 0
+    # id and class attributes of the enclosing elements, lowercased
+    labels: str = ''
+
+
+# incremental counterpart of WebParser._text_from_html: chunks are fed as they arrive and visible text is collected
+# without building a tree. Like the BeautifulSoup implementation, a text node is visible unless its direct parent
+# element is skipped, has a non-empty hidden attribute or aria-hidden="true". Once max_text_length characters are
+# collected, done is set and further input is ignored. The href of every link is collected along the way, and the
+# text is also grouped into blocks split at block-level elements, for ContentCleaner.
+class TextExtractor(HTMLParser):
+
+    def __init__(self, max_text_length: int = 0):
+        # references are resolved by hand to match how BeautifulSoup treats unknown and windows-1252 references
+        super().__init__(convert_charrefs=False)
+        self.max_text_length = max_text_length
+        # open elements as (tag, text directly inside is hidden, id and class)
+        self.stack: list[tuple[str, bool, str]] = []
+        self.pending: list[str] = []
+        self.texts: list[str] = []
+        self.text_length = 0
+        self.links: list[str] = []
+        self.blocks: list[Block] = []
+        # texts, link length and labels of the block being collected
+        self.block_texts: list[str] = []
+        self.block_link_length = 0
+        self.block_labels = ''
+        self.done = False
+
+    @staticmethod
+    def _hides_text(tag: str, attrs: list[tuple[str, str | None]]) -> bool:
+        if tag in SKIPPED_TAGS:
+            return True
+        for name, value in attrs:
+            if name == 'hidden' and value:
+                return True
+            if name == 'aria-hidden' and value == 'true':
+                return True
+        return False
+
+    @staticmethod
+    def _labels(tag: str, attrs: list[tuple[str, str | None]]) -> str:
+        # classes on the document element describe the page as a whole (e.g. has-sidebar), not its blocks
+        if tag in ('html', 'body'):
+            return ''
+        return ' '.join(value.lower() for name, value in attrs if name in ('id', 'class') and value)
+
+    def _push(self, tag: str, attrs: list[tuple[str, str | None]]):
+        self.stack.append((tag, self._hides_text(tag, attrs), self._labels(tag, attrs)))
+
+    def _end_block(self):
+        if self.block_texts:
+            self.blocks.append(Block(' '.join(self.block_texts), self.block_link_length, self.block_labels))
+            self.block_texts = []
+            self.block_link_length = 0
+
+    def _add_to_block(self, text: str):
+        if not self.block_texts:
+            self.block_labels = ' '.join(labels for _, _, labels in self.stack if labels)
+        self.block_texts.append(text)
+        if any(tag == 'a' for tag, _, _ in self.stack):
+            self.block_link_length += len(text)
+
+    def _flush(self):
+        # a text node ends at the next markup, so its visibility is decided by the element it was opened in
+        if not self.pending:
+            return
+
+        text = ''.join(self.pending).strip()
+        self.pending.clear()
+
+        # text outside of any element belongs to the document itself and is not visible
+        if not text or not self.stack or self.stack[-1][1] or self.done:
+            return
+
+        if self.max_text_length:
+            # account for the separating space added when joining
+            remaining = self.max_text_length - self.text_length - (1 if self.texts else 0)
+            if len(text) >= remaining:
+                text = text[:max(remaining, 0)]
+                self.done = True
+            if not text:
+                return
+
+        self.texts.append(text)
+        self.text_length += len(text) + (1 if len(self.texts) > 1 else 0)
+        self._add_to_block(text)
+
+    def feed(self, data: str):
+        if not self.done:
+            super().feed(data)
+
+    def _collect_link(self, tag: str, attrs: list[tuple[str, str | None]]):
+        if tag == 'a':
+            for name, value in attrs:
+                if name == 'href' and value:
+                    self.links.append(value)
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        self._flush()
+        if tag in BLOCK_TAGS:
+            self._end_block()
+        self._collect_link(tag, attrs)
+        if tag not in VOID_TAGS:
+            self._push(tag, attrs)
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        self._flush()
+        if tag in BLOCK_TAGS:
+            self._end_block()
+        self._collect_link(tag, attrs)
+
+    def handle_endtag(self, tag: str):
+        self._flush()
+        if tag in BLOCK_TAGS:
+            self._end_block()
+        # close the most recent matching element and everything opened inside it, stray end tags are ignored
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data: str):
+        self.pending.append(data)
+
+    def handle_entityref(self, name: str):
+        self.pending.append(html5.get(name + ';', '&' + name))
+
+    def handle_charref(self, name: str):
+        try:
+            codepoint = int(name[1:], 16) if name[:1] in ('x', 'X') else int(name)
+        except ValueError:
+            self.pending.append('\N{REPLACEMENT CHARACTER}')
+            return
+
+        character = None
+        if 0 < codepoint < 256:
+            try:
+                character = bytes([codepoint]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        # surrogates could not even be encoded as UTF-8, they are replaced like 0 and code points beyond Unicode
+        if not character and 0 < codepoint <= 0x10FFFF and not 0xD800 <= codepoint <= 0xDFFF:
+            character = chr(codepoint)
+        self.pending.append(character or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_comment(self, data: str):
+        self._flush()
+
+    def handle_decl(self, decl: str):
+        self._flush()
+
+    def handle_pi(self, data: str):
+        self._flush()
+        self.pending.append(data)
+        self._flush()
+
+    def unknown_decl(self, data: str):
+        self._flush()
+        if data.startswith('CDATA['):
+            self.pending.append(data[6:])
+            self._flush()
+
+    def close(self):
+        if not self.done:
+            super().close()
+        self._flush()
+        self._end_block()
+
+    @property
+    def text(self) -> str:
+        return ' '.join(self.texts)
+
+
+def extract_text(html_content: str, max_text_length: int = 0) -> str:
+    extractor = TextExtractor(max_text_length)
+    extractor.feed(html_content)
+    extractor.close()
+    return extractor.text
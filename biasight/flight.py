@@ -0,0 +1,51 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.calls: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    @staticmethod
+    def _consume_exception(task: asyncio.Task):
+        # avoid "exception was never retrieved" warnings if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+
+    def start(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[asyncio.Task, bool]:
+        # the in-flight task for the key, or a new one running fn, and whether it was already in flight
+        task = self.calls.get(key)
+        shared = task is not None
+
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            # the work runs in its own task, so a disconnecting caller does not cancel it for everyone else
+            task = asyncio.create_task(fn())
+            task.add_done_callback(self._consume_exception)
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.calls[key] = task
+        return task, shared
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        # returns the result and whether it was shared with an earlier in-flight call for the same key
+        task, shared = self.start(key, fn)
+        # leader failures are handed to every waiter as-is, followers never start their own attempt
+        return await asyncio.shield(task), shared
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.calls)
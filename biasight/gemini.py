@@ -1,10 +1,19 @@
+import hashlib
 import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from datetime import timedelta
 
 import vertexai
 from google.oauth2.service_account import Credentials
 from vertexai import generative_models
+from vertexai.caching import CachedContent
 from vertexai.generative_models import GenerativeModel, ChatSession
 
+from biasight.llm import LLMBackend
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,18 +39,104 @@ SAFETY_CONFIG = [
 ]
 
 
-class GeminiClient:
+class ContextCacheBackend(ABC):
+
+    @abstractmethod
+    def upload(self, system_instruction: str, ttl: int) -> GenerativeModel:
+        # stores the instruction server side and returns a model referring to it
+        pass
+
+    @abstractmethod
+    def uncached(self, system_instruction: str) -> GenerativeModel:
+        # returns a model sending the instruction with every request
+        pass
+
+
+class VertexContextCacheBackend(ContextCacheBackend):
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def upload(self, system_instruction: str, ttl: int) -> GenerativeModel:
+        cached_content = CachedContent.create(
+            model_name=self.model,
+            system_instruction=system_instruction,
+            ttl=timedelta(seconds=ttl)
+        )
+        logger.info('Cached system instruction as %s', cached_content.resource_name)
+        return GenerativeModel.from_cached_content(cached_content, safety_settings=SAFETY_CONFIG)
+
+    def uncached(self, system_instruction: str) -> GenerativeModel:
+        return GenerativeModel(self.model, safety_settings=SAFETY_CONFIG, system_instruction=system_instruction)
+
+
+# keeps the fixed instructions of the prompt as cached content, so they are uploaded once per ttl and billed at the
+# cached token rate instead of with every request. The cached content is uploaded again shortly before it expires and
+# whenever the instruction changes. If caching fails (e.g. the instruction is below the minimum cacheable size),
+# the instruction is sent with every request and caching is tried again after retry_interval seconds.
+class InstructionCache:
 
-    def __init__(self, project_id: str, location: str, credentials: Credentials, model: str):
+    def __init__(self, backend: ContextCacheBackend, ttl: int, refresh_margin: int = 60, retry_interval: int = 600):
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        # (instruction fingerprint, model, refresh at)
+        self.cached: tuple[str, GenerativeModel, float] | None = None
+        self.fallback: tuple[str, GenerativeModel] | None = None
+        self.unavailable_until = 0.0
+        self.uploads = 0
+        self.failures = 0
+        # uploads block, concurrent callers wait for the first one instead of uploading the same instruction again
+        self.lock = threading.Lock()
+
+    def model(self, system_instruction: str) -> GenerativeModel:
+        fingerprint = hashlib.sha256(system_instruction.encode()).hexdigest()
+
+        with self.lock:
+            now = time.monotonic()
+            if self.cached and self.cached[0] == fingerprint and now < self.cached[2]:
+                return self.cached[1]
+
+            if self.ttl and now >= self.unavailable_until:
+                try:
+                    model = self.backend.upload(system_instruction, self.ttl)
+                    self.uploads += 1
+                    self.cached = (fingerprint, model, now + max(self.ttl - self.refresh_margin, 0))
+                    return model
+                except Exception as e:
+                    logger.warning('Context caching unavailable, sending instructions with every request: %s', e)
+                    self.failures += 1
+                    self.cached = None
+                    self.unavailable_until = now + self.retry_interval
+
+            if not self.fallback or self.fallback[0] != fingerprint:
+                self.fallback = (fingerprint, self.backend.uncached(system_instruction))
+            return self.fallback[1]
+
+
+class GeminiClient(LLMBackend):
+
+    def __init__(
+        self,
+        project_id: str,
+        location: str,
+        credentials: Credentials,
+        model: str,
+        context_cache_ttl: int = 3600
+    ):
         vertexai.init(project=project_id, location=location, credentials=credentials)
 
         logger.info('Loading model: %s', model)
         logger.info('Generation config: %s', GENERATION_CONFIG)
 
         self.model = GenerativeModel(model, safety_settings=SAFETY_CONFIG)
+        # context_cache_ttl = seconds the system instruction is kept as cached content, 0 disables context caching
+        self.instruction_cache = InstructionCache(VertexContextCacheBackend(model), context_cache_ttl)
 
-    def start_chat(self) -> ChatSession:
-        return self.model.start_chat(response_validation=False)
+    def start_chat(self, system_instruction: str | None = None) -> ChatSession:
+        model = self.instruction_cache.model(system_instruction) if system_instruction else self.model
+        return model.start_chat(response_validation=False)
 
     @staticmethod
     def get_chat_response(chat: ChatSession, prompt: str) -> str:
@@ -50,3 +145,10 @@ class GeminiClient:
         for chunk in responses:
             text_response.append(chunk.text)
         return ''.join(text_response)
+
+    @staticmethod
+    async def stream_chat_response_async(chat: ChatSession, prompt: str) -> AsyncIterator[str]:
+        # yields the text of every chunk as soon as Gemini sends it
+        responses = await chat.send_message_async(prompt, generation_config=GENERATION_CONFIG, stream=True)
+        async for chunk in responses:
+            yield chunk.text
@@ -0,0 +1,140 @@
+import hashlib
+import re
+from collections import Counter
+
+from biasight.model import GenderedTerm, LanguageMetrics
+
+# words referring to men or women, counted as mentions
+MALE_TERMS = frozenset([
+    'he', 'him', 'his', 'himself', 'man', 'men', 'boy', 'boys', 'male', 'males', 'father', 'fathers', 'dad', 'dads',
+    'son', 'sons', 'brother', 'brothers', 'husband', 'husbands', 'uncle', 'uncles', 'nephew', 'nephews', 'grandfather',
+    'grandfathers', 'grandson', 'grandsons', 'gentleman', 'gentlemen', 'mr', 'sir', 'king', 'kings', 'prince',
+    'princes', 'boyfriend', 'boyfriends'
+])
+FEMALE_TERMS = frozenset([
+    'she', 'her', 'hers', 'herself', 'woman', 'women', 'girl', 'girls', 'female', 'females', 'mother', 'mothers',
+    'mom', 'moms', 'mum', 'mums', 'daughter', 'daughters', 'sister', 'sisters', 'wife', 'wives', 'aunt', 'aunts',
+    'niece', 'nieces', 'grandmother', 'grandmothers', 'granddaughter', 'granddaughters', 'lady', 'ladies', 'mrs', 'ms',
+    'madam', 'queen', 'queens', 'princess', 'princesses', 'girlfriend', 'girlfriends'
+])
+# gender-neutral ways to refer to people and roles. Words with common other meanings (chair, server, host) are left
+# out, they would count furniture and computers.
+NEUTRAL_TERMS = frozenset([
+    'they', 'them', 'their', 'theirs', 'themselves', 'themself', 'person', 'persons', 'people', 'individual',
+    'individuals', 'everyone', 'everybody', 'someone', 'somebody', 'anyone', 'anybody', 'human', 'humans', 'humanity',
+    'humankind', 'parent', 'parents', 'child', 'children', 'kid', 'kids', 'sibling', 'siblings', 'spouse', 'spouses',
+    'partner', 'partners', 'grandparent', 'grandparents', 'grandchild', 'grandchildren', 'chairperson',
+    'businessperson', 'businesspeople', 'police officer', 'police officers', 'firefighter', 'firefighters',
+    'salesperson', 'salespeople', 'spokesperson', 'spokespeople', 'mail carrier', 'mail carriers', 'flight attendant',
+    'flight attendants', 'camera operator', 'camera operators', 'supervisor', 'supervisors', 'worker', 'workers',
+    'workforce', 'layperson', 'laypeople', 'homemaker', 'homemakers', 'ancestors'
+])
+# gendered words for roles and people in general, with a neutral alternative
+GENDERED_TERMS = {
+    'chairman': 'chair', 'chairmen': 'chairs', 'chairwoman': 'chair', 'chairwomen': 'chairs',
+    'businessman': 'businessperson', 'businessmen': 'businesspeople', 'businesswoman': 'businessperson',
+    'businesswomen': 'businesspeople', 'policeman': 'police officer', 'policemen': 'police officers',
+    'policewoman': 'police officer', 'policewomen': 'police officers', 'fireman': 'firefighter',
+    'firemen': 'firefighters', 'salesman': 'salesperson', 'salesmen': 'salespeople', 'saleswoman': 'salesperson',
+    'saleswomen': 'salespeople', 'spokesman': 'spokesperson', 'spokesmen': 'spokespeople',
+    'spokeswoman': 'spokesperson', 'spokeswomen': 'spokespeople', 'mailman': 'mail carrier', 'mailmen': 'mail carriers',
+    'postman': 'mail carrier', 'postmen': 'mail carriers', 'cameraman': 'camera operator',
+    'cameramen': 'camera operators', 'foreman': 'supervisor', 'foremen': 'supervisors', 'workman': 'worker',
+    'workmen': 'workers', 'congressman': 'member of congress', 'congressmen': 'members of congress',
+    'stewardess': 'flight attendant', 'stewardesses': 'flight attendants', 'waitress': 'server',
+    'waitresses': 'servers', 'actress': 'actor', 'actresses': 'actors', 'hostess': 'host', 'hostesses': 'hosts',
+    'manpower': 'workforce', 'mankind': 'humankind', 'man-made': 'synthetic', 'man-hours': 'work hours',
+    'middleman': 'intermediary', 'middlemen': 'intermediaries', 'layman': 'layperson', 'laymen': 'laypeople',
+    'freshman': 'first-year student', 'freshmen': 'first-year students', 'fisherman': 'fisher',
+    'fishermen': 'fishers', 'craftsman': 'artisan', 'craftsmen': 'artisans', 'repairman': 'repairer',
+    'repairmen': 'repairers', 'handyman': 'maintenance worker', 'anchorman': 'anchor', 'weatherman': 'meteorologist',
+    'housewife': 'homemaker', 'housewives': 'homemakers', 'cleaning lady': 'cleaner', 'cleaning ladies': 'cleaners',
+    'forefathers': 'ancestors', 'guys': 'everyone'
+}
+
+
+def _trie_pattern(terms: list[str]) -> str:
+    # alternation factored by common prefixes, so the regex engine follows a single path per position instead of
+    # trying every term. The spaces of multi-word terms match any whitespace.
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: dict) -> str:
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child) for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+        return f'(?:{pattern})?' if '' in node else pattern
+
+    return build(trie)
+
+
+# counts gendered and gender-neutral words in one pass over the text, for the mention ratio and the share of neutral
+# language that the LLM would otherwise estimate. All terms are compiled into a single trie-shaped regex, which the
+# C regex engine runs like a multi-pattern automaton; only the matches are handled in Python.
+class GenderLexicon:
+
+    def __init__(
+        self,
+        male_terms: frozenset[str] = MALE_TERMS,
+        female_terms: frozenset[str] = FEMALE_TERMS,
+        neutral_terms: frozenset[str] = NEUTRAL_TERMS,
+        gendered_terms: dict[str, str] = GENDERED_TERMS,
+        examples: int = 10
+    ):
+        self.kinds: dict[str, str] = {}
+        for kind, terms in [
+            ('male', male_terms),
+            ('female', female_terms),
+            ('neutral', neutral_terms),
+            ('gendered', gendered_terms)
+        ]:
+            self.kinds.update(dict.fromkeys(terms, kind))
+        self.alternatives = gendered_terms
+        self.examples = examples
+        self.pattern = re.compile(rf'\b{_trie_pattern(sorted(self.kinds))}\b')
+        # identifies the word lists, results computed with other lists are not reused
+        self.fingerprint = hashlib.sha256(
+            '\0'.join(f'{term}={kind}' for term, kind in sorted(self.kinds.items())).encode()
+        ).hexdigest()
+
+    def analyze(self, text: str) -> LanguageMetrics:
+        counts = Counter()
+        gendered = Counter()
+        # the text is lowercased once instead of matching case-insensitively, which is twice as fast
+        for match, count in Counter(self.pattern.findall(text.lower())).items():
+            term = ' '.join(match.split())
+            kind = self.kinds[term]
+            counts[kind] += count
+            if kind == 'gendered':
+                gendered[term] += count
+
+        male = counts['male']
+        female = counts['female']
+        # share of the words referring to people that do not mark a gender
+        references = male + female + counts['gendered'] + counts['neutral']
+        return LanguageMetrics(
+            words=len(text.split()),
+            male_mentions=male,
+            female_mentions=female,
+            neutral_terms=counts['neutral'],
+            gendered_term_count=counts['gendered'],
+            gendered_terms=[
+                GenderedTerm(term=term, count=count, alternative=self.alternatives[term])
+                for term, count in gendered.most_common(self.examples)
+            ],
+            male_to_female_mention_ratio=self.mention_ratio(male, female),
+            gender_neutral_language_percentage=100 * counts['neutral'] / references if references else 100.0
+        )
+
+    @staticmethod
+    def mention_ratio(male: int, female: int) -> float:
+        # without women mentioned the ratio is the number of men, as if there was one. 0 without any mentions, which
+        # gives no boost in the score.
+        return male / max(female, 1)
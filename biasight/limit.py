@@ -1,32 +1,246 @@
-from datetime import date
-from fastapi import HTTPException, status
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
 
+from fastapi import HTTPException, Request, status
+
+from biasight.cache import sqlite_busy
+from biasight.config import Settings
+from biasight.model import LimitResponse
+
+DEFAULT_CLIENT = 'default'
+
+logger = logging.getLogger(__name__)
+
+
+# token buckets by client key. A bucket holds up to capacity tokens and refills at rate tokens per second, a missing
+# bucket is full. Stores are called with the current time, so all processes sharing a store agree on the refill.
+class RateLimitStore(ABC):
+
+    # fully refilled buckets are dropped every prune_interval acquires, they are the same as missing ones
+    prune_interval = 1000
+
+    @abstractmethod
+    def acquire(self, key: str, capacity: float, rate: float, now: float) -> float | None:
+        # takes a token and returns the tokens left, None if the bucket is empty
+        pass
+
+    @abstractmethod
+    def tokens(self, key: str, capacity: float, rate: float, now: float) -> float:
+        pass
+
+    def close(self):
+        pass
+
+
+def _refill(tokens: float, updated_at: float, capacity: float, rate: float, now: float) -> float:
+    # clocks of different processes may be slightly apart, time never runs backwards for a bucket
+    return min(capacity, tokens + max(now - updated_at, 0) * rate)
+
+
+class MemoryRateLimitStore(RateLimitStore):
+
+    def __init__(self):
+        self.buckets: dict[str, tuple[float, float]] = {}
+        self.lock = threading.Lock()
+        self.acquires = 0
+
+    def acquire(self, key: str, capacity: float, rate: float, now: float) -> float | None:
+        with self.lock:
+            self.acquires += 1
+            if self.acquires % self.prune_interval == 0:
+                self._prune(capacity, rate, now)
+
+            tokens = self._tokens(key, capacity, rate, now)
+            if tokens < 1:
+                return None
+            self.buckets[key] = (tokens - 1, now)
+            return tokens - 1
+
+    def _tokens(self, key: str, capacity: float, rate: float, now: float) -> float:
+        bucket = self.buckets.get(key)
+        return _refill(*bucket, capacity, rate, now) if bucket else capacity
+
+    def _prune(self, capacity: float, rate: float, now: float):
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items() if _refill(*bucket, capacity, rate, now) < capacity
+        }
+
+    def tokens(self, key: str, capacity: float, rate: float, now: float) -> float:
+        with self.lock:
+            return self._tokens(key, capacity, rate, now)
+
+
+# buckets in a SQLite table, shared by all workers on the host. A token is taken with a single upsert statement, so
+# concurrent requests of all threads and processes never take more tokens than the bucket holds. The event loop waits
+# for the lock of another worker for busy_timeout at most, a request whose bucket stays locked longer is let through,
+# lock contention must not turn into rejected requests.
+class SQLiteRateLimitStore(RateLimitStore):
+
+    def __init__(self, path: str, table: str = 'rate_limits', busy_timeout: float = 0.1):
+        if not table.isidentifier():
+            raise ValueError(f'Invalid rate limit table name: {table}')
+
+        self.path = path
+        self.table = table
+        self.busy_timeout = busy_timeout
+        self.acquires = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # connections must not be shared with forked worker processes, each process opens its own
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    def _busy(self, e: sqlite3.OperationalError):
+        if not sqlite_busy(e):
+            raise e
+        self.busy += 1
+        logger.warning('Rate limits in %s are busy, the bucket is taken as full: %s', self.table, e)
+
+    def acquire(self, key: str, capacity: float, rate: float, now: float) -> float | None:
+        with self._lock:
+            try:
+                return self._acquire(key, capacity, rate, now)
+            except sqlite3.OperationalError as e:
+                self._busy(e)
+                return capacity
+
+    def _acquire(self, key: str, capacity: float, rate: float, now: float) -> float | None:
+        connection = self._connect()
+        self.acquires += 1
+        if self.acquires % self.prune_interval == 0:
+            connection.execute(
+                f'DELETE FROM {self.table} WHERE tokens + max(?1 - updated_at, 0) * ?2 >= ?3',
+                (now, rate, capacity)
+            )
+
+        # the update only applies if a token is left after refilling, otherwise no row is returned
+        row = connection.execute(
+            f'''
+            INSERT INTO {self.table} (key, tokens, updated_at) VALUES (?1, ?2 - 1, ?4)
+            ON CONFLICT (key) DO UPDATE SET
+                tokens = min(?2, tokens + max(?4 - updated_at, 0) * ?3) - 1,
+                updated_at = max(updated_at, ?4)
+            WHERE min(?2, tokens + max(?4 - updated_at, 0) * ?3) >= 1
+            RETURNING tokens
+            ''',
+            (key, capacity, rate, now)
+        ).fetchone()
+        return row[0] if row else None
+
+    def tokens(self, key: str, capacity: float, rate: float, now: float) -> float:
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    f'SELECT tokens, updated_at FROM {self.table} WHERE key = ?', (key,)
+                ).fetchone()
+            except sqlite3.OperationalError as e:
+                self._busy(e)
+                row = None
+            return _refill(*row, capacity, rate, now) if row else capacity
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+# every client gets its own bucket of limit requests, refilled evenly over period seconds, so one client cannot use
+# up the requests of all others and an empty bucket allows a request again after period / limit seconds
 class RateLimiter:
 
-    def __init__(self, limit: int):
+    def __init__(self, limit: int, store: RateLimitStore | None = None, period: float = 86400):
         self.limit = limit
-        self.requests = 0
-        self.last_reset = date.today()
-
-    def check_and_update(self):
-        current_date = date.today()
-        if current_date > self.last_reset:
-            self.requests = 0
-            self.last_reset = current_date
-
-    def increment(self):
-        self.check_and_update()
-        if self.requests >= self.limit:
+        self.period = period
+        self.rate = limit / period
+        self.store = store or MemoryRateLimitStore()
+        # requests allowed and rejected by this process
+        self.usage = 0
+        self.rejected = 0
+
+    def increment(self, client: str = DEFAULT_CLIENT):
+        tokens = self.store.acquire(client, self.limit, self.rate, time.time()) if self.limit >= 1 else None
+        if tokens is None:
+            self.rejected += 1
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Daily limit reached, please try again tomorrow"
+                detail='Rate limit reached, please try again later',
+                headers={'Retry-After': str(self.state(client).retry_after)}
             )
-        self.requests += 1
+        self.usage += 1
+
+    def state(self, client: str = DEFAULT_CLIENT) -> LimitResponse:
+        tokens = self.store.tokens(client, self.limit, self.rate, time.time())
+        return LimitResponse(
+            client=client,
+            limit=self.limit,
+            usage=self.limit - math.floor(tokens),
+            remaining=math.floor(tokens),
+            # seconds until the next request is allowed and until the bucket is full again
+            retry_after=math.ceil(max(1 - tokens, 0) / self.rate) if self.rate else math.ceil(self.period),
+            full_in=math.ceil((self.limit - tokens) / self.rate) if self.rate else 0
+        )
+
+
+def client_key(
+    request: Request,
+    api_keys: frozenset[str] = frozenset(),
+    trust_forwarded: bool = False,
+    trusted_proxies: int = 1
+) -> str:
+    # known API keys get their own bucket wherever the requests come from, all other requests are limited by IP.
+    # Unknown keys are ignored, otherwise a client could get a fresh bucket by sending a new key
+    api_key = request.headers.get('x-api-key')
+    if api_key and api_key in api_keys:
+        return 'key:' + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    # every proxy appends the address it got the request from, so only the entries added by the trusted proxies in
+    # front of the app are reliable. Entries left of them are sent by the client and could be anything.
+    forwarded = request.headers.get('x-forwarded-for')
+    if trust_forwarded and forwarded:
+        addresses = [address.strip() for address in forwarded.split(',')]
+        return 'ip:' + addresses[-min(max(trusted_proxies, 1), len(addresses))]
+    return 'ip:' + (request.client.host if request.client else 'unknown')
 
-    @property
-    def usage(self):
-        return self.requests
 
-    @property
-    def last_reset_iso(self):
-        return self.last_reset.isoformat()
+def create_rate_limiter(settings: Settings, limit: int | None = None, table: str = 'rate_limits') -> RateLimiter:
+    if settings.cache_backend == 'sqlite':
+        store = SQLiteRateLimitStore(settings.cache_path, table, settings.cache_busy_timeout)
+    elif settings.cache_backend == 'memory':
+        store = MemoryRateLimitStore()
+    else:
+        raise ValueError(f'Unknown cache backend: {settings.cache_backend}')
+    return RateLimiter(settings.daily_limit if limit is None else limit, store, settings.rate_limit_period)
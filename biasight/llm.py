@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+from biasight.config import Settings
+from biasight.util import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend(ABC):
+
+    @abstractmethod
+    def start_chat(self, system_instruction: str | None = None) -> Any:
+        pass
+
+    @abstractmethod
+    def get_chat_response(self, chat: Any, prompt: str) -> str:
+        pass
+
+    async def get_chat_response_async(self, chat: Any, prompt: str) -> str:
+        return ''.join([text async for text in self.stream_chat_response_async(chat, prompt)])
+
+    @abstractmethod
+    def stream_chat_response_async(self, chat: Any, prompt: str) -> AsyncIterator[str]:
+        pass
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+# serves (prompt key, response) pairs recorded with RecordingBackend instead of calling an LLM. A response recorded
+# for the same prompt is preferred, other prompts get the recorded responses in turn. The time to the first chunk and
+# the output rate in tokens per second are drawn from log-normal distributions around the given medians, sigma 0
+# makes them fixed.
+class ReplayBackend(LLMBackend):
+
+    def __init__(
+        self,
+        responses: list[tuple[str | None, str]],
+        latency: float = 0.5,
+        latency_sigma: float = 0.0,
+        token_rate: float = 200.0,
+        token_rate_sigma: float = 0.0,
+        chunk_tokens: int = 16,
+        seed: int | None = None
+    ):
+        if not responses:
+            raise ValueError('No recorded responses to replay')
+        self.responses = [response for _, response in responses]
+        # responses recorded without a prompt are only served in turn
+        self.by_prompt = {key: response for key, response in responses if key}
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.token_rate = token_rate
+        self.token_rate_sigma = token_rate_sigma
+        self.chunk_tokens = chunk_tokens
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'ReplayBackend':
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return cls([(record['prompt_key'], record['response']) for record in records], **kwargs)
+
+    def _draw(self, median: float, sigma: float) -> float:
+        if not median or not sigma:
+            return median
+        return self.random.lognormvariate(math.log(median), sigma)
+
+    def _response(self, prompt: str) -> tuple[str, float, float]:
+        response = self.by_prompt.get(prompt_key(prompt))
+        if response is None:
+            response = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        # seconds to the first chunk, seconds per token after that
+        token_rate = self._draw(self.token_rate, self.token_rate_sigma)
+        return response, self._draw(self.latency, self.latency_sigma), 1 / token_rate if token_rate else 0.0
+
+    def start_chat(self, system_instruction: str | None = None) -> Any:
+        return None
+
+    def get_chat_response(self, chat: Any, prompt: str) -> str:
+        response, latency, token_seconds = self._response(prompt)
+        time.sleep(latency + estimate_tokens(response) * token_seconds)
+        return response
+
+    async def stream_chat_response_async(self, chat: Any, prompt: str) -> AsyncIterator[str]:
+        response, latency, token_seconds = self._response(prompt)
+        await asyncio.sleep(latency)
+        chunk_size = self.chunk_tokens * 4
+        for i in range(0, len(response), chunk_size):
+            chunk = response[i:i + chunk_size]
+            await asyncio.sleep(estimate_tokens(chunk) * token_seconds)
+            yield chunk
+
+
+# passes calls to another backend and appends every prompt key and response to a JSONL file for ReplayBackend
+class RecordingBackend(LLMBackend):
+
+    def __init__(self, backend: LLMBackend, path: str):
+        self.backend = backend
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _record(self, prompt: str, response: str):
+        with self.lock, open(self.path, 'a') as f:
+            f.write(json.dumps({'prompt_key': prompt_key(prompt), 'response': response}) + '\n')
+
+    def start_chat(self, system_instruction: str | None = None) -> Any:
+        return self.backend.start_chat(system_instruction)
+
+    def get_chat_response(self, chat: Any, prompt: str) -> str:
+        response = self.backend.get_chat_response(chat, prompt)
+        self._record(prompt, response)
+        return response
+
+    async def stream_chat_response_async(self, chat: Any, prompt: str) -> AsyncIterator[str]:
+        chunks = []
+        async for chunk in self.backend.stream_chat_response_async(chat, prompt):
+            chunks.append(chunk)
+            yield chunk
+        self._record(prompt, ''.join(chunks))
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+# makes a share of the calls to another backend fail: error_rate of them raise InjectedFailure before any output,
+# malformed_rate of them return only the first half of the response, like a reply cut off mid generation
+class FaultInjectingBackend(LLMBackend):
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        error_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int | None = None
+    ):
+        self.backend = backend
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.errors = 0
+        self.malformed = 0
+
+    def _malformed(self) -> bool:
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.errors += 1
+            raise InjectedFailure('Injected LLM failure')
+        if roll < self.error_rate + self.malformed_rate:
+            self.malformed += 1
+            return True
+        return False
+
+    def start_chat(self, system_instruction: str | None = None) -> Any:
+        return self.backend.start_chat(system_instruction)
+
+    def get_chat_response(self, chat: Any, prompt: str) -> str:
+        malformed = self._malformed()
+        response = self.backend.get_chat_response(chat, prompt)
+        return response[:len(response) // 2] if malformed else response
+
+    async def stream_chat_response_async(self, chat: Any, prompt: str) -> AsyncIterator[str]:
+        if not self._malformed():
+            async for chunk in self.backend.stream_chat_response_async(chat, prompt):
+                yield chunk
+            return
+
+        response = await self.backend.get_chat_response_async(chat, prompt)
+        yield response[:len(response) // 2]
+
+
+# creates the backend with the first chat instead of at startup. Async callers start chats in a thread, so the slow
+# import and initialization of a client like Gemini does not block the event loop either.
+class LazyBackend(LLMBackend):
+
+    def __init__(self, create: Callable[[], LLMBackend]):
+        self.create = create
+        self.backend: LLMBackend | None = None
+        self.lock = threading.Lock()
+
+    def get(self) -> LLMBackend:
+        if self.backend is None:
+            with self.lock:
+                if self.backend is None:
+                    self.backend = self.create()
+        return self.backend
+
+    def start_chat(self, system_instruction: str | None = None) -> Any:
+        return self.get().start_chat(system_instruction)
+
+    def get_chat_response(self, chat: Any, prompt: str) -> str:
+        return self.get().get_chat_response(chat, prompt)
+
+    async def stream_chat_response_async(self, chat: Any, prompt: str) -> AsyncIterator[str]:
+        async for chunk in self.get().stream_chat_response_async(chat, prompt):
+            yield chunk
+
+
+def _create_gemini_client(settings: Settings) -> LLMBackend:
+    # imported here, so vertexai is only loaded and initialized when Gemini is used
+    from google.oauth2.service_account import Credentials
+
+    from biasight.gemini import GeminiClient
+
+    return GeminiClient(
+        settings.gcp_project_id,
+        settings.gcp_location,
+        Credentials.from_service_account_file(settings.gcp_service_account_file),
+        settings.gcp_gemini_model,
+        settings.gcp_context_cache_ttl
+    )
+
+
+def create_llm_backend(settings: Settings) -> LLMBackend:
+    if settings.llm_backend == 'replay':
+        logger.info('Replaying recorded LLM responses from %s', settings.llm_replay_path)
+        backend = ReplayBackend.from_file(
+            settings.llm_replay_path,
+            latency=settings.llm_replay_latency,
+            latency_sigma=settings.llm_replay_latency_sigma,
+            token_rate=settings.llm_replay_token_rate,
+            token_rate_sigma=settings.llm_replay_token_rate_sigma
+        )
+    elif settings.llm_backend == 'gemini':
+        backend = LazyBackend(lambda: _create_gemini_client(settings))
+    else:
+        raise ValueError(f'Unknown LLM backend: {settings.llm_backend}')
+
+    if settings.llm_record_path:
+        backend = RecordingBackend(backend, settings.llm_record_path)
+    if settings.llm_failure_rate or settings.llm_malformed_rate:
+        logger.warning(
+            'Injecting LLM failures: %.1f%% errors, %.1f%% malformed responses',
+            settings.llm_failure_rate * 100,
+            settings.llm_malformed_rate * 100
+        )
+        backend = FaultInjectingBackend(backend, settings.llm_failure_rate, settings.llm_malformed_rate)
+    return backend
@@ -1,28 +1,24 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from functools import lru_cache
+from typing import Annotated
 
-import colorlog
-from cachetools import TTLCache
-from fastapi import FastAPI
-from fastapi import HTTPException, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from google.oauth2 import service_account
-from google.oauth2.service_account import Credentials
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from .bias import BiasAnalyzer
+from . import metrics
 from .config import Settings
-from .gemini import GeminiClient
-from .limit import RateLimiter
-from .model import AnalyzeRequest, AnalyzeResponse, LimitResponse
-from .notify import create_notifier
-from .parse import WebParser
-from .util import retry
-
-# setup logging
-log_format = '%(log_color)s%(asctime)s [%(levelname)s] %(reset)s%(purple)s[%(name)s] %(reset)s%(blue)s%(message)s'
-handler = colorlog.StreamHandler()
-handler.setFormatter(colorlog.ColoredFormatter(log_format))
-logging.basicConfig(level=logging.INFO, handlers=[handler])
+from .container import Container
+from .limit import client_key
+from .model import AdmissionStats, AnalyzeRequest, AnalyzeResponse, AuditRequest, AuditResponse, CoalescingStats, ContentCacheStats, LimitResponse, NotificationStats, PreprocessStats, QuickAnalyzeResponse, RateLimitStats, ResilienceStats, ResultCacheStats, SimilarPagesStats, StatsResponse
+from .notify import QueuedNotifier
+from .stream import sse_event
+from .util import setup_logging
+
+setup_logging()
 
 logger: logging.Logger = logging.getLogger(__name__)
 
@@ -30,74 +26,351 @@ logger: logging.Logger = logging.getLogger(__name__)
 def _get_settings() -> Settings:
     return Settings()
 
-settings: Settings = _get_settings()
-
-credentials: Credentials = service_account.Credentials.from_service_account_file(settings.gcp_service_account_file)
-
-gemini_client: GeminiClient = GeminiClient(
-    settings.gcp_project_id,
-    settings.gcp_location,
-    credentials,
-    settings.gcp_gemini_model
-)
-bias_analyzer: BiasAnalyzer = BiasAnalyzer(gemini_client)
-web_parser: WebParser = WebParser(settings.parse_max_content_length, settings.parse_chunk_size)
-rate_limiter: RateLimiter = RateLimiter(settings.daily_limit)
-notifier = create_notifier(settings)
-
-app: FastAPI = FastAPI()
-
-# for local development
-origins = [
-    'http://localhost',
-    'http://localhost:8080',
-    'http://localhost:5173',
-]
-
-# noinspection PyTypeChecker
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=['*'],
-    allow_headers=['*'],
-)
-
-# cache for results to avoid analyzing the same URI again in a short amount of time
-# ttl = seconds after which results will be invalidated
-result_cache: TTLCache = TTLCache(maxsize=settings.cache_size, ttl=settings.cache_ttl)
-
-@app.post('/analyze')
-@retry(3, ignore_exceptions=(HTTPException,))
-def analyze(analyze_request: AnalyzeRequest) -> AnalyzeResponse:
-    # try to use cached result
-    cached_result = result_cache.get(analyze_request.uri)
-
-    if cached_result:
-        logger.info('Returning cached result for %s', analyze_request.uri)
-        notifier.notify_analysis(analyze_request.uri, cache_hit=True)
-        return cached_result
-
-    # if not cached, check rate limit before invoking the analyzer
-    rate_limiter.increment()
-
-    logger.info('Analyzing %s', analyze_request.uri)
-    text = web_parser.parse(analyze_request.uri)
-
-    if not text:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Could not parse page')
-
-    try:
-        result = bias_analyzer.analyze(text)
-        response = AnalyzeResponse(uri=analyze_request.uri, result=result)
-        result_cache[analyze_request.uri] = response
-
-        notifier.notify_analysis(analyze_request.uri)
-        return response
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail='Could not analyze page')
-
-@app.get('/limit')
-async def limit() -> LimitResponse:
-    rate_limiter.check_and_update()
-    return LimitResponse(limit=rate_limiter.limit, usage=rate_limiter.usage, last_reset=rate_limiter.last_reset_iso)
+# components are created by the container of the app on first use
+def _container(request: Request) -> Container:
+    return request.app.state.container
+
+Components = Annotated[Container, Depends(_container)]
+
+router: APIRouter = APIRouter()
+
+def _client(request: Request, container: Container) -> str:
+    settings = container.settings
+    return client_key(
+        request,
+        container.api_keys,
+        settings.rate_limit_trust_forwarded,
+        settings.rate_limit_trusted_proxies
+    )
+
+# full analyses are sent as the encoded JSON of the result cache, FastAPI does not validate or serialize them again
+@router.post('/analyze', response_model=AnalyzeResponse | QuickAnalyzeResponse)
+async def analyze(
+    analyze_request: AnalyzeRequest,
+    request: Request,
+    container: Components
+) -> Response | QuickAnalyzeResponse:
+    if analyze_request.mode == 'quick':
+        return await container.analysis_service.analyze_quick(analyze_request.uri, _client(request, container))
+    encoded = await container.analysis_service.analyze_json(analyze_request.uri, _client(request, container))
+    return Response(encoded, media_type='application/json')
+
+@router.post('/analyze/stream')
+async def analyze_stream(analyze_request: AnalyzeRequest, request: Request, container: Components) -> StreamingResponse:
+    client = _client(request, container)
+    analysis_service = container.analysis_service
+
+    async def events():
+        try:
+            async for event, data in analysis_service.analyze_stream(analyze_request.uri, client):
+                yield sse_event(event, data)
+        except HTTPException as e:
+            # the response status is already sent, errors are reported as the last event
+            data = {'status': e.status_code, 'detail': e.detail}
+            if e.headers and 'Retry-After' in e.headers:
+                data['retry_after'] = int(e.headers['Retry-After'])
+            yield sse_event('error', data)
+        except Exception:
+            logger.exception('Could not stream analysis of %s', analyze_request.uri)
+            data = {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'detail': 'Could not analyze page'}
+            yield sse_event('error', data)
+
+    # proxies must not buffer the events
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@router.get('/limit')
+async def limit(request: Request, container: Components) -> LimitResponse:
+    return container.rate_limiter.state(_client(request, container))
+
+@router.get('/stats')
+async def stats(container: Components) -> StatsResponse:
+    flight = container.analysis_service.flight
+    rate_limiter = container.rate_limiter
+    quick_rate_limiter = container.quick_rate_limiter
+    circuit_breaker = container.circuit_breaker
+    hedger = container.hedger
+    result_cache = container.result_cache
+    content_cache = container.content_cache
+    content_cleaner = container.content_cleaner
+    notifier = container.notifier
+    admission = container.admission
+    similar_pages = container.similar_pages
+    return StatsResponse(
+        coalescing=CoalescingStats(
+            in_flight=flight.in_flight,
+            leaders=flight.leaders,
+            coalesced=flight.coalesced,
+            failures=flight.failures
+        ),
+        rate_limit=RateLimitStats(
+            allowed=rate_limiter.usage,
+            rejected=rate_limiter.rejected,
+            quick_allowed=quick_rate_limiter.usage,
+            quick_rejected=quick_rate_limiter.rejected
+        ),
+        resilience=ResilienceStats(
+            breaker_state=circuit_breaker.state,
+            consecutive_failures=circuit_breaker.consecutive_failures,
+            breaker_opened=circuit_breaker.opened,
+            breaker_rejected=circuit_breaker.rejected,
+            llm_retries=container.llm_retry_policy.retries,
+            fetch_retries=container.fetch_retry_policy.retries,
+            hedges=hedger.hedges if hedger else 0,
+            hedge_wins=hedger.hedge_wins if hedger else 0
+        ),
+        result_cache=ResultCacheStats(
+            size=len(result_cache),
+            evictions=result_cache.evictions
+        ),
+        content_cache=ContentCacheStats(
+            size=len(content_cache.backend),
+            evictions=content_cache.backend.evictions,
+            hits=content_cache.hits,
+            misses=content_cache.misses,
+            hit_rate=content_cache.hit_rate,
+            saved_llm_seconds=content_cache.saved_llm_seconds,
+            saved_input_tokens=content_cache.saved_input_tokens,
+            saved_output_tokens=content_cache.saved_output_tokens,
+            saved_cost_usd=content_cache.saved_cost
+        ),
+        preprocess=PreprocessStats(
+            requests=content_cleaner.requests,
+            saved_characters=content_cleaner.saved_characters,
+            saved_tokens=content_cleaner.saved_tokens,
+            reduction=content_cleaner.reduction
+        ) if content_cleaner else None,
+        notifications=NotificationStats(
+            queued=notifier.queued,
+            pending=notifier.pending,
+            dropped=notifier.dropped,
+            sent=notifier.sent,
+            failed=notifier.failed,
+            messages=notifier.messages
+        ) if isinstance(notifier, QueuedNotifier) else None,
+        admission=AdmissionStats(
+            max_concurrent=admission.max_concurrent,
+            active=admission.active,
+            queued=admission.queued,
+            max_queued=admission.max_queued,
+            admitted=admission.admitted,
+            rejected_full=admission.rejected_full,
+            rejected_deadline=admission.rejected_deadline,
+            timed_out=admission.timed_out,
+            wait_p50=admission.wait_percentile(50),
+            wait_p95=admission.wait_percentile(95),
+            hold_seconds=admission.hold_seconds
+        ) if admission else None,
+        similar_pages=SimilarPagesStats(
+            size=len(similar_pages),
+            evictions=similar_pages.evictions,
+            hits=similar_pages.hits,
+            misses=similar_pages.misses
+        ) if similar_pages is not None else None
+    )
+
+# read on every scrape of /metrics
+def _collect_metrics(container: Container):
+    result_cache = container.result_cache
+    content_cache = container.content_cache
+    circuit_breaker = container.circuit_breaker
+    hedger = container.hedger
+    content_cleaner = container.content_cleaner
+    notifier = container.notifier
+    admission = container.admission
+    similar_pages = container.similar_pages
+
+    yield metrics.gauge('biasight_result_cache_entries', 'Entries in the result cache', len(result_cache))
+    yield metrics.counter('biasight_result_cache_evictions', 'Result cache evictions', result_cache.evictions)
+    yield metrics.gauge('biasight_content_cache_entries', 'Entries in the content cache', len(content_cache.backend))
+    yield metrics.counter(
+        'biasight_content_cache_lookups',
+        'Content cache lookups',
+        {'hit': content_cache.hits, 'miss': content_cache.misses},
+        'result'
+    )
+    yield metrics.counter(
+        'biasight_coalesced_requests',
+        'Requests served by a running analysis',
+        container.analysis_service.flight.coalesced
+    )
+    yield metrics.counter(
+        'biasight_rate_limit_requests',
+        'Requests checked by the rate limiter',
+        {'allowed': container.rate_limiter.usage, 'rejected': container.rate_limiter.rejected},
+        'result'
+    )
+    yield metrics.counter(
+        'biasight_quick_rate_limit_requests',
+        'Quick analyses checked by their rate limiter',
+        {'allowed': container.quick_rate_limiter.usage, 'rejected': container.quick_rate_limiter.rejected},
+        'result'
+    )
+    yield metrics.counter(
+        'biasight_retries',
+        'Retried attempts',
+        {'fetch': container.fetch_retry_policy.retries, 'llm': container.llm_retry_policy.retries},
+        'stage'
+    )
+    yield metrics.gauge(
+        'biasight_llm_breaker_state',
+        'Current state of the LLM circuit breaker',
+        {state: float(circuit_breaker.state == state) for state in ('closed', 'open', 'half_open')},
+        'state'
+    )
+    yield metrics.counter('biasight_llm_breaker_opened', 'Times the LLM circuit opened', circuit_breaker.opened)
+    yield metrics.counter('biasight_llm_breaker_rejected', 'Calls rejected by the circuit', circuit_breaker.rejected)
+    if hedger:
+        yield metrics.counter(
+            'biasight_llm_hedges',
+            'Hedged LLM calls',
+            {'started': hedger.hedges, 'won': hedger.hedge_wins},
+            'result'
+        )
+    if content_cleaner:
+        yield metrics.counter(
+            'biasight_preprocess_saved_tokens',
+            'Input tokens saved by cleaning',
+            content_cleaner.saved_tokens
+        )
+    if admission:
+        yield metrics.gauge(
+            'biasight_llm_slots',
+            'Analyses holding or waiting for an LLM slot',
+            {'active': admission.active, 'queued': admission.queued, 'limit': admission.max_concurrent},
+            'state'
+        )
+        yield metrics.counter(
+            'biasight_llm_admissions',
+            'Analyses admitted to or shed by the LLM queue',
+            {
+                'admitted': admission.admitted,
+                'queue_full': admission.rejected_full,
+                'deadline': admission.rejected_deadline,
+                'timed_out': admission.timed_out
+            },
+            'result'
+        )
+    if similar_pages is not None:
+        yield metrics.gauge(
+            'biasight_similar_pages_entries',
+            'Fingerprints in the similarity index',
+            len(similar_pages)
+        )
+        yield metrics.counter(
+            'biasight_similar_pages_lookups',
+            'Near-duplicate lookups',
+            {'hit': similar_pages.hits, 'miss': similar_pages.misses},
+            'result'
+        )
+    if isinstance(notifier, QueuedNotifier):
+        yield metrics.gauge('biasight_notifications_pending', 'Queued notifications', notifier.pending)
+        yield metrics.counter(
+            'biasight_notifications',
+            'Notifications by outcome',
+            {'sent': notifier.sent, 'failed': notifier.failed, 'dropped': notifier.dropped},
+            'result'
+        )
+
+@router.get('/metrics')
+async def prometheus_metrics(container: Components) -> Response:
+    if not container.settings.metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Metrics are disabled')
+    return Response(generate_latest(metrics.registry), media_type=CONTENT_TYPE_LATEST)
+
+def _audit_response(container: Container, job_id: str) -> AuditResponse:
+    job = container.audit_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Audit not found')
+
+    return AuditResponse(
+        job_id=job_id,
+        root=job.root,
+        status=job.status,
+        progress=job.progress,
+        report=job.report() if job.status == 'done' else None
+    )
+
+@router.post('/audit')
+async def audit(audit_request: AuditRequest, request: Request, container: Components) -> AuditResponse:
+    settings = container.settings
+    if not settings.audit_enabled:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Site audits are disabled')
+
+    # every analyzed page counts against the rate limit of the client, an audit is not started without any left
+    client = _client(request, container)
+    limit = container.rate_limiter.state(client)
+    if limit.remaining < 1:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Rate limit reached, please try again later',
+            headers={'Retry-After': str(limit.retry_after)}
+        )
+
+    options = {}
+    if audit_request.max_pages:
+        options['max_pages'] = min(audit_request.max_pages, settings.audit_max_pages)
+
+    job_id = container.audit_jobs.start(
+        audit_request.uri,
+        container.web_parser,
+        container.analysis_service,
+        client,
+        force=audit_request.force,
+        **options
+    )
+    return _audit_response(container, job_id)
+
+@router.get('/audit/{job_id}')
+async def audit_status(job_id: str, container: Components) -> AuditResponse:
+    return _audit_response(container, job_id)
+
+# building the app only reads the settings, components are created with the first request that needs them. The
+# optional warm-up creates them and initializes the LLM client in the background after startup.
+def create_app(settings: Settings | None = None) -> FastAPI:
+    settings = settings or _get_settings()
+    container = Container(settings)
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        collector = metrics.StatsCollector(lambda: _collect_metrics(container))
+        if settings.metrics_enabled:
+            metrics.registry.register(collector)
+        warm_up = asyncio.create_task(asyncio.to_thread(container.warm_up)) if settings.warm_up else None
+        yield
+        if warm_up:
+            # a thread cannot be cancelled, components it still creates are closed after it
+            await warm_up
+        if settings.metrics_enabled:
+            metrics.registry.unregister(collector)
+        await container.aclose()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.container = container
+    app.include_router(router)
+
+    # stage histograms and request durations, optionally reported to the client as Server-Timing header
+    if settings.metrics_enabled:
+        app.add_middleware(metrics.MetricsMiddleware, add_server_timing=settings.metrics_server_timing)
+
+    # for local development
+    origins = [
+        'http://localhost',
+        'http://localhost:8080',
+        'http://localhost:5173',
+    ]
+
+    # noinspection PyTypeChecker
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=['*'],
+        allow_headers=['*'],
+    )
+    return app
+
+app: FastAPI = create_app()
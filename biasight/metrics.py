@@ -0,0 +1,145 @@
+import time
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, ProcessCollector
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# own registry instead of the global one, only metrics of this app are exposed on /metrics. Every worker process
+# has its own registry.
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(2 ** i for i in range(10, 25, 2))
+
+stage_seconds = Histogram(
+    'biasight_stage_seconds',
+    'Duration of the analysis stages',
+    ['stage'],
+    buckets=SECONDS_BUCKETS,
+    registry=registry
+)
+request_seconds = Histogram(
+    'biasight_request_seconds',
+    'Duration of HTTP requests until the response is complete',
+    ['method', 'route', 'status'],
+    buckets=SECONDS_BUCKETS,
+    registry=registry
+)
+page_bytes = Histogram('biasight_page_bytes', 'Downloaded page size', buckets=SIZE_BUCKETS, registry=registry)
+page_characters = Histogram(
+    'biasight_page_characters',
+    'Extracted page text length',
+    buckets=SIZE_BUCKETS,
+    registry=registry
+)
+llm_tokens = Counter('biasight_llm_tokens', 'Estimated LLM tokens', ['kind'], registry=registry)
+prompt_tokens = llm_tokens.labels('prompt')
+response_tokens = llm_tokens.labels('response')
+# difference between the LLM estimates and the local counts of the same text, in ratio and percentage points
+lexicon_deviation = Histogram(
+    'biasight_lexicon_deviation',
+    'Difference between the LLM estimate and the local count',
+    ['metric'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100),
+    registry=registry
+)
+result_cache_lookups = Counter('biasight_result_cache_lookups', 'Result cache lookups', ['result'], registry=registry)
+result_cache_hits = result_cache_lookups.labels('hit')
+result_cache_misses = result_cache_lookups.labels('miss')
+
+# durations of the stages of the current request, set by MetricsMiddleware for the Server-Timing header
+stage_timings: ContextVar[dict[str, float] | None] = ContextVar('stage_timings', default=None)
+# label lookups take a lock, the children are kept instead
+_stages: dict[str, Histogram] = {}
+
+
+def observe(stage: str, seconds: float):
+    histogram = _stages.get(stage)
+    if histogram is None:
+        histogram = _stages[stage] = stage_seconds.labels(stage)
+    histogram.observe(seconds)
+
+    timings = stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def server_timing(timings: dict[str, float], total: float) -> str:
+    return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in [*timings.items(), ('total', total)])
+
+
+# values the app already counts (cache sizes, breaker state, ...) are read when /metrics is scraped, so they cost
+# nothing on the request path
+class StatsCollector:
+
+    def __init__(self, collect: Callable[[], Iterable[Metric]]):
+        self.collect = collect
+
+
+def _family(family: type, name: str, documentation: str, values: float | dict[str, float], label: str) -> Metric:
+    # a single value, or values by the value of label
+    metric = family(name, documentation, labels=[label] if label else [])
+    for label_value, value in values.items() if isinstance(values, dict) else [('', values)]:
+        metric.add_metric([label_value] if label else [], value)
+    return metric
+
+
+def counter(name: str, documentation: str, values: float | dict[str, float], label: str = '') -> Metric:
+    return _family(CounterMetricFamily, name, documentation, values, label)
+
+
+def gauge(name: str, documentation: str, values: float | dict[str, float], label: str = '') -> Metric:
+    return _family(GaugeMetricFamily, name, documentation, values, label)
+
+
+# plain ASGI middleware, it does not wrap the response body like BaseHTTPMiddleware and adds little per request
+class MetricsMiddleware:
+
+    def __init__(self, app: ASGIApp, add_server_timing: bool = False):
+        self.app = app
+        self.add_server_timing = add_server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] = {}
+        token = stage_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                # streamed responses only include the stages finished before the first event
+                if self.add_server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append('Server-Timing', server_timing(timings, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get('route')
+            request_seconds.labels(
+                scope['method'],
+                route.path if route else 'unmatched',
+                str(status)
+            ).observe(time.perf_counter() - start)
+            stage_timings.reset(token)
@@ -1,11 +1,28 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class AnalyzeRequest(BaseModel):
     uri: str
+    # quick only counts gendered language locally, without the LLM
+    mode: Literal['full', 'quick'] = 'full'
+
+class GenderedTerm(BaseModel):
+    term: str
+    count: int
+    alternative: str
+
+class LanguageMetrics(BaseModel):
+    words: int
+    male_mentions: int
+    female_mentions: int
+    neutral_terms: int
+    gendered_term_count: int
+    gendered_terms: list[GenderedTerm]
+    male_to_female_mention_ratio: float
+    gender_neutral_language_percentage: float
 
 class AnalyzeResult(BaseModel):
     summary: str
@@ -26,13 +43,155 @@ class AnalyzeResult(BaseModel):
     improvement_suggestions: str
     male_to_female_mention_ratio: float
     gender_neutral_language_percentage: float
+    # counted locally, the LLM estimates above are replaced by them or checked against them
+    language_metrics: Optional[LanguageMetrics] = None
 
 class AnalyzeResponse(BaseModel):
     uri: str
     result: AnalyzeResult
-    created_at: datetime = datetime.now()
+    # time of the analysis, cached responses keep it
+    created_at: datetime = Field(default_factory=datetime.now)
+    # set if the result is the one of a near-duplicate page
+    derived_from: Optional[str] = None
+    similarity: Optional[float] = None
+
+class QuickAnalyzeResponse(BaseModel):
+    uri: str
+    language_metrics: LanguageMetrics
+    created_at: datetime = Field(default_factory=datetime.now)
 
 class LimitResponse(BaseModel):
+    client: str
     limit: int
     usage: int
-    last_reset: str
+    remaining: int
+    retry_after: int
+    full_in: int
+
+class CoalescingStats(BaseModel):
+    in_flight: int
+    leaders: int
+    coalesced: int
+    failures: int
+
+class ResultCacheStats(BaseModel):
+    size: int
+    evictions: int
+
+class ContentCacheStats(BaseModel):
+    size: int
+    evictions: int
+    hits: int
+    misses: int
+    hit_rate: float
+    saved_llm_seconds: float
+    saved_input_tokens: int
+    saved_output_tokens: int
+    saved_cost_usd: float
+
+class PreprocessStats(BaseModel):
+    requests: int
+    saved_characters: int
+    saved_tokens: int
+    reduction: float
+
+class RateLimitStats(BaseModel):
+    allowed: int
+    rejected: int
+    quick_allowed: int
+    quick_rejected: int
+
+class NotificationStats(BaseModel):
+    queued: int
+    pending: int
+    dropped: int
+    sent: int
+    failed: int
+    messages: int
+
+class ResilienceStats(BaseModel):
+    breaker_state: str
+    consecutive_failures: int
+    breaker_opened: int
+    breaker_rejected: int
+    llm_retries: int
+    fetch_retries: int
+    hedges: int
+    hedge_wins: int
+
+class AdmissionStats(BaseModel):
+    max_concurrent: int
+    active: int
+    queued: int
+    max_queued: int
+    admitted: int
+    rejected_full: int
+    rejected_deadline: int
+    timed_out: int
+    wait_p50: float
+    wait_p95: float
+    hold_seconds: Optional[float]
+
+class SimilarPagesStats(BaseModel):
+    size: int
+    evictions: int
+    hits: int
+    misses: int
+
+class StatsResponse(BaseModel):
+    coalescing: CoalescingStats
+    rate_limit: RateLimitStats
+    resilience: ResilienceStats
+    result_cache: ResultCacheStats
+    content_cache: ContentCacheStats
+    preprocess: PreprocessStats | None = None
+    notifications: NotificationStats | None = None
+    admission: AdmissionStats | None = None
+    similar_pages: SimilarPagesStats | None = None
+
+class AuditRequest(BaseModel):
+    uri: str
+    max_pages: Optional[int] = None
+    # start over instead of continuing a finished or interrupted audit of the same site
+    force: bool = False
+
+class AuditProgress(BaseModel):
+    discovered: int
+    analyzed: int
+    failed: int
+    duplicates: int
+    pending: int
+
+class AuditPage(BaseModel):
+    uri: str
+    overall_score: int
+
+class CategoryAverages(BaseModel):
+    stereotyping_score: float
+    representation_score: float
+    language_score: float
+    framing_score: float
+    male_to_female_mention_ratio: float
+    gender_neutral_language_percentage: float
+    overall_score: float
+
+class SiteReport(BaseModel):
+    root: str
+    pages_analyzed: int
+    pages_failed: int
+    pages_duplicate: int
+    site_score: Optional[int] = None
+    mean_score: Optional[float] = None
+    median_score: Optional[float] = None
+    min_score: Optional[int] = None
+    max_score: Optional[int] = None
+    score_distribution: dict[str, int]
+    worst_pages: list[AuditPage]
+    category_averages: Optional[CategoryAverages] = None
+
+class AuditResponse(BaseModel):
+    job_id: str
+    root: str
+    status: str
+    progress: AuditProgress
+    report: Optional[SiteReport] = None
@@ -1,26 +1,177 @@
+import asyncio
+import logging
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 
 import httpx
 
 from biasight.config import Settings
 
+logger = logging.getLogger(__name__)
+
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+
 
 class Notifier(ABC):
     @abstractmethod
     def notify_analysis(self, uri: str, cache_hit: bool = False):
+        # called on the request path, must not block
+        pass
+
+    async def aclose(self):
         pass
 
 
-class TelegramNotifier(Notifier):
-    def __init__(self, token: str, chat_id: str):
+@dataclass
+class Notification:
+    uri: str
+    cache_hit: bool
+
+
+# notifications are put in a bounded queue and sent in batches by a background task, so requests never wait for the
+# notification channel and a failing channel only loses notifications. A full queue drops the oldest or the newest
+# notification, and batches are sent at most once per min_interval seconds. Closing sends what is still queued.
+class QueuedNotifier(Notifier):
+
+    def __init__(
+        self,
+        queue_size: int = 1000,
+        batch_size: int = 20,
+        batch_interval: float = 5.0,
+        min_interval: float = 3.0,
+        overflow: str = 'drop_oldest',
+        flush_timeout: float = 5.0
+    ):
+        if overflow not in ('drop_oldest', 'drop_newest'):
+            raise ValueError(f'Unknown overflow policy: {overflow}')
+
+        self.queue: asyncio.Queue[Notification | None] = asyncio.Queue(queue_size)
+        self.batch_size = batch_size
+        # seconds to wait for more notifications after the first one of a batch
+        self.batch_interval = batch_interval
+        self.min_interval = min_interval
+        self.overflow = overflow
+        self.flush_timeout = flush_timeout
+        self.worker: asyncio.Task | None = None
+        self.closing = False
+        self.next_send = 0.0
+
+        self.queued = 0
+        # notifications in the queue, without the wake up sent on close
+        self.pending = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.messages = 0
+
+    @abstractmethod
+    async def _send(self, notifications: list[Notification]):
+        pass
+
+    def notify_analysis(self, uri: str, cache_hit: bool = False):
+        if self.closing:
+            self.dropped += 1
+            return
+        if self.worker is None:
+            # started with the first notification, the notifier is created before the event loop runs
+            self.worker = asyncio.get_running_loop().create_task(self._run())
+
+        if self.queue.full():
+            self.dropped += 1
+            if self.overflow == 'drop_newest':
+                return
+            self.queue.get_nowait()
+            self.pending -= 1
+        self.queue.put_nowait(Notification(uri, cache_hit))
+        self.queued += 1
+        self.pending += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while not (self.closing and self.queue.empty()):
+            first = await self.queue.get()
+
+            # notifications queued while waiting for the rate cap go into the same batch
+            wait = self.next_send - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            batch = [first]
+            deadline = loop.time() + self.batch_interval
+            while len(batch) < self.batch_size:
+                timeout = 0 if self.closing else deadline - loop.time()
+                try:
+                    batch.append(
+                        self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(), timeout)
+                    )
+                except (asyncio.QueueEmpty, TimeoutError):
+                    break
+
+            # None only wakes up the worker on close
+            notifications = [notification for notification in batch if notification]
+            self.pending -= len(notifications)
+            if notifications:
+                await self._send_batch(notifications)
+                self.next_send = loop.time() + self.min_interval
+
+    async def _send_batch(self, notifications: list[Notification]):
+        try:
+            await self._send(notifications)
+            self.sent += len(notifications)
+            self.messages += 1
+        except Exception as e:
+            logger.warning('Could not send %d notifications: %s', len(notifications), e)
+            self.failed += len(notifications)
+
+    async def aclose(self):
+        self.closing = True
+        if self.worker is None:
+            return
+
+        if not self.queue.full():
+            self.queue.put_nowait(None)
+        try:
+            await asyncio.wait_for(self.worker, self.flush_timeout)
+        except TimeoutError:
+            logger.warning('Dropped %d notifications on shutdown', self.pending)
+            self.dropped += self.pending
+
+
+class TelegramNotifier(QueuedNotifier):
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        api_url: str = 'https://api.telegram.org',
+        timeout: float = 10.0,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
         self.token = token
         self.chat_id = chat_id
+        self.api_url = api_url
+        # one pooled client for all messages
+        self.client = httpx.AsyncClient(timeout=timeout)
 
-    def notify_analysis(self, uri: str, cache_hit: bool = False):
-        httpx.post(
-            f'https://api.telegram.org/bot{self.token}/sendMessage',
-            data={'chat_id': self.chat_id, 'text': f'BiaSight analyzed {'(cache hit)' if cache_hit else ''}: {uri}'}
-        )
+    def _url(self) -> str:
+        return f'{self.api_url}/bot{self.token}/sendMessage'
+
+    def _text(self, notifications: list[Notification]) -> str:
+        lines = [f'{n.uri}{' (cache hit)' if n.cache_hit else ''}' for n in notifications]
+        if len(lines) == 1:
+            return f'BiaSight analyzed: {lines[0]}'
+        text = f'BiaSight analyzed {len(lines)} pages:\n' + '\n'.join(lines)
+        return text[:MAX_MESSAGE_LENGTH]
+
+    async def _send(self, notifications: list[Notification]):
+        data = {'chat_id': self.chat_id, 'text': self._text(notifications)}
+        response = await self.client.post(self._url(), data=data)
+        response.raise_for_status()
+
+    async def aclose(self):
+        await super().aclose()
+        await self.client.aclose()
 
 
 class NoopNotifier(Notifier):
@@ -30,5 +181,15 @@ class NoopNotifier(Notifier):
 
 def create_notifier(settings: Settings) -> Notifier:
     if settings.telegram_enabled:
-        return TelegramNotifier(settings.telegram_token, settings.telegram_chat_id)
+        return TelegramNotifier(
+            settings.telegram_token,
+            settings.telegram_chat_id,
+            timeout=settings.telegram_timeout,
+            queue_size=settings.notify_queue_size,
+            batch_size=settings.notify_batch_size,
+            batch_interval=settings.notify_batch_interval,
+            min_interval=settings.notify_min_interval,
+            overflow=settings.notify_overflow,
+            flush_timeout=settings.notify_flush_timeout
+        )
     return NoopNotifier()
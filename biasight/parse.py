@@ -1,14 +1,128 @@
+import asyncio
+import codecs
+import json
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import cached_property
+from urllib.parse import urlsplit
+
+import httpx
 import requests
 from bs4 import BeautifulSoup, Comment
 import logging
 
+from requests.adapters import HTTPAdapter
+
+from biasight.cache import CacheBackend
+from biasight import metrics
+from biasight.extract import Block, TextExtractor
+from biasight.resilience import RetryPolicy
+from biasight.util import normalize_uri
+
 logger = logging.getLogger(__name__)
 
+# responses worth another attempt, all other client errors will not change
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def retryable_fetch_error(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in RETRY_STATUSES
+    return isinstance(e, httpx.TransportError)
+
+
+@dataclass
+class ParsedPage:
+    # final URI after redirects, relative links are resolved against it
+    uri: str
+    text: str
+    links: list[str] = field(default_factory=list)
+    # the same text grouped by block-level elements, empty when only the text is known
+    blocks: list[Block] = field(default_factory=list)
+
+
+class _PageReader:
+
+    def __init__(self, uri: str, encoding: str, max_content_length: int, max_text_length: int):
+        self.uri = uri
+        self.max_content_length = max_content_length
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.extractor = TextExtractor(max_text_length)
+        self.content_length = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        # returns whether more content is needed, text is extracted while the page is still downloading
+        remaining = self.max_content_length - self.content_length
+        self.content_length += len(chunk)
+
+        if self.content_length > self.max_content_length:
+            logger.warning('Max content length %d exceeded for URI %s, truncating', self.max_content_length, self.uri)
+            self.extractor.feed(self.decoder.decode(chunk[:remaining]))
+            return False
+
+        self.extractor.feed(self.decoder.decode(chunk))
+
+        if self.extractor.done:
+            logger.info('Text budget reached for URI %s, stopping download', self.uri)
+            return False
+        return True
+
+    def page(self, uri: str) -> ParsedPage:
+        self.extractor.feed(self.decoder.decode(b'', final=True))
+        self.extractor.close()
+        return ParsedPage(uri, self.extractor.text, self.extractor.links, self.extractor.blocks)
+
+
+def extract_page(
+    uri: str,
+    content: bytes,
+    encoding: str | None,
+    max_content_length: int,
+    max_text_length: int = 0,
+    chunk_size: int = 65536
+) -> ParsedPage:
+    # extracts a page downloaded as a whole, a plain function so it can run in a process pool
+    reader = _PageReader(uri, encoding or 'utf-8', max_content_length, max_text_length)
+    for i in range(0, len(content), chunk_size):
+        if not reader.feed(content[i:i + chunk_size]):
+            break
+    return reader.page(uri)
+
+
 class WebParser:
 
-    def __init__(self, max_content_length: int, chunk_size: int):
+    def __init__(
+        self,
+        max_content_length: int,
+        chunk_size: int,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        max_connections: int = 100,
+        max_connections_per_host: int = 6,
+        validators: CacheBackend | None = None,
+        max_text_length: int = 0
+    ):
+        # max_content_length is in bytes as received (after decompression), max_text_length in extracted characters
         self.max_content_length = max_content_length
         self.chunk_size = chunk_size
+        self.max_text_length = max_text_length
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        # ETag / Last-Modified and the extracted text per URI, used to revalidate instead of downloading again
+        self.validators = validators
+
+    @cached_property
+    def session(self) -> requests.Session:
+        # pooled session, connections to the same host are kept alive and reused
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_connections, pool_maxsize=self.max_connections_per_host)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
     @staticmethod
     def _tag_visible(element):
@@ -33,26 +147,195 @@ class WebParser:
 
         return ' '.join(t.strip() for t in visible_texts)
 
+    def _reader(self, uri: str, encoding: str | None) -> _PageReader:
+        return _PageReader(uri, encoding or 'utf-8', self.max_content_length, self.max_text_length)
+
+    def _validated(self, uri: str) -> dict | None:
+        if self.validators is None:
+            return None
+        value = self.validators.get(normalize_uri(uri))
+        return json.loads(value) if value else None
+
+    @staticmethod
+    def _conditional_headers(validated: dict | None) -> dict:
+        headers = {}
+        if validated and validated.get('etag'):
+            headers['If-None-Match'] = validated['etag']
+        if validated and validated.get('last_modified'):
+            headers['If-Modified-Since'] = validated['last_modified']
+        return headers
+
+    def _remember(self, uri: str, headers, page: ParsedPage):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+
+        if self.validators is None or not (etag or last_modified):
+            return
+
+        value = json.dumps({
+            'etag': etag,
+            'last_modified': last_modified,
+            'uri': page.uri,
+            'text': page.text,
+            'links': page.links,
+            'blocks': [[block.text, block.link_length, block.labels] for block in page.blocks]
+        })
+        self.validators.set(normalize_uri(uri), value.encode())
+
+    @staticmethod
+    def _not_modified(uri: str, validated: dict) -> ParsedPage:
+        logger.info('URI %s not modified, reusing extracted text', uri)
+        return ParsedPage(
+            validated.get('uri', uri),
+            validated['text'],
+            validated.get('links', []),
+            [Block(*block) for block in validated.get('blocks', [])]
+        )
 
     def parse(self, uri: str) -> str or None:
-        try:
-            with requests.get(uri, stream=True) as response:
-                response.raise_for_status()
+        page = self.parse_page(uri)
+        return page.text if page else None
+
+    def parse_page(self, uri: str) -> ParsedPage | None:
+        validated = self._validated(uri)
 
-                content = []
-                content_length = 0
+        try:
+            with self.session.get(
+                uri,
+                stream=True,
+                headers=self._conditional_headers(validated),
+                timeout=(self.connect_timeout, self.read_timeout)
+            ) as response:
+                if response.status_code == 304 and validated:
+                    return self._not_modified(uri, validated)
 
-                for chunk in response.iter_content(chunk_size=self.chunk_size, decode_unicode=True):
-                    content.append(chunk)
-                    content_length += len(chunk)
+                response.raise_for_status()
 
-                    if content_length > self.max_content_length:
-                        logger.warning('Max content length %d exceeded for URI %s, truncating', self.max_content_length, uri)
+                reader = self._reader(uri, response.encoding)
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if not reader.feed(chunk):
                         break
 
-                html_content = ''.join(content)
-                return self._text_from_html(html_content)
+                page = reader.page(response.url)
+                self._remember(uri, response.headers, page)
+                return page
 
         except requests.RequestException as e:
             logger.error('Error parsing URI %s: %s', uri, e)
             return None
+
+    def close(self):
+        if 'session' in self.__dict__:
+            self.session.close()
+
+
+class AsyncWebParser(WebParser):
+
+    def __init__(
+        self,
+        max_content_length: int,
+        chunk_size: int,
+        client: httpx.AsyncClient | None = None,
+        retry_policy: RetryPolicy | None = None,
+        **kwargs
+    ):
+        super().__init__(max_content_length, chunk_size, **kwargs)
+        # transient errors are retried per fetch, a page that cannot be fetched is reported as None
+        self.retry_policy = retry_policy
+        # a single pooled client keeps connections alive across requests, compressed responses are decoded
+        # transparently
+        self.client = client or httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        )
+        # httpx only limits the pool as a whole, so connections per host are capped separately
+        self.host_slots: weakref.WeakValueDictionary[str, asyncio.Semaphore] = weakref.WeakValueDictionary()
+
+    @asynccontextmanager
+    async def _host_slot(self, uri: str):
+        host = urlsplit(uri).netloc.lower()
+        slot = self.host_slots.get(host)
+        if slot is None:
+            slot = self.host_slots[host] = asyncio.Semaphore(self.max_connections_per_host)
+        async with slot:
+            yield
+
+    async def parse(self, uri: str) -> str or None:
+        page = await self.parse_page(uri)
+        return page.text if page else None
+
+    async def parse_page(self, uri: str) -> ParsedPage | None:
+        try:
+            if self.retry_policy:
+                return await self.retry_policy.run(lambda: self._fetch(uri))
+            return await self._fetch(uri)
+
+        # malformed URIs, like one with an unclosed IPv6 bracket, already fail in urlsplit with a ValueError
+        except (httpx.HTTPError, httpx.InvalidURL, TimeoutError, ValueError) as e:
+            logger.error('Error parsing URI %s: %s', uri, e)
+            return None
+
+    async def download(self, uri: str) -> tuple[str, bytes, str | None]:
+        # final URI, body and encoding of a page without extracting it, for callers that extract elsewhere. The body
+        # is cut after max_content_length bytes, errors are raised once the retries are used up.
+        if self.retry_policy:
+            return await self.retry_policy.run(lambda: self._download(uri))
+        return await self._download(uri)
+
+    async def _download(self, uri: str) -> tuple[str, bytes, str | None]:
+        start = time.perf_counter()
+        body = bytearray()
+
+        async with self._host_slot(uri), self.client.stream('GET', uri) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size=self.chunk_size):
+                body += chunk
+                # one byte more than allowed, so the extraction reports the truncation
+                if len(body) > self.max_content_length:
+                    del body[self.max_content_length + 1:]
+                    break
+
+        metrics.observe('fetch', time.perf_counter() - start)
+        metrics.page_bytes.observe(len(body))
+        return str(response.url), bytes(body), response.encoding
+
+    async def _fetch(self, uri: str) -> ParsedPage:
+        validated = self._validated(uri)
+        start = time.perf_counter()
+        # extraction runs between the chunks, its time is measured separately from the download
+        extract_seconds = 0.0
+
+        async with self._host_slot(uri), self.client.stream(
+            'GET',
+            uri,
+            headers=self._conditional_headers(validated)
+        ) as response:
+            if response.status_code == 304 and validated:
+                metrics.observe('fetch', time.perf_counter() - start)
+                return self._not_modified(uri, validated)
+
+            response.raise_for_status()
+
+            # each chunk is extracted as it arrives, so the event loop is only held for small slices
+            reader = self._reader(uri, response.encoding)
+            async for chunk in response.aiter_bytes(chunk_size=self.chunk_size):
+                feed_start = time.perf_counter()
+                more = reader.feed(chunk)
+                extract_seconds += time.perf_counter() - feed_start
+                if not more:
+                    break
+
+        feed_start = time.perf_counter()
+        page = reader.page(str(response.url))
+        extract_seconds += time.perf_counter() - feed_start
+
+        metrics.observe('fetch', time.perf_counter() - start - extract_seconds)
+        metrics.observe('extract', extract_seconds)
+        metrics.page_bytes.observe(reader.content_length)
+        metrics.page_characters.observe(len(page.text))
+        self._remember(uri, response.headers, page)
+        return page
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+# retries a single stage (fetching a page, one LLM call) with exponential backoff and full jitter. Attempts stop at
+# the deadline in seconds since the first attempt, a retry that could only start after it is not made.
+class RetryPolicy:
+
+    def __init__(
+        self,
+        name: str,
+        attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+        deadline: float = 30.0,
+        retryable: Callable[[Exception], bool] = lambda e: True,
+        seed: int | None = None
+    ):
+        self.name = name
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retryable = retryable
+        self.random = random.Random(seed)
+        self.retries = 0
+
+    def delay(self, attempt: int) -> float:
+        return self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def backoff(self, e: Exception, attempt: int, started: float) -> bool:
+        # waits before the next attempt after attempt (counted from 0) failed, False if there is none
+        if attempt + 1 >= self.attempts or not self.retryable(e):
+            return False
+        delay = self.delay(attempt)
+        if time.monotonic() + delay - started >= self.deadline:
+            return False
+
+        self.retries += 1
+        logger.warning('%s attempt %d failed: %s, retrying in %.1f s', self.name, attempt + 1, e, delay)
+        await asyncio.sleep(delay)
+        return True
+
+    async def run(self, func: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                # an attempt still running at the deadline is cancelled with a TimeoutError
+                async with asyncio.timeout(self.deadline - (time.monotonic() - started)):
+                    return await func()
+            except Exception as e:
+                if not await self.backoff(e, attempt, started):
+                    raise
+                attempt += 1
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, retry_after: float):
+        super().__init__(f'Circuit open, retry in {retry_after:.0f} s')
+        self.retry_after = retry_after
+
+
+# fails calls immediately while a dependency is down. After failure_threshold consecutive failures the circuit opens
+# and calls raise CircuitOpenError for reset_timeout seconds. Then a single trial call is let through (half open),
+# its success closes the circuit and its failure opens it again.
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        # a trial that never reports back, e.g. because it was cancelled, is replaced after reset_timeout
+        self.trial_started = 0.0
+        self.lock = threading.Lock()
+
+        self.opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open' and now - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.opened_at + self.reset_timeout - now)
+            if self.state == 'half_open' and now - self.trial_started < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.trial_started + self.reset_timeout - now)
+
+            logger.info('Circuit half open, trying a call')
+            self.state = 'half_open'
+            self.trial_started = now
+
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                logger.info('Circuit closed')
+            self.state = 'closed'
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or (
+                self.state == 'closed' and self.consecutive_failures >= self.failure_threshold
+            ):
+                logger.warning('Circuit opened after %d consecutive failures', self.consecutive_failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.opened += 1
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        self.before_call()
+        try:
+            result = await func()
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+# starts a second identical call if the first one is slower than the given percentile of recent latencies, the
+# first result wins and the other call is cancelled. Nothing is hedged before min_samples latencies are known.
+class Hedger:
+
+    def __init__(self, percentile: int = 95, min_samples: int = 20, window: int = 200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> float | None:
+        if len(self.latencies) < self.min_samples:
+            return None
+        return statistics.quantiles(self.latencies, n=100)[self.percentile - 1]
+
+    async def run(self, func: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        delay = self.delay()
+        first = asyncio.ensure_future(func())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(func()))
+
+            # the first successful call wins, an error is only raised when all calls failed
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        # the latency of a lost first call is at least this long
+                        self.latencies.append(time.monotonic() - start)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,375 @@
+import asyncio
+import functools
+import json
+import logging
+import math
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+from biasight import metrics
+from biasight.admission import AdmissionController, AdmissionRejected
+from biasight.bias import BiasAnalyzer
+from biasight.cache import CacheBackend, ContentCache
+from biasight.clean import ContentCleaner
+from biasight.flight import SingleFlight
+from biasight.lexicon import GenderLexicon
+from biasight.limit import DEFAULT_CLIENT, RateLimiter
+from biasight.model import AnalyzeResponse, AnalyzeResult, QuickAnalyzeResponse
+from biasight.notify import Notifier
+from biasight.parse import AsyncWebParser, ParsedPage
+from biasight.resilience import CircuitOpenError
+from biasight.similar import SimilarPage, SimilarityIndex
+from biasight.stream import EventLog
+from biasight.util import estimate_tokens, normalize_uri
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisService:
+
+    def __init__(
+        self,
+        web_parser: AsyncWebParser,
+        bias_analyzer: BiasAnalyzer,
+        rate_limiter: RateLimiter,
+        notifier: Notifier,
+        result_cache: CacheBackend,
+        content_cache: ContentCache,
+        content_cleaner: ContentCleaner | None = None,
+        admission: AdmissionController | None = None,
+        similar_pages: SimilarityIndex | None = None,
+        lexicon: GenderLexicon | None = None,
+        quick_rate_limiter: RateLimiter | None = None,
+        quick_cache: CacheBackend | None = None
+    ):
+        self.web_parser = web_parser
+        self.bias_analyzer = bias_analyzer
+        self.rate_limiter = rate_limiter
+        self.notifier = notifier
+        self.result_cache = result_cache
+        self.content_cache = content_cache
+        # reduces the page to its main content before analysis, the whole extracted text is analyzed without it
+        self.content_cleaner = content_cleaner
+        # concurrent requests for the same page wait for a single analysis instead of starting their own
+        self.flight = SingleFlight()
+        # events of the streamed analyses in flight, by key
+        self.streams: dict[str, EventLog] = {}
+        # bounds the analyses calling the LLM at the same time, cached results never wait for it
+        self.admission = admission
+        # near-duplicates of analyzed pages get the result of the analyzed page, marked as derived
+        self.similar_pages = similar_pages
+        # counts gendered language for quick analyses, which do not call the LLM
+        self.lexicon = lexicon or GenderLexicon()
+        # quick analyses still fetch the page, they are limited by a bucket of their own or the one of full analyses
+        self.quick_rate_limiter = quick_rate_limiter or rate_limiter
+        # quick responses without the URI by normalized URI, none are cached without it
+        self.quick_cache = quick_cache
+
+    async def analyze(self, uri: str, client: str = DEFAULT_CLIENT) -> AnalyzeResponse:
+        return AnalyzeResponse.model_validate_json(await self.analyze_json(uri, client))
+
+    async def analyze_json(self, uri: str, client: str = DEFAULT_CLIENT) -> bytes:
+        # the response as JSON. Responses are cached encoded without the URI, a hit only inserts the requested URI
+        # instead of validating and serializing the response again.
+        key = normalize_uri(uri)
+
+        # try to use cached result
+        cached_result = self.result_cache.get(key)
+
+        if cached_result:
+            metrics.result_cache_hits.inc()
+            logger.info('Returning cached result for %s', uri)
+            self.notifier.notify_analysis(uri, cache_hit=True)
+            return self._with_uri(cached_result, uri)
+
+        metrics.result_cache_misses.inc()
+        encoded, shared = await self._coalesced(key, uri, lambda: self._analyze_uri(key, uri, client))
+
+        if shared:
+            logger.info('Returning coalesced result for %s', uri)
+        self.notifier.notify_analysis(uri, cache_hit=shared)
+        return self._with_uri(encoded, uri)
+
+    async def analyze_quick(self, uri: str, client: str = DEFAULT_CLIENT) -> QuickAnalyzeResponse:
+        # only fetching takes noticeable time, cached counts are returned without fetching or a rate limit check
+        key = normalize_uri(uri)
+        cached = self.quick_cache.get(key) if self.quick_cache is not None else None
+        if cached:
+            logger.info('Returning cached quick analysis for %s', uri)
+            return QuickAnalyzeResponse.model_validate_json(self._with_uri(cached, uri))
+
+        self.quick_rate_limiter.increment(client)
+        logger.info('Quick analysis of %s', uri)
+        page = await self._parse_page(uri)
+        text = self._clean(page)
+        with metrics.timed('lexicon'):
+            language_metrics = self.lexicon.analyze(text)
+
+        response = QuickAnalyzeResponse(uri=uri, language_metrics=language_metrics)
+        if self.quick_cache is not None:
+            self.quick_cache.set(key, self._encode(response))
+        return response
+
+    async def analyze_stream(self, uri: str, client: str = DEFAULT_CLIENT) -> AsyncIterator[tuple[str, dict]]:
+        # yields (event, data) pairs: stage events, fields and categories while the LLM generates them, and the
+        # response as last event
+        key = normalize_uri(uri)
+
+        if self.result_cache.get(key):
+            # a cached analysis is not streamed, its response is sent right away
+            yield 'result', json.loads(await self.analyze_json(uri, client))
+            return
+
+        metrics.result_cache_misses.inc()
+        # the streamed analysis is an in-flight call like the one of /analyze, so concurrent streams and /analyze
+        # requests for the page share it. Streams attaching to a streamed analysis replay its events, an analysis
+        # started by /analyze has none, its response is sent once available.
+        sent = 0
+        while True:
+            log = EventLog()
+            task, shared = self.flight.start(key, lambda: self._stream_uri(key, uri, client, log))
+            if not shared:
+                self.streams[key] = log
+                task.add_done_callback(functools.partial(self._stream_done, key, log))
+
+            events = self.streams.get(key)
+            if events:
+                position = 0
+                async for event, data in events.follow():
+                    position += 1
+                    # the stages before the rate limit check were sent already if another client was limited
+                    if position > sent:
+                        sent = position
+                        yield event, data
+            try:
+                encoded = await asyncio.shield(task)
+                break
+            except HTTPException as e:
+                if not self._retry_limited(e, shared, uri):
+                    raise
+
+        if shared:
+            logger.info('Returning coalesced result for %s', uri)
+        self.notifier.notify_analysis(uri, cache_hit=shared)
+        yield 'result', json.loads(self._with_uri(encoded, uri))
+
+    async def _coalesced(self, key: str, uri: str, fn: Callable[[], Awaitable[bytes]]) -> tuple[bytes, bool]:
+        while True:
+            task, shared = self.flight.start(key, fn)
+            try:
+                return await asyncio.shield(task), shared
+            except HTTPException as e:
+                if not self._retry_limited(e, shared, uri):
+                    raise
+
+    @staticmethod
+    def _retry_limited(e: HTTPException, shared: bool, uri: str) -> bool:
+        # the rate limit is checked in the shared analysis, for the client that started it. Other clients waiting
+        # for it are not limited by that, they start an analysis of their own.
+        if not shared or e.status_code != status.HTTP_429_TOO_MANY_REQUESTS:
+            return False
+        logger.info('Analysis of %s was rate limited for another client, starting over', uri)
+        return True
+
+    def _stream_done(self, key: str, log: EventLog, _: asyncio.Task):
+        log.close()
+        if self.streams.get(key) is log:
+            del self.streams[key]
+
+    async def _stream_uri(self, key: str, uri: str, client: str, log: EventLog) -> bytes:
+        logger.info('Streaming analysis of %s', uri)
+        page = await self._parse_page(uri)
+        log.append('stage', {'stage': 'fetched', 'uri': page.uri, 'characters': len(page.text)})
+
+        text = self._clean(page)
+        log.append('stage', {'stage': 'extracted', 'characters': len(text)})
+
+        result = self.content_cache.get(text)
+        similar = None
+
+        if result:
+            logger.info('Returning content cached result for %s', uri)
+            log.append('stage', {'stage': 'cached'})
+        else:
+            fingerprint = self._fingerprint(text)
+            result, similar = self._similar_result(fingerprint, text, uri)
+
+        if similar:
+            log.append('stage', {'stage': 'similar', 'derived_from': similar.uri, 'similarity': similar.similarity})
+        elif not result:
+            async with self._slot():
+                self.rate_limiter.increment(client)
+                log.append('stage', {'stage': 'llm_started'})
+
+                try:
+                    start = time.perf_counter()
+                    async for event, data in self.bias_analyzer.analyze_stream(text):
+                        if event == 'result':
+                            result = data
+                        else:
+                            log.append(event, data)
+                    llm_seconds = time.perf_counter() - start
+                except CircuitOpenError as e:
+                    raise self._unavailable(e.retry_after)
+                except Exception:
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail='Could not analyze page'
+                    )
+
+            self._put_content(text, result, llm_seconds)
+            self._index(fingerprint, text, uri)
+
+        encoded = self._encode(self._response(uri, result, similar))
+        self.result_cache.set(key, encoded)
+        return encoded
+
+    async def _parse_page(self, uri: str) -> ParsedPage:
+        page = await self.web_parser.parse_page(uri)
+
+        if not page or not page.text:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Could not parse page')
+        return page
+
+    def _clean(self, page: ParsedPage) -> str:
+        if not self.content_cleaner:
+            return page.text
+        with metrics.timed('clean'):
+            return self.content_cleaner.clean(page).text
+
+    async def _analyze_uri(self, key: str, uri: str, client: str) -> bytes:
+        logger.info('Analyzing %s', uri)
+        page = await self._parse_page(uri)
+        text = self._clean(page)
+
+        result, similar = await self._result(text, uri, client)
+        encoded = self._encode(self._response(uri, result, similar))
+        self.result_cache.set(key, encoded)
+        return encoded
+
+    async def analyze_text(self, text: str, uri: str, client: str = DEFAULT_CLIENT) -> AnalyzeResult:
+        # for callers fetching pages themselves (site audits), with the caches, rate limit and LLM slots of /analyze
+        result, _ = await self._result(text, uri, client)
+        return result
+
+    async def _result(self, text: str, uri: str, client: str) -> tuple[AnalyzeResult, SimilarPage | None]:
+        # the same content behind another URI (mirrors, tracking parameters) or an unchanged page after the
+        # URI cache expired does not need another LLM call, and neither does a near-duplicate of an analyzed page
+        result = self.content_cache.get(text)
+        if result:
+            logger.info('Returning content cached result for %s', uri)
+            return result, None
+
+        fingerprint = self._fingerprint(text)
+        result, similar = self._similar_result(fingerprint, text, uri)
+        if not result:
+            result = await self._analyze_text(text, client)
+            self._index(fingerprint, text, uri)
+        return result, similar
+
+    def _fingerprint(self, text: str) -> int | None:
+        if self.similar_pages is None:
+            return None
+        with metrics.timed('fingerprint'):
+            return self.similar_pages.fingerprint(text)
+
+    def _similar_result(
+        self,
+        fingerprint: int | None,
+        text: str,
+        uri: str
+    ) -> tuple[AnalyzeResult | None, SimilarPage | None]:
+        if fingerprint is None:
+            return None, None
+        similar = self.similar_pages.get(fingerprint)
+        # the analysis of the near-duplicate may have been evicted from the content cache in the meantime
+        result = self.content_cache.get_key(similar.key, count=False) if similar else None
+        if not result:
+            return None, None
+
+        logger.info(
+            'Returning result of %s for %s, %.0f%% similar',
+            similar.uri,
+            uri,
+            similar.similarity * 100
+        )
+        # the counted language is the one of this page, it differs where the near-duplicate does
+        return self.bias_analyzer.count_language(text, result), similar
+
+    def _index(self, fingerprint: int | None, text: str, uri: str):
+        if fingerprint is not None:
+            self.similar_pages.put(fingerprint, self.content_cache.key(text), uri)
+
+    @staticmethod
+    def _response(uri: str, result: AnalyzeResult, similar: SimilarPage | None) -> AnalyzeResponse:
+        if not similar:
+            return AnalyzeResponse(uri=uri, result=result)
+        return AnalyzeResponse(uri=uri, result=result, derived_from=similar.uri, similarity=similar.similarity)
+
+    @staticmethod
+    def _encode(response: AnalyzeResponse | QuickAnalyzeResponse) -> bytes:
+        # the URI is left out, the same entry serves every form of the normalized URI
+        return response.model_dump_json(exclude={'uri'}).encode()
+
+    @staticmethod
+    def _with_uri(encoded: bytes, uri: str) -> bytes:
+        # the requested URI becomes the first member of the encoded object
+        if encoded.startswith(b'{"uri":'):
+            # entries cached before the URI was left out hold the URI of the request that was analyzed, they are
+            # served until they expire
+            response = AnalyzeResponse.model_validate_json(encoded)
+            return response.model_copy(update={'uri': uri}).model_dump_json().encode()
+        return b'{"uri":' + json.dumps(uri).encode() + b',' + encoded[1:]
+
+    @asynccontextmanager
+    async def _slot(self):
+        if not self.admission:
+            yield
+            return
+        try:
+            async with self.admission.slot():
+                yield
+        except AdmissionRejected as e:
+            raise self._unavailable(e.retry_after)
+
+    async def _analyze_text(self, text: str, client: str) -> AnalyzeResult:
+        async with self._slot():
+            # check the rate limit of the client before invoking the analyzer, cached results are not limited. Shed
+            # requests are not counted.
+            self.rate_limiter.increment(client)
+
+            try:
+                start = time.perf_counter()
+                result = await self.bias_analyzer.analyze_async(text)
+                llm_seconds = time.perf_counter() - start
+            except CircuitOpenError as e:
+                raise self._unavailable(e.retry_after)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail='Could not analyze page'
+                )
+
+        self._put_content(text, result, llm_seconds)
+        return result
+
+    @staticmethod
+    def _unavailable(retry_after: float) -> HTTPException:
+        # the LLM is down or overloaded, clients should come back when the breaker tries it again or the queue drained
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Analysis is temporarily unavailable, please try again later',
+            headers={'Retry-After': str(math.ceil(retry_after))}
+        )
+
+    def _put_content(self, text: str, result: AnalyzeResult, llm_seconds: float):
+        self.content_cache.put(
+            text,
+            result,
+            llm_seconds,
+            input_tokens=self.bias_analyzer.prompt_tokens + estimate_tokens(text),
+            output_tokens=estimate_tokens(result.model_dump_json())
+        )
@@ -0,0 +1,121 @@
+import hashlib
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+FINGERPRINT_BITS = 64
+# numbers are skipped, dates, prices and comment counts do not make a page different
+WORD = re.compile(r'[^\W\d_]+')
+
+
+def simhash(text: str) -> tuple[int, int]:
+    # 64 bit SimHash of the three word shingles of the text and the number of shingles. Every shingle hash votes for
+    # the bits it has set, a bit of the fingerprint is set if most shingles have it. Votes are counted per byte
+    # position with Counter over the concatenated hashes, which runs in C instead of 64 Python operations per shingle.
+    words = WORD.findall(text.lower())
+    shingles = [f'{a} {b} {c}' for a, b, c in zip(words, words[1:], words[2:])]
+    if not shingles:
+        return 0, 0
+    blake2b = hashlib.blake2b
+    digests = b''.join(blake2b(shingle.encode(), digest_size=8).digest() for shingle in shingles)
+
+    votes = [0] * FINGERPRINT_BITS
+    for byte in range(8):
+        for value, count in Counter(digests[byte::8]).items():
+            for bit in range(8):
+                if value >> bit & 1:
+                    votes[byte * 8 + bit] += count
+
+    fingerprint = 0
+    for bit, vote in enumerate(votes):
+        if vote * 2 > len(shingles):
+            fingerprint |= 1 << bit
+    return fingerprint, len(shingles)
+
+
+def similarity(a: int, b: int) -> float:
+    return 1 - (a ^ b).bit_count() / FINGERPRINT_BITS
+
+
+@dataclass
+class SimilarPage:
+    # content cache key of the analyzed text and the URI it was analyzed for
+    key: str
+    uri: str
+    similarity: float
+
+
+# finds the analyzed page with the nearest SimHash within max_distance differing bits. The fingerprint is split into
+# max_distance + 1 bands and every band is an exact match table, so by the pigeonhole principle any fingerprint
+# within max_distance shares at least one band with the query and is found. Wider bands (a lower max_distance) mean
+# fewer candidates per lookup. The least recently used entries are evicted beyond max_entries. Texts with fewer than
+# min_words words are not indexed, their fingerprints are not reliable.
+class SimilarityIndex:
+
+    def __init__(self, max_distance: int = 3, max_entries: int = 100000, min_words: int = 50):
+        if not 0 <= max_distance < FINGERPRINT_BITS // 2:
+            raise ValueError(f'max_distance must be between 0 and {FINGERPRINT_BITS // 2 - 1}')
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.min_words = min_words
+
+        # (shift, mask) per band
+        bands = max_distance + 1
+        bounds = [FINGERPRINT_BITS * i // bands for i in range(bands + 1)]
+        self.bands = [(start, (1 << end - start) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.tables: list[dict[int, list[int]]] = [{} for _ in self.bands]
+        # fingerprint -> (content cache key, URI), in the order of last use
+        self.entries: OrderedDict[int, tuple[str, str]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def fingerprint(self, text: str) -> int | None:
+        fingerprint, shingles = simhash(text)
+        return fingerprint if shingles >= self.min_words else None
+
+    def nearest(self, fingerprint: int) -> tuple[int, int] | None:
+        # (fingerprint, distance) of the nearest indexed fingerprint within max_distance
+        best = None
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            for candidate in table.get(fingerprint >> shift & mask, ()):
+                distance = (fingerprint ^ candidate).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (candidate, distance)
+        return best
+
+    def get(self, fingerprint: int) -> SimilarPage | None:
+        nearest = self.nearest(fingerprint)
+        if nearest is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        candidate, distance = nearest
+        self.entries.move_to_end(candidate)
+        key, uri = self.entries[candidate]
+        return SimilarPage(key, uri, 1 - distance / FINGERPRINT_BITS)
+
+    def put(self, fingerprint: int, key: str, uri: str):
+        if fingerprint in self.entries:
+            self.entries.move_to_end(fingerprint)
+        else:
+            for table, (shift, mask) in zip(self.tables, self.bands):
+                table.setdefault(fingerprint >> shift & mask, []).append(fingerprint)
+        self.entries[fingerprint] = (key, uri)
+
+        while len(self.entries) > self.max_entries:
+            self._remove(self.entries.popitem(last=False)[0])
+            self.evictions += 1
+
+    def _remove(self, fingerprint: int):
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            band = fingerprint >> shift & mask
+            bucket = table[band]
+            bucket.remove(fingerprint)
+            if not bucket:
+                del table[band]
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+
+def sse_event(event: str, data: Any) -> str:
+    # data is a single line of JSON, so it never needs to be split into several data fields
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+# incremental parser for a JSON object streamed in chunks: every top-level member is returned as soon as the
+# separator after its value arrives, so fields can be shown while the rest of the object is still being generated.
+# Each character is scanned once, only the text of the member being parsed is decoded.
+class JSONObjectStream:
+
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        # start of the current top-level member in the buffer
+        self.member_start: int | None = None
+        self.closed = False
+
+    def _member(self, end: int) -> list[tuple[str, Any]]:
+        text = self.buffer[self.member_start:end].strip()
+        self.member_start = end + 1
+        if not text:
+            return []
+        return list(json.loads('{' + text + '}').items())
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        self.buffer += chunk
+        members = []
+
+        for i in range(self.position, len(self.buffer)):
+            if self.closed:
+                break
+            c = self.buffer[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+            elif c == '"':
+                self.in_string = True
+            elif c in '{[':
+                self.depth += 1
+                if self.depth == 1:
+                    self.member_start = i + 1
+            elif c in '}]':
+                if self.depth == 1:
+                    members.extend(self._member(i))
+                    self.closed = True
+                self.depth -= 1
+            elif c == ',' and self.depth == 1:
+                members.extend(self._member(i))
+
+        self.position = len(self.buffer)
+        return members
+
+    @property
+    def text(self) -> str:
+        return self.buffer
+
+
+# events of a streamed analysis, kept until it ends so streams attaching to it later replay the events they missed
+class EventLog:
+
+    def __init__(self):
+        self.events: list[tuple[str, Any]] = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, event: str, data: Any):
+        self.events.append((event, data))
+        self._notify()
+
+    def close(self):
+        self.closed = True
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[tuple[str, Any]]:
+        # every event from the first one until the log is closed
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.closed:
+                return
+            await changed.wait()
@@ -1,27 +1,35 @@
-from functools import wraps
-from time import sleep
 import logging
+from urllib.parse import urlsplit, urlunsplit
 
-logger = logging.getLogger(__name__)
+import colorlog
 
-def retry(max_retries: int, ignore_exceptions: tuple = (ValueError,)) -> callable:
-    def decorator(func) -> callable:
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            for _ in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    if not isinstance(e, ignore_exceptions):
-                        logger.error(f'Error in {func.__name__}: {e}')
-                        if _ < max_retries - 1:
-                            logger.warning(f'Retrying {func.__name__}...')
-                            sleep(1)
-                        else:
-                            raise e
-                    else:
-                        raise e
+DEFAULT_PORTS = {'http': 80, 'https': 443}
 
-        return wrapper
+def normalize_uri(uri: str) -> str:
+    # canonical form used to recognize requests for the same page: lowercase scheme and host, no default port,
+    # no fragment and at least a root path. URIs that cannot be parsed (invalid port) are returned as they are, they
+    # fail when fetched.
+    uri = uri.strip()
+    try:
+        parts = urlsplit(uri)
+        port = parts.port
+    except ValueError:
+        return uri
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    # IPv6 addresses keep their brackets
+    if ':' in host:
+        host = f'[{host}]'
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{port}'
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
 
-    return decorator
+def estimate_tokens(text: str) -> int:
+    # rough estimate for Gemini, roughly 4 characters per token for English text
+    return len(text) // 4
+
+def setup_logging(level: int = logging.INFO):
+    log_format = '%(log_color)s%(asctime)s [%(levelname)s] %(reset)s%(purple)s[%(name)s] %(reset)s%(blue)s%(message)s'
+    handler = colorlog.StreamHandler()
+    handler.setFormatter(colorlog.ColoredFormatter(log_format))
+    logging.basicConfig(level=level, handlers=[handler])
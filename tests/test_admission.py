@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+
+from biasight.admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+
+    async def hold(self, admission: AdmissionController, seconds: float, order: list[int], i: int):
+        async with admission.slot():
+            order.append(i)
+            await asyncio.sleep(seconds)
+
+    async def test_concurrency_is_capped_in_arrival_order(self):
+        admission = AdmissionController(max_concurrent=2, queue_size=10)
+        order = []
+        running = 0
+        peak = 0
+
+        async def call(i: int):
+            nonlocal running, peak
+            async with admission.slot():
+                order.append(i)
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(call(i) for i in range(8)))
+
+        self.assertEqual(2, peak)
+        self.assertEqual(list(range(8)), order)
+        self.assertEqual((8, 6), (admission.admitted, admission.max_queued))
+        self.assertEqual((0, 0), (admission.active, admission.queued))
+
+    async def test_full_queue_is_rejected_right_away(self):
+        admission = AdmissionController(max_concurrent=1, queue_size=1)
+        tasks = [asyncio.create_task(self.hold(admission, 0.05, [], i)) for i in range(2)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(AdmissionRejected) as context:
+            await admission.acquire()
+        self.assertEqual('queue full', context.exception.reason)
+        self.assertEqual(1, admission.rejected_full)
+        await asyncio.gather(*tasks)
+
+    async def test_expected_wait_above_deadline_is_rejected(self):
+        admission = AdmissionController(max_concurrent=1, queue_size=10, max_wait=1.5)
+        # slots were held for 1 s recently, the second waiter would wait about 2 s
+        admission.hold_seconds = 1.0
+        tasks = [asyncio.create_task(self.hold(admission, 0.05, [], i)) for i in range(2)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(AdmissionRejected) as context:
+            await admission.acquire()
+        self.assertEqual('deadline', context.exception.reason)
+        self.assertAlmostEqual(2.0, context.exception.retry_after)
+        await asyncio.gather(*tasks)
+
+    async def test_wait_times_out(self):
+        admission = AdmissionController(max_concurrent=1, queue_size=10, max_wait=0.02)
+        task = asyncio.create_task(self.hold(admission, 0.1, [], 0))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(AdmissionRejected) as context:
+            await admission.acquire()
+        self.assertEqual('timed out', context.exception.reason)
+        self.assertEqual(0, admission.queued)
+        await task
+        self.assertEqual(0, admission.active)
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        admission = AdmissionController(max_concurrent=1, queue_size=10)
+        order = []
+        first = asyncio.create_task(self.hold(admission, 0.02, order, 0))
+        cancelled = asyncio.create_task(self.hold(admission, 0.02, order, 1))
+        last = asyncio.create_task(self.hold(admission, 0.02, order, 2))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        await asyncio.gather(first, last)
+
+        self.assertEqual([0, 2], order)
+        self.assertEqual((0, 0), (admission.active, admission.queued))
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import re
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+from biasight.audit import AuditJob, AuditJobs
+from biasight.bias import BiasAnalyzer
+from biasight.cache import ContentCache, MemoryCacheBackend
+from biasight.limit import RateLimiter
+from biasight.notify import NoopNotifier
+from biasight.parse import AsyncWebParser
+from biasight.service import AnalysisService
+
+SITE_DIRECTORY = os.path.join(os.path.dirname(__file__), 'fixtures', 'site')
+
+
+class FixtureSiteHandler(SimpleHTTPRequestHandler):
+
+    def do_GET(self):
+        # robots.txt and the sitemap need absolute URIs of the local server
+        if self.path in ('/robots.txt', '/sitemap.xml'):
+            with open(os.path.join(SITE_DIRECTORY, self.path[1:])) as f:
+                body = f.read().replace('{base}', f'http://{self.headers["Host"]}').encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_reply(score: int) -> str:
+    return (
+        f'{{"summary": "x", "stereotyping_feedback": "x", "stereotyping_score": {score}, '
+        f'"stereotyping_example": "x", "representation_feedback": "x", "representation_score": {score}, '
+        f'"representation_example": "x", "language_feedback": "x", "language_score": {score}, '
+        f'"language_example": "x", "framing_feedback": "x", "framing_score": {score}, "framing_example": "x", '
+        f'"positive_aspects": "x", "improvement_suggestions": "x", "male_to_female_mention_ratio": 0, '
+        f'"gender_neutral_language_percentage": 0}}'
+    )
+
+
+class TestAuditJob(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FixtureSiteHandler, directory=SITE_DIRECTORY))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.directory = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.directory.name, 'audit.json')
+
+        # every fixture page states the score the fake LLM should give it
+        self.gemini_client = Mock()
+        self.gemini_client.get_chat_response_async = self._reply
+        self.prompts = []
+        self.block_after = None
+        self.rate_limiter = RateLimiter(100)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    async def _reply(self, chat, prompt: str) -> str:
+        if self.block_after is not None and len(self.prompts) >= self.block_after:
+            await asyncio.Event().wait()
+        self.prompts.append(prompt)
+        return fake_reply(int(re.search(r'score (\d+)', prompt).group(1)))
+
+    def create_service(self, web_parser: AsyncWebParser) -> AnalysisService:
+        bias_analyzer = BiasAnalyzer(self.gemini_client)
+        return AnalysisService(
+            web_parser,
+            bias_analyzer,
+            self.rate_limiter,
+            NoopNotifier(),
+            MemoryCacheBackend(100, 60),
+            ContentCache(MemoryCacheBackend(100, 60), 'model', bias_analyzer.prompt_fingerprint)
+        )
+
+    def create_job(self, web_parser: AsyncWebParser) -> AuditJob:
+        return AuditJob(
+            self.base + '/',
+            web_parser,
+            self.create_service(web_parser),
+            'ip:10.0.0.1',
+            state_path=self.state_path,
+            concurrency=1,
+            analyze_concurrency=1,
+            delay=0
+        )
+
+    async def test_crawl_and_report(self):
+        web_parser = AsyncWebParser(1048576, 8192)
+        job = self.create_job(web_parser)
+
+        report = await job.run()
+        await web_parser.aclose()
+
+        analyzed = {uri.removeprefix(self.base) for uri in job.results}
+        self.assertEqual(
+            {'/', '/about.html', '/careers.html', '/blog/index.html', '/blog/post.html', '/blog/orphan.html'},
+            analyzed
+        )
+        # 404, robots.txt, other hosts, non-HTML and duplicate links are not analyzed
+        self.assertEqual([self.base + '/missing.html'], list(job.failed))
+        self.assertEqual(len(analyzed), len(self.prompts))
+        # same content under another URI is recorded as duplicate
+        self.assertEqual({self.base + '/index.html': self.base + '/'}, job.duplicates)
+
+        self.assertEqual('done', job.status)
+        self.assertEqual(6, report.pages_analyzed)
+        self.assertEqual(1, report.pages_failed)
+        self.assertEqual(self.base + '/careers.html', report.worst_pages[0].uri)
+        self.assertEqual(30, report.min_score)
+        self.assertEqual(90, report.max_score)
+        self.assertAlmostEqual(380 / 6, report.category_averages.stereotyping_score)
+        self.assertEqual(63, report.site_score)
+        self.assertEqual(1, report.score_distribution['21-30'])
+        self.assertEqual(6, sum(report.score_distribution.values()))
+
+    async def test_resume(self):
+        web_parser = AsyncWebParser(1048576, 8192)
+
+        # the first run hangs in the LLM call for the third page and is interrupted
+        self.block_after = 2
+        first = asyncio.create_task(self.create_job(web_parser).run())
+        while len(self.prompts) < 2 or not os.path.exists(self.state_path):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        first.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+
+        self.block_after = None
+        job = self.create_job(web_parser)
+        report = await job.run()
+        await web_parser.aclose()
+
+        # finished pages are not analyzed again
+        self.assertEqual(6, report.pages_analyzed)
+        self.assertEqual(6, len(self.prompts))
+
+    async def test_pages_count_against_the_rate_limit(self):
+        self.rate_limiter = RateLimiter(3)
+        web_parser = AsyncWebParser(1048576, 8192)
+
+        report = await self.create_job(web_parser).run()
+        await web_parser.aclose()
+
+        self.assertEqual(3, report.pages_analyzed)
+        self.assertEqual(3, len(self.prompts))
+        self.assertEqual(0, self.rate_limiter.state('ip:10.0.0.1').remaining)
+
+    async def test_force_starts_over(self):
+        web_parser = AsyncWebParser(1048576, 8192)
+        jobs = AuditJobs(self.directory.name, concurrency=1, analyze_concurrency=1, delay=0)
+        # the content cache is shared like in the app, so only the LLM calls of the first audit are counted
+        service = self.create_service(web_parser)
+
+        async def audit(**options):
+            job_id = jobs.start(self.base + '/', web_parser, service, 'ip:10.0.0.1', **options)
+            await jobs.tasks[job_id]
+            return jobs.get(job_id)
+
+        first = await audit()
+        # a finished audit is resumed from its state and analyzes nothing
+        resumed = await audit()
+        forced = await audit(force=True)
+        await web_parser.aclose()
+
+        self.assertEqual(6, len(first.results))
+        self.assertEqual(first.results, resumed.results)
+        self.assertEqual(6, len(forced.results))
+        # the forced audit analyzed every page again, served by the content cache
+        self.assertEqual(6, service.content_cache.hits)
+        self.assertEqual(6, len(self.prompts))
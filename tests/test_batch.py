@@ -0,0 +1,109 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.server import ThreadingHTTPServer
+from unittest.mock import Mock
+
+from biasight.batch import BatchAnalysis, read_uris
+from biasight.bias import BiasAnalyzer
+from biasight.parse import AsyncWebParser
+from tests.test_audit import SITE_DIRECTORY, FixtureSiteHandler, fake_reply
+
+PAGES = ['/', '/about.html', '/careers.html', '/blog/post.html', '/missing.html']
+
+
+class TestBatchAnalysis(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FixtureSiteHandler, directory=SITE_DIRECTORY))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.directory.name, 'results.jsonl')
+
+        self.prompts = []
+        self.gemini_client = Mock()
+        self.gemini_client.get_chat_response_async = self._reply
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    async def _reply(self, chat, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return fake_reply(int(re.search(r'score (\d+)', prompt).group(1)))
+
+    async def run_batch(self, uris: list[str], **options) -> BatchAnalysis:
+        web_parser = AsyncWebParser(1048576, 8192)
+        batch = BatchAnalysis(web_parser, BiasAnalyzer(self.gemini_client), self.output_path, **options)
+        await batch.run(uris)
+        await web_parser.aclose()
+        return batch
+
+    def read_output(self) -> dict[str, dict]:
+        with open(self.output_path) as f:
+            return {json.loads(line)['uri'].removeprefix(self.base): json.loads(line) for line in f}
+
+    async def test_run(self):
+        batch = await self.run_batch([self.base + page for page in PAGES + ['/about.html']])
+
+        records = self.read_output()
+        self.assertEqual(set(PAGES), set(records))
+        self.assertEqual(30, records['/careers.html']['result']['stereotyping_score'])
+        self.assertEqual({'uri': self.base + '/missing.html', 'error': 'Could not fetch page', 'stage': 'fetch'},
+                         records['/missing.html'])
+        # the duplicate URI is analyzed once
+        self.assertEqual(4, len(self.prompts))
+        self.assertEqual(1, batch.skipped)
+        self.assertEqual((4, 1), (batch.stats['fetch'].done, batch.stats['fetch'].failed))
+        self.assertEqual(4, batch.stats['analyze'].done)
+        self.assertIn('4 URIs analyzed', batch.summary(1.0))
+
+    async def test_extraction_in_processes(self):
+        with ProcessPoolExecutor(1) as executor:
+            await self.run_batch([self.base + page for page in PAGES], executor=executor, extract_concurrency=2)
+
+        records = self.read_output()
+        self.assertEqual(80, records['/']['result']['stereotyping_score'])
+        self.assertEqual(4, len(self.prompts))
+
+    async def test_resume(self):
+        # the first run was killed while writing the second line
+        with open(self.output_path, 'w') as f:
+            f.write(json.dumps({'uri': self.base + '/', 'result': {}}) + '\n')
+            f.write(json.dumps({'uri': self.base + '/missing.html', 'error': 'x', 'stage': 'fetch'}) + '\n')
+            f.write('{"uri": "' + self.base + '/about.html", "res')
+
+        batch = await self.run_batch([self.base + page for page in PAGES])
+
+        records = self.read_output()
+        self.assertEqual(set(PAGES), set(records))
+        self.assertEqual({}, records['/']['result'])
+        self.assertEqual(3, len(self.prompts))
+        self.assertEqual(2, batch.skipped)
+
+        # failed URIs are only tried again when asked for
+        batch = await self.run_batch([self.base + page for page in PAGES], retry_failed=True)
+        self.assertEqual(4, batch.skipped)
+        self.assertEqual(1, batch.stats['fetch'].failed)
+
+
+class TestReadUris(unittest.TestCase):
+
+    def test_jsonl_and_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl_path = os.path.join(directory, 'uris.jsonl')
+            with open(jsonl_path, 'w') as f:
+                f.write('{"uri": "https://example.com/a", "title": "A"}\n\n"https://example.com/b"\n{"title": "C"}\n')
+            csv_path = os.path.join(directory, 'uris.csv')
+            with open(csv_path, 'w') as f:
+                f.write('title,link\nA,https://example.com/a\nB,\n"C, D",https://example.com/c\n')
+
+            self.assertEqual(['https://example.com/a', 'https://example.com/b'], list(read_uris(jsonl_path)))
+            self.assertEqual(['https://example.com/a', 'https://example.com/c'], list(read_uris(csv_path, 'link')))
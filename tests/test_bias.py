@@ -1,8 +1,11 @@
 import unittest
 from unittest.mock import Mock
 
+from pydantic_core import from_json
+
 from biasight.bias import BiasAnalyzer
 from biasight.gemini import GeminiClient
+from biasight.lexicon import GenderLexicon
 from biasight.model import AnalyzeResult
 
 
@@ -39,6 +42,19 @@ class TestBiasAnalyzer(unittest.TestCase):
 
         self.assertEqual(96, analyze_result.overall_score)
 
+    def test_instructions_are_sent_separately(self):
+        gemini_client: GeminiClient = Mock()
+        bias_analyzer: BiasAnalyzer = BiasAnalyzer(gemini_client)
+        gemini_client.get_chat_response.return_value = self._get_gemini_reply(50, 50, 50, 50, 1, 50)
+
+        bias_analyzer.analyze('Page text')
+
+        gemini_client.start_chat.assert_called_once_with(bias_analyzer.instructions)
+        prompt = gemini_client.get_chat_response.call_args.args[1]
+        self.assertEqual('Webpage content to analyze:\n\nPage text', prompt)
+        self.assertNotIn('Webpage content to analyze', bias_analyzer.instructions)
+        self.assertIn('JSON format', bias_analyzer.instructions)
+
     def test_lowest_score(self):
         gemini_client: GeminiClient = Mock()
         bias_analyzer: BiasAnalyzer = BiasAnalyzer(gemini_client)
@@ -124,6 +140,82 @@ class TestBiasAnalyzer(unittest.TestCase):
         analyze_result: AnalyzeResult = bias_analyzer.analyze('https://example.com/')
         self.assertEqual(11, analyze_result.overall_score)
 
+    def test_lexicon_check_and_replace(self):
+        gemini_client: GeminiClient = Mock()
+        gemini_client.get_chat_response.return_value = self._get_gemini_reply(10, 10, 10, 10, 3, 0)
+        text = 'She and he met their chairman.'
+
+        # the estimates of the LLM are kept, the local counts are added next to them
+        analyze_result: AnalyzeResult = BiasAnalyzer(gemini_client, lexicon=GenderLexicon()).analyze(text)
+        self.assertEqual(3, analyze_result.male_to_female_mention_ratio)
+        self.assertEqual(1, analyze_result.language_metrics.male_to_female_mention_ratio)
+        self.assertEqual(10, analyze_result.overall_score)
+
+        # the local counts replace the estimates and give the ratio boost
+        bias_analyzer: BiasAnalyzer = BiasAnalyzer(gemini_client, lexicon=GenderLexicon(), lexicon_mode='replace')
+        analyze_result = bias_analyzer.analyze(text)
+        self.assertEqual(1, analyze_result.male_to_female_mention_ratio)
+        self.assertEqual(25, analyze_result.gender_neutral_language_percentage)
+        self.assertEqual(13, analyze_result.overall_score)
+        self.assertNotEqual(BiasAnalyzer(gemini_client).prompt_fingerprint, bias_analyzer.prompt_fingerprint)
+
+    def test_split_text(self):
+        bias_analyzer: BiasAnalyzer = BiasAnalyzer(Mock(), chunk_tokens=10)
+
+        # short texts are not split
+        self.assertEqual(['Short text.'], bias_analyzer._split_text('Short text.'))
+
+        # sentences are kept together as long as they fit into 40 characters
+        text = 'First sentence is here. Second one. ' + 'x' * 50 + ' Last one.'
+        chunks = bias_analyzer._split_text(text)
+        self.assertEqual(['First sentence is here. Second one.', 'x' * 40, 'x' * 10, 'Last one.'], chunks)
+        self.assertTrue(all(len(chunk) <= 40 for chunk in chunks))
+
+    def test_chunked_analysis(self):
+        gemini_client: GeminiClient = Mock()
+        bias_analyzer: BiasAnalyzer = BiasAnalyzer(gemini_client, chunk_tokens=10)
+
+        # two parts of equal length with different scores
+        gemini_client.get_chat_response.side_effect = [
+            self._get_gemini_reply(20, 20, 20, 20, 1, 0),
+            self._get_gemini_reply(40, 40, 40, 40, 1, 100)
+        ]
+
+        analyze_result: AnalyzeResult = bias_analyzer.analyze('a' * 40 + ' ' + 'b' * 40)
+
+        self.assertEqual(2, gemini_client.get_chat_response.call_count)
+        self.assertEqual(30, analyze_result.stereotyping_score)
+        self.assertEqual(1, analyze_result.male_to_female_mention_ratio)
+        self.assertEqual(50, analyze_result.gender_neutral_language_percentage)
+        # 30 * (1 + 30% ratio boost + 5% neutral language boost)
+        self.assertEqual(40, analyze_result.overall_score)
+
+    def test_merge_ratios(self):
+        results = [
+            AnalyzeResult.model_validate(from_json(self._get_gemini_reply(50, 50, 50, 50, ratio, 0)))
+            for ratio in [3, 1 / 3]
+        ]
+
+        # equal amounts of text with the inverse ratios balance out
+        merged = BiasAnalyzer._merge_results(results, [100, 100])
+        self.assertAlmostEqual(1.0, merged.male_to_female_mention_ratio)
+
+    def test_merge_ratios_without_mentions(self):
+        results = [
+            AnalyzeResult.model_validate(from_json(self._get_gemini_reply(50, 50, 50, 50, ratio, 0)))
+            for ratio in [0, 1, 0]
+        ]
+
+        # parts without gendered mentions do not count as female
+        merged = BiasAnalyzer._merge_results(results, [100, 100, 100])
+        self.assertAlmostEqual(1.0, merged.male_to_female_mention_ratio)
+        # 50 * (1 + 30% ratio boost)
+        self.assertEqual(65, merged.overall_score)
+
+        merged = BiasAnalyzer._merge_results([results[0], results[2]], [100, 100])
+        self.assertEqual(0, merged.male_to_female_mention_ratio)
+        self.assertEqual(50, merged.overall_score)
+
     @staticmethod
     def _get_gemini_reply(
             stereotyping_score: int,
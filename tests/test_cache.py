@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+import zlib
+
+from biasight.cache import CompressedCacheBackend, ContentCache, MemoryCacheBackend, SQLiteCacheBackend
+from biasight.model import AnalyzeResult
+
+RESULT = AnalyzeResult(
+    summary='x',
+    stereotyping_feedback='x',
+    stereotyping_score=10,
+    stereotyping_example='x',
+    representation_feedback='x',
+    representation_score=10,
+    representation_example='x',
+    language_feedback='x',
+    language_score=10,
+    language_example='x',
+    framing_feedback='x',
+    framing_score=10,
+    framing_example='x',
+    positive_aspects='x',
+    improvement_suggestions='x',
+    male_to_female_mention_ratio=1,
+    gender_neutral_language_percentage=50
+)
+
+
+class TestContentCache(unittest.TestCase):
+
+    def test_hit_statistics(self):
+        cache = ContentCache(MemoryCacheBackend(10, 60), 'model', 'prompt', input_token_cost=1.0, output_token_cost=2.0)
+        self.assertIsNone(cache.get('text'))
+
+        cache.put('text', RESULT, llm_seconds=2.5, input_tokens=1000, output_tokens=500)
+        self.assertEqual(RESULT, cache.get('text'))
+        self.assertEqual(RESULT, cache.get('text'))
+
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertAlmostEqual(2 / 3, cache.hit_rate)
+        self.assertEqual(5.0, cache.saved_llm_seconds)
+        self.assertAlmostEqual(0.004, cache.saved_cost)
+
+    def test_model_and_prompt_are_part_of_the_key(self):
+        backend = MemoryCacheBackend(10, 60)
+        cache = ContentCache(backend, 'model', 'prompt')
+
+        self.assertEqual(cache.key('text'), ContentCache(backend, 'model', 'prompt').key('text'))
+        self.assertNotEqual(cache.key('text'), ContentCache(backend, 'other-model', 'prompt').key('text'))
+        self.assertNotEqual(cache.key('text'), ContentCache(backend, 'model', 'other-prompt').key('text'))
+        self.assertNotEqual(cache.key('text'), cache.key('other text'))
+
+
+class TestCompressedCacheBackend(unittest.TestCase):
+
+    def test_compresses_values(self):
+        backend = MemoryCacheBackend(10, 60)
+        compressed = CompressedCacheBackend(backend, 6)
+        value = RESULT.model_dump_json().encode()
+
+        compressed.set('key', value)
+
+        self.assertEqual(value, compressed.get('key'))
+        self.assertLess(len(backend.get('key')), len(value))
+        self.assertIsNone(compressed.get('missing'))
+        self.assertEqual(1, len(compressed))
+
+    def test_reads_values_written_with_another_level(self):
+        backend = MemoryCacheBackend(10, 60)
+        value = RESULT.model_dump_json().encode()
+        backend.set('plain', value)
+        backend.set('compressed', zlib.compress(value))
+
+        # level 0 stores values as they are, but still reads the compressed ones
+        uncompressed = CompressedCacheBackend(backend, 0)
+        uncompressed.set('new', value)
+
+        self.assertEqual(value, backend.get('new'))
+        for key in ['plain', 'compressed', 'new']:
+            self.assertEqual(value, uncompressed.get(key))
+            self.assertEqual(value, CompressedCacheBackend(backend, 9).get(key))
+
+
+class TestSQLiteCacheBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_survives_reopen(self):
+        backend = SQLiteCacheBackend(self.path, 'results', 10, 1024, 60)
+        backend.set('key', b'value')
+        backend.close()
+
+        # a second instance stands in for another worker or a restarted process
+        other = SQLiteCacheBackend(self.path, 'results', 10, 1024, 60)
+        self.assertEqual(b'value', other.get('key'))
+        self.assertEqual(1, len(other))
+
+        other.set('key', b'new value')
+        other.delete('missing')
+        self.assertEqual(b'new value', other.get('key'))
+        self.assertEqual(1, len(other))
+        other.close()
+
+    def test_ttl(self):
+        backend = SQLiteCacheBackend(self.path, 'results', 10, 1024, 0)
+        backend.set('key', b'value')
+        time.sleep(0.01)
+
+        self.assertIsNone(backend.get('key'))
+        self.assertEqual(0, len(backend))
+
+    def test_evicts_least_recently_used_entries(self):
+        backend = SQLiteCacheBackend(self.path, 'results', 3, 1024, 60)
+        backend.touch_interval = 0
+
+        for key in ['a', 'b', 'c']:
+            backend.set(key, b'value')
+            time.sleep(0.01)
+        backend.get('a')
+        backend.set('d', b'value')
+
+        self.assertEqual(3, len(backend))
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(b'value', backend.get('a'))
+        self.assertEqual(1, backend.evictions)
+
+    def test_evicts_by_size(self):
+        backend = SQLiteCacheBackend(self.path, 'results', 100, 100, 60)
+
+        for key in range(10):
+            backend.set(str(key), b'x' * 30)
+            time.sleep(0.001)
+
+        self.assertLessEqual(len(backend), 3)
+        self.assertEqual(b'x' * 30, backend.get('9'))
+
+    def test_locked_database_is_skipped(self):
+        backend = SQLiteCacheBackend(self.path, 'results', 10, 1024, 60, busy_timeout=0.01)
+        backend.set('key', b'value')
+
+        # another worker holds the write lock, reads go on, the write is dropped instead of waiting
+        other = sqlite3.connect(self.path, isolation_level=None)
+        other.execute('BEGIN IMMEDIATE')
+        start = time.perf_counter()
+        backend.set('new', b'value')
+        backend.delete('key')
+        self.assertEqual(b'value', backend.get('key'))
+        self.assertLess(time.perf_counter() - start, 1)
+        other.execute('COMMIT')
+        other.close()
+
+        self.assertEqual(2, backend.busy)
+        self.assertIsNone(backend.get('new'))
+        backend.set('new', b'value')
+        self.assertEqual(b'value', backend.get('new'))
+        backend.close()
+
+    def test_size_limit_is_shared_by_the_file(self):
+        results = SQLiteCacheBackend(self.path, 'results', 100, 100, 60)
+        contents = SQLiteCacheBackend(self.path, 'contents', 100, 100, 60)
+
+        for key in range(3):
+            results.set(str(key), b'x' * 30)
+            time.sleep(0.001)
+        contents.set('key', b'x' * 30)
+
+        # the least recently used entry of the file goes, whichever cache holds it
+        self.assertEqual((2, 1), (len(results), len(contents)))
+        self.assertIsNone(results.get('0'))
+        self.assertEqual(b'x' * 30, contents.get('key'))
+        self.assertEqual(1, contents.evictions)
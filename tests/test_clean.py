@@ -0,0 +1,72 @@
+import unittest
+
+from biasight.clean import ContentCleaner
+from biasight.extract import Block, TextExtractor
+from biasight.parse import ParsedPage
+
+ARTICLE = (
+    'The engineering team hired four new developers this quarter, and the hiring panel was balanced. '
+    'Every candidate was asked the same questions about their experience with distributed systems.'
+)
+
+
+def parsed(html_content: str) -> ParsedPage:
+    extractor = TextExtractor()
+    extractor.feed(html_content)
+    extractor.close()
+    return ParsedPage('https://example.com/', extractor.text, extractor.links, extractor.blocks)
+
+
+class TestContentCleaner(unittest.TestCase):
+
+    def setUp(self):
+        self.cleaner = ContentCleaner()
+
+    def test_keeps_main_content(self):
+        page = parsed(
+            '<div class="cookie-banner"><p>We use cookies to improve your experience on this website, by continuing '
+            'to browse you agree to our use of cookies.</p><button>Accept</button></div>'
+            '<ul class="nav-list"><li><a href="/">Home</a></li><li><a href="/jobs">Jobs</a></li></ul>'
+            f'<main><h1>Hiring update</h1><p>{ARTICLE}</p><ul><li>Two backend roles</li><li>Two frontend roles</li>'
+            '</ul></main>'
+            '<aside class="related-articles"><p>Ten more stories about hiring that you might enjoy reading next '
+            'week.</p></aside>'
+            '<p><a href="https://social.example.com/">Follow us</a></p>'
+        )
+
+        cleaned = self.cleaner.clean(page)
+
+        self.assertEqual(f'Hiring update\n{ARTICLE}\nTwo backend roles\nTwo frontend roles', cleaned.text)
+        self.assertEqual(len(page.text) - len(cleaned.text), cleaned.saved_characters)
+        self.assertGreater(cleaned.saved_tokens, 0)
+        self.assertEqual(1, self.cleaner.requests)
+        self.assertEqual(cleaned.saved_characters, self.cleaner.saved_characters)
+
+    def test_removes_duplicate_blocks(self):
+        cards = ''.join(
+            f'<div class="card"><p>Posted {i} days ago by the editorial team of the example engineering blog, '
+            f'read the full story</p></div>'
+            for i in range(5)
+        )
+        page = parsed(f'<p>{ARTICLE}</p><p>{ARTICLE.upper()}</p>{cards}')
+
+        lines = self.cleaner.clean(page).text.split('\n')
+
+        self.assertEqual(ARTICLE, lines[0])
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[1].startswith('Posted 0 days ago'))
+
+    def test_normalizes_whitespace(self):
+        page = ParsedPage('https://example.com/', 'x', blocks=[Block(f'  {ARTICLE.replace(" ", "  \n ")}  ')])
+
+        self.assertEqual(ARTICLE, self.cleaner.clean(page).text)
+
+    def test_falls_back_to_the_whole_text(self):
+        # without blocks the text is one block, when everything is filtered the normalized text is kept
+        cleaned = self.cleaner.clean(ParsedPage('https://example.com/', 'Some  page text'))
+        self.assertEqual('Some page text', cleaned.text)
+
+        page = parsed('<div class="menu"><p>Only a menu here</p></div>')
+        self.assertEqual('Only a menu here', self.cleaner.clean(page).text)
+        # only the doubled space was saved
+        self.assertEqual(1, self.cleaner.saved_characters)
@@ -0,0 +1,100 @@
+import unittest
+
+from biasight.extract import Block, TextExtractor, extract_text
+from biasight.parse import WebParser
+
+# each case is checked against the BeautifulSoup based WebParser._text_from_html
+PARITY_CASES = [
+    '<!DOCTYPE html><html><head><title>T</title><style>p {}</style></head><body>Body</body></html>',
+    'root text<div>inside</div>tail',
+    '<p>a</p><p>b',
+    '<nav><a>nested link</a> nav text</nav>',
+    '<header><h1>heading</h1>header text</header><footer>footer</footer>',
+    '<svg><text>svg text</text><path>path</path></svg>',
+    '<noscript><p>no script</p>no script text</noscript>',
+    '<script>if (a < b) { x = "<p>" }</script><p>after script</p>',
+    '<div hidden>bare</div><div hidden="hidden">hidden</div><div hidden="">empty</div>',
+    '<div aria-hidden="true">hidden<span>child</span></div><div aria-hidden="false">shown</div>',
+    '<div aria-hidden=true>unquoted</div><DIV HIDDEN="x">upper</DIV><P>Upper</P>',
+    '<p>a<!-- comment -->b</p>',
+    '<p>&amp; &lt;x&gt; &nbsp; caf&eacute; &#169; &copy &AMP; &foo; a&b;c</p>',
+    '<p>&#65;&#x42;&#150;&#129;&#9731;</p>',
+    '<p>&#xD800;&#56319;&#xDFFF;&#0;&#x110000;&#99999999999;&#xD7FF;&#xE000;&#x10FFFF;</p>',
+    '<p>a<br>b<img src="x">c<br/>d</p><div/>after',
+    '<div><p>x</div>y</p>z',
+    '<div><span>a</span></span>b</div>',
+    '<p>unclosed <b>bold <i>italic</p> more',
+    '<ul><li>one<li>two</ul><table><tr><td>c1<td>c2</table>',
+    '<p><![CDATA[cdata text]]></p><p><?php echo 1 ?>after</p>',
+    '<textarea><p>x</p></textarea>',
+    '<p>   spaced   \n\n text   </p>',
+    '<p>x</p></body></html>trailing',
+]
+
+
+def page(paragraphs: int) -> str:
+    blocks = []
+    for i in range(paragraphs):
+        blocks.append(
+            f'<div class="card" data-i="{i}"><h2>Title {i}</h2><p>She said &quot;hi&quot; to the '
+            f'<a href="/p/{i}">chairman</a> &amp; his team.</p><span aria-hidden="true">icon</span>'
+            f'<script>var x = {i} < 2;</script><!-- c {i} --></div>'
+        )
+    return (
+        '<html><head><title>Page</title><meta charset="utf-8"></head><body><nav><ul><li><a>Home</a></li></ul></nav>'
+        + ''.join(blocks) + '<footer>Imprint</footer></body></html>'
+    )
+
+
+class TestTextExtractor(unittest.TestCase):
+
+    def assert_parity(self, html_content: str):
+        expected = WebParser._text_from_html(html_content)
+        self.assertEqual(expected, extract_text(html_content), html_content)
+
+    def test_parity(self):
+        for html_content in PARITY_CASES:
+            self.assert_parity(html_content)
+
+    def test_parity_for_generated_page(self):
+        self.assert_parity(page(500))
+
+    def test_parity_for_any_chunking(self):
+        for html_content in PARITY_CASES + [page(20)]:
+            expected = WebParser._text_from_html(html_content)
+            for size in [1, 2, 3, 7, 64]:
+                extractor = TextExtractor()
+                for i in range(0, len(html_content), size):
+                    extractor.feed(html_content[i:i + size])
+                extractor.close()
+                self.assertEqual(expected, extractor.text, (html_content, size))
+
+    def test_text_budget(self):
+        html_content = page(500)
+        full_text = extract_text(html_content)
+
+        extractor = TextExtractor(1000)
+        extractor.feed(html_content)
+
+        self.assertTrue(extractor.done)
+        extractor.close()
+        self.assertEqual(full_text[:1000], extractor.text)
+
+    def test_blocks(self):
+        extractor = TextExtractor()
+        extractor.feed(
+            '<body class="has-sidebar"><div id="menu"><a href="/">Home</a> <a href="/about">About</a></div>'
+            '<article class="post"><h1>Title</h1><p>Some <b>bold</b> text and <a href="/x">a link</a>.</p></article>'
+        )
+        extractor.close()
+
+        self.assertEqual(
+            [
+                Block('Home About', 9, 'menu'),
+                Block('Title', 0, 'post'),
+                Block('Some bold text and a link .', 6, 'post')
+            ],
+            extractor.blocks
+        )
+        # blocks hold the same text
+        self.assertEqual(extractor.text, ' '.join(block.text for block in extractor.blocks))
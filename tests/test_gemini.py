@@ -0,0 +1,88 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+from biasight.gemini import ContextCacheBackend, InstructionCache
+
+
+class FakeContextCacheBackend(ContextCacheBackend):
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.uploaded: list[str] = []
+        self.uncached_models = 0
+
+    def upload(self, system_instruction: str, ttl: int):
+        if self.fail:
+            raise RuntimeError('cached content is too small')
+        self.uploaded.append(system_instruction)
+        return Mock(name=f'cached-{len(self.uploaded)}')
+
+    def uncached(self, system_instruction: str):
+        self.uncached_models += 1
+        return Mock(name='uncached')
+
+
+class TestInstructionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('biasight.gemini.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_instruction_is_uploaded_once(self):
+        backend = FakeContextCacheBackend()
+        cache = InstructionCache(backend, ttl=3600)
+
+        with ThreadPoolExecutor(8) as executor:
+            models = list(executor.map(lambda _: cache.model('instructions'), range(50)))
+
+        self.assertEqual(['instructions'], backend.uploaded)
+        self.assertTrue(all(model is models[0] for model in models))
+        self.assertEqual(0, backend.uncached_models)
+
+    def test_refresh_before_expiry(self):
+        backend = FakeContextCacheBackend()
+        cache = InstructionCache(backend, ttl=3600, refresh_margin=60)
+        first = cache.model('instructions')
+
+        self.now += 3500
+        self.assertIs(first, cache.model('instructions'))
+        self.now += 100
+        self.assertIsNot(first, cache.model('instructions'))
+        self.assertEqual(2, cache.uploads)
+
+    def test_changed_instruction_is_uploaded(self):
+        backend = FakeContextCacheBackend()
+        cache = InstructionCache(backend, ttl=3600)
+
+        cache.model('instructions v1')
+        cache.model('instructions v2')
+        cache.model('instructions v2')
+
+        self.assertEqual(['instructions v1', 'instructions v2'], backend.uploaded)
+
+    def test_fallback_when_caching_is_unavailable(self):
+        backend = FakeContextCacheBackend(fail=True)
+        cache = InstructionCache(backend, ttl=3600, retry_interval=600)
+
+        first = cache.model('instructions')
+        self.assertIs(first, cache.model('instructions'))
+        self.assertEqual(1, cache.failures)
+        self.assertEqual(1, backend.uncached_models)
+
+        # caching is tried again after the retry interval
+        backend.fail = False
+        self.now += 600
+        self.assertIsNot(first, cache.model('instructions'))
+        self.assertEqual(['instructions'], backend.uploaded)
+
+    def test_disabled(self):
+        backend = FakeContextCacheBackend()
+        cache = InstructionCache(backend, ttl=0)
+
+        cache.model('instructions')
+
+        self.assertEqual([], backend.uploaded)
+        self.assertEqual(1, backend.uncached_models)
@@ -0,0 +1,45 @@
+import unittest
+
+from biasight.lexicon import GenderLexicon
+
+
+class TestGenderLexicon(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = GenderLexicon()
+
+    def test_counts(self):
+        metrics = self.lexicon.analyze(
+            'The Chairman thanked his team. She met two policemen and a police\nofficer; they talked about '
+            'man-made risks. Her manager, Mr. Smith, asked everyone about the mandate of the chairman.'
+        )
+
+        self.assertEqual((2, 2), (metrics.male_mentions, metrics.female_mentions))
+        self.assertEqual(3, metrics.neutral_terms)
+        self.assertEqual(4, metrics.gendered_term_count)
+        self.assertEqual(
+            [('chairman', 2, 'chair'), ('policemen', 1, 'police officers'), ('man-made', 1, 'synthetic')],
+            [(term.term, term.count, term.alternative) for term in metrics.gendered_terms]
+        )
+        self.assertEqual(1.0, metrics.male_to_female_mention_ratio)
+        self.assertAlmostEqual(300 / 11, metrics.gender_neutral_language_percentage)
+        self.assertEqual(30, metrics.words)
+
+    def test_words_are_matched_whole(self):
+        metrics = self.lexicon.analyze('Manhattan hemisphere theorem shelter mankindness')
+
+        self.assertEqual(0, metrics.male_mentions + metrics.female_mentions + metrics.gendered_term_count)
+
+    def test_without_mentions(self):
+        metrics = self.lexicon.analyze('Buy now, free shipping.')
+
+        self.assertEqual(0.0, metrics.male_to_female_mention_ratio)
+        self.assertEqual(100.0, metrics.gender_neutral_language_percentage)
+        self.assertEqual(3.0, self.lexicon.analyze('He, his and him.').male_to_female_mention_ratio)
+
+    def test_custom_terms(self):
+        lexicon = GenderLexicon(frozenset(['er']), frozenset(['sie']), frozenset(), {'kaufmann': 'kaufleute'})
+
+        metrics = lexicon.analyze('Er und sie sind Kaufmann.')
+        self.assertEqual((1, 1, 1), (metrics.male_mentions, metrics.female_mentions, metrics.gendered_term_count))
+        self.assertNotEqual(self.lexicon.fingerprint, lexicon.fingerprint)
@@ -1,8 +1,22 @@
+import os
+import sqlite3
+import tempfile
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import HTTPException
+from starlette.requests import Request
 
-from biasight.limit import RateLimiter
+from biasight.limit import MemoryRateLimitStore, RateLimiter, SQLiteRateLimitStore, client_key
+
+
+def request(headers: dict[str, str] | None = None, host: str = '10.0.0.1') -> Request:
+    return Request({
+        'type': 'http',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        'client': (host, 1234)
+    })
 
 
 class TestRateLimiter(unittest.TestCase):
@@ -15,3 +29,118 @@ class TestRateLimiter(unittest.TestCase):
         with self.assertRaises(HTTPException):
             rate_limiter.increment()
             rate_limiter.increment()
+
+    def test_clients_have_separate_buckets(self):
+        rate_limiter = RateLimiter(1)
+        rate_limiter.increment('ip:10.0.0.1')
+        rate_limiter.increment('ip:10.0.0.2')
+
+        with self.assertRaises(HTTPException) as context:
+            rate_limiter.increment('ip:10.0.0.1')
+        self.assertEqual(429, context.exception.status_code)
+        self.assertEqual('86400', context.exception.headers['Retry-After'])
+        self.assertEqual(1, rate_limiter.rejected)
+
+        state = rate_limiter.state('ip:10.0.0.1')
+        self.assertEqual((1, 0), (state.usage, state.remaining))
+        state = rate_limiter.state('ip:10.0.0.3')
+        self.assertEqual((0, 1, 0, 0), (state.usage, state.remaining, state.retry_after, state.full_in))
+
+    def test_tokens_refill(self):
+        store = MemoryRateLimitStore()
+        self.assertEqual(1, store.acquire('client', 2, 0.5, now=100))
+        self.assertEqual(0, store.acquire('client', 2, 0.5, now=100))
+        self.assertIsNone(store.acquire('client', 2, 0.5, now=101))
+
+        self.assertEqual(0, store.acquire('client', 2, 0.5, now=102))
+        self.assertEqual(2, store.tokens('client', 2, 0.5, now=1000))
+
+    def test_full_buckets_are_pruned(self):
+        store = MemoryRateLimitStore()
+        store.prune_interval = 3
+        store.acquire('a', 2, 1, now=100)
+        store.acquire('b', 2, 1, now=101)
+        store.acquire('c', 2, 1, now=101)
+        self.assertEqual({'b', 'c'}, set(store.buckets))
+
+
+class TestSQLiteRateLimitStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'limits.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_tokens_refill(self):
+        store = SQLiteRateLimitStore(self.path)
+        self.assertEqual(1, store.acquire('client', 2, 0.5, now=100))
+        self.assertEqual(0, store.acquire('client', 2, 0.5, now=100))
+        self.assertIsNone(store.acquire('client', 2, 0.5, now=101))
+        self.assertEqual(0.5, store.tokens('client', 2, 0.5, now=101))
+
+        self.assertEqual(0, store.acquire('client', 2, 0.5, now=102))
+        self.assertEqual(2, store.tokens('client', 2, 0.5, now=1000))
+        store.close()
+
+    def test_concurrent_workers_do_not_exceed_capacity(self):
+        # every store has its own connection like a worker process, they wait for each other instead of letting
+        # requests through
+        stores = [SQLiteRateLimitStore(self.path, busy_timeout=10) for _ in range(4)]
+
+        def acquire(i: int) -> bool:
+            return stores[i % len(stores)].acquire('client', 50, 0, now=100) is not None
+
+        with ThreadPoolExecutor(8) as executor:
+            allowed = list(executor.map(acquire, range(200)))
+
+        self.assertEqual(50, sum(allowed))
+        for store in stores:
+            store.close()
+
+    def test_locked_store_lets_requests_through(self):
+        store = SQLiteRateLimitStore(self.path, busy_timeout=0.01)
+        self.assertEqual(0, store.acquire('client', 1, 0, now=100))
+
+        # another worker holds the write lock
+        other = sqlite3.connect(self.path, isolation_level=None)
+        other.execute('BEGIN IMMEDIATE')
+        start = time.perf_counter()
+        self.assertEqual(1, store.acquire('client', 1, 0, now=100))
+        self.assertLess(time.perf_counter() - start, 1)
+        other.execute('COMMIT')
+        other.close()
+
+        self.assertEqual(1, store.busy)
+        self.assertIsNone(store.acquire('client', 1, 0, now=100))
+        store.close()
+
+
+class TestClientKey(unittest.TestCase):
+
+    def test_client_key(self):
+        self.assertEqual('ip:10.0.0.1', client_key(request()))
+        # unknown keys must not give a fresh bucket
+        self.assertEqual('ip:10.0.0.1', client_key(request({'X-API-Key': 'unknown'}), frozenset({'secret'})))
+
+        key = client_key(request({'X-API-Key': 'secret'}), frozenset({'secret'}))
+        self.assertTrue(key.startswith('key:'))
+        self.assertNotIn('secret', key)
+        self.assertEqual(key, client_key(request({'X-API-Key': 'secret'}, host='10.0.0.2'), frozenset({'secret'})))
+
+    def test_forwarded_for(self):
+        forwarded = request({'X-Forwarded-For': '192.0.2.1, 10.0.0.5'})
+        self.assertEqual('ip:10.0.0.1', client_key(forwarded))
+        # the proxy in front of the app added the last entry
+        self.assertEqual('ip:10.0.0.5', client_key(forwarded, trust_forwarded=True))
+        self.assertEqual('ip:192.0.2.1', client_key(forwarded, trust_forwarded=True, trusted_proxies=2))
+        self.assertEqual('ip:192.0.2.1', client_key(forwarded, trust_forwarded=True, trusted_proxies=3))
+
+    def test_forwarded_for_sent_by_the_client(self):
+        # the client sends its own header, the proxy appends the real address
+        keys = {
+            client_key(request({'X-Forwarded-For': f'198.51.100.{i}, 203.0.113.7'}), trust_forwarded=True)
+            for i in range(10)
+        }
+        self.assertEqual({'ip:203.0.113.7'}, keys)
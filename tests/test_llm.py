@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from biasight.config import Settings
+from biasight.llm import (
+    FaultInjectingBackend, InjectedFailure, LazyBackend, RecordingBackend, ReplayBackend, create_llm_backend, prompt_key
+)
+
+RESPONSES = [(prompt_key('known prompt'), '{"a": 1}'), (None, '{"b": 2}'), (None, '{"c": 3}')]
+
+
+class TestReplayBackend(unittest.IsolatedAsyncioTestCase):
+
+    async def test_recorded_prompt_is_preferred(self):
+        backend = ReplayBackend(RESPONSES, latency=0, token_rate=0)
+
+        self.assertEqual('{"a": 1}', await backend.get_chat_response_async(None, 'known prompt'))
+        self.assertEqual(
+            ['{"b": 2}', '{"c": 3}', '{"a": 1}'],
+            [await backend.get_chat_response_async(None, 'other prompt') for _ in range(3)]
+        )
+
+    async def test_stream_timing(self):
+        response = json.dumps({'summary': 'x' * 400})
+        backend = ReplayBackend([(None, response)], latency=0.05, token_rate=2000, chunk_tokens=10)
+
+        start = time.perf_counter()
+        chunks = [chunk async for chunk in backend.stream_chat_response_async(None, 'prompt')]
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response, ''.join(chunks))
+        self.assertEqual(11, len(chunks))
+        # 50 ms to the first chunk and 103 tokens at 2000 tokens per second
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertLess(elapsed, 0.5)
+
+    def test_distributions_are_seeded(self):
+        def draws(seed: int) -> list[tuple]:
+            backend = ReplayBackend(
+                RESPONSES, latency=1.0, latency_sigma=0.5, token_rate=200, token_rate_sigma=0.2, seed=seed
+            )
+            return [backend._response('prompt')[1:] for _ in range(100)]
+
+        self.assertEqual(draws(1), draws(1))
+        latencies = sorted(latency for latency, _ in draws(1))
+        self.assertAlmostEqual(1.0, latencies[50], delta=0.2)
+        self.assertGreater(len(set(latencies)), 90)
+
+    async def test_record_and_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'responses.jsonl')
+            recorder = RecordingBackend(ReplayBackend(RESPONSES, latency=0, token_rate=0), path)
+            await recorder.get_chat_response_async(None, 'first prompt')
+            recorder.get_chat_response(None, 'second prompt')
+
+            replay = ReplayBackend.from_file(path, latency=0, token_rate=0)
+
+            self.assertEqual('{"b": 2}', await replay.get_chat_response_async(None, 'second prompt'))
+            self.assertEqual('{"a": 1}', replay.get_chat_response(None, 'first prompt'))
+
+
+class TestFaultInjectingBackend(unittest.IsolatedAsyncioTestCase):
+
+    async def test_fault_rates(self):
+        backend = FaultInjectingBackend(
+            ReplayBackend(RESPONSES, latency=0, token_rate=0), error_rate=0.2, malformed_rate=0.1, seed=7
+        )
+        outcomes = {'error': 0, 'malformed': 0, 'ok': 0}
+
+        for _ in range(1000):
+            try:
+                response = await backend.get_chat_response_async(None, 'prompt')
+                json.loads(response)
+                outcomes['ok'] += 1
+            except InjectedFailure:
+                outcomes['error'] += 1
+            except ValueError:
+                outcomes['malformed'] += 1
+
+        self.assertEqual(backend.errors, outcomes['error'])
+        self.assertEqual(backend.malformed, outcomes['malformed'])
+        self.assertAlmostEqual(200, outcomes['error'], delta=40)
+        self.assertAlmostEqual(100, outcomes['malformed'], delta=30)
+
+
+class TestLazyBackend(unittest.IsolatedAsyncioTestCase):
+
+    async def test_created_once_on_first_chat(self):
+        created = []
+
+        def create() -> ReplayBackend:
+            created.append(ReplayBackend(RESPONSES, latency=0, token_rate=0))
+            return created[-1]
+
+        backend = LazyBackend(create)
+        self.assertEqual([], created)
+
+        chat = backend.start_chat('instructions')
+        self.assertEqual('{"a": 1}', await backend.get_chat_response_async(chat, 'known prompt'))
+        self.assertEqual('{"b": 2}', backend.get_chat_response(chat, 'other prompt'))
+        self.assertEqual(1, len(created))
+
+
+class TestCreateLLMBackend(unittest.TestCase):
+
+    def test_gemini_is_created_lazily(self):
+        settings = Settings(
+            gcp_project_id='project',
+            gcp_location='location',
+            gcp_service_account_file='/nonexistent.json',
+            _env_file=None
+        )
+        backend = create_llm_backend(settings)
+
+        self.assertIsInstance(backend, LazyBackend)
+        self.assertIsNone(backend.backend)
+        # the credentials are only read with the first chat
+        with self.assertRaises(FileNotFoundError):
+            backend.start_chat()
+
+    def test_replay_with_failures(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'responses.jsonl')
+            with open(path, 'w') as f:
+                f.write(json.dumps({'prompt_key': None, 'response': '{}'}) + '\n')
+
+            settings = Settings(
+                gcp_project_id='project',
+                gcp_location='location',
+                gcp_service_account_file='/nonexistent.json',
+                llm_backend='replay',
+                llm_replay_path=path,
+                llm_failure_rate=0.1,
+                _env_file=None
+            )
+            backend = create_llm_backend(settings)
+
+        self.assertIsInstance(backend, FaultInjectingBackend)
+        self.assertIsInstance(backend.backend, ReplayBackend)
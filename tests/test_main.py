@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from biasight.config import Settings
+
+RECORDINGS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'recordings', 'responses.jsonl')
+ENV = {
+    'GCP_PROJECT_ID': 'project',
+    'GCP_LOCATION': 'location',
+    'GCP_SERVICE_ACCOUNT_FILE': '/nonexistent.json'
+}
+
+# importing the module creates the default app, which needs the required settings
+with mock.patch.dict(os.environ, ENV):
+    from biasight.main import create_app
+
+
+class TestCreateApp(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings = Settings(
+            gcp_project_id='project',
+            gcp_location='location',
+            gcp_service_account_file='/nonexistent.json',
+            cache_path=os.path.join(directory.name, 'cache.db'),
+            audit_path=os.path.join(directory.name, 'audits.db'),
+            _env_file=None
+        )
+
+    def test_components_are_created_on_first_use(self):
+        app = create_app(self.settings)
+        container = app.state.container
+
+        with TestClient(app) as client:
+            self.assertEqual(200, client.get('/limit').status_code)
+            self.assertTrue(container.created('rate_limiter'))
+            self.assertFalse(container.created('analysis_service'))
+
+            self.assertEqual(200, client.get('/stats').status_code)
+            # the Gemini client is only initialized with the first LLM call
+            self.assertIsNone(container.llm_backend.backend)
+
+    def test_warm_up(self):
+        self.settings.llm_backend = 'replay'
+        self.settings.llm_replay_path = RECORDINGS
+        self.settings.warm_up = True
+        app = create_app(self.settings)
+
+        with TestClient(app):
+            pass
+
+        self.assertTrue(app.state.container.created('analysis_service'))
+
+    def test_failed_warm_up_does_not_stop_the_app(self):
+        self.settings.llm_backend = 'replay'
+        self.settings.llm_replay_path = '/nonexistent.jsonl'
+        self.settings.warm_up = True
+        app = create_app(self.settings)
+
+        with TestClient(app) as client:
+            self.assertEqual(200, client.get('/limit').status_code)
+
+    def test_malformed_uri(self):
+        app = create_app(self.settings)
+
+        with TestClient(app) as client:
+            for uri in ['http://[::1', 'http://[::1]x/']:
+                self.assertEqual(400, client.post('/analyze', json={'uri': uri}).status_code)
+                self.assertEqual(400, client.post('/analyze', json={'uri': uri, 'mode': 'quick'}).status_code)
+                response = client.post('/analyze/stream', json={'uri': uri})
+                self.assertIn('event: error\ndata: {"status": 400', response.text)
+
+    def test_import_does_not_load_vertexai(self):
+        code = 'import json, sys, biasight.main; print(json.dumps(sorted(m for m in sys.modules if "vertexai" in m)))'
+        output = subprocess.run(
+            [sys.executable, '-c', code],
+            env=os.environ | ENV,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+
+        self.assertEqual([], json.loads(output.stdout.splitlines()[-1]))
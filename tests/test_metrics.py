@@ -0,0 +1,74 @@
+import unittest
+
+from prometheus_client import CollectorRegistry, generate_latest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from biasight import metrics
+
+
+def _sample(name: str, **labels) -> float:
+    return metrics.registry.get_sample_value(name, labels) or 0.0
+
+
+async def _analyze(request):
+    with metrics.timed('fetch'):
+        pass
+    metrics.observe('llm', 0.25)
+    metrics.observe('llm', 0.25)
+    return PlainTextResponse('ok')
+
+
+def _client(add_server_timing: bool) -> TestClient:
+    app = Starlette(routes=[Route('/analyze/{id}', _analyze)])
+    return TestClient(metrics.MetricsMiddleware(app, add_server_timing=add_server_timing))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_observe_without_request(self):
+        count = _sample('biasight_stage_seconds_count', stage='test')
+
+        with metrics.timed('test'):
+            pass
+
+        self.assertEqual(count + 1, _sample('biasight_stage_seconds_count', stage='test'))
+        self.assertIsNone(metrics.stage_timings.get())
+
+    def test_server_timing(self):
+        self.assertEqual(
+            'fetch;dur=12.0, llm;dur=500.0, total;dur=600.0',
+            metrics.server_timing({'fetch': 0.012, 'llm': 0.5}, 0.6)
+        )
+
+    def test_middleware_adds_server_timing(self):
+        response = _client(add_server_timing=True).get('/analyze/1')
+
+        stages = [entry.split(';')[0] for entry in response.headers['server-timing'].split(', ')]
+        self.assertEqual(['fetch', 'llm', 'total'], stages)
+        self.assertIn('llm;dur=500.0', response.headers['server-timing'])
+
+    def test_middleware_records_route_template(self):
+        count = _sample('biasight_request_seconds_count', method='GET', route='/analyze/{id}', status='200')
+
+        response = _client(add_server_timing=False).get('/analyze/2')
+
+        self.assertNotIn('server-timing', response.headers)
+        self.assertEqual(
+            count + 1,
+            _sample('biasight_request_seconds_count', method='GET', route='/analyze/{id}', status='200')
+        )
+
+    def test_stats_collector(self):
+        registry = CollectorRegistry()
+        registry.register(metrics.StatsCollector(lambda: [
+            metrics.gauge('test_entries', 'Entries', 3),
+            metrics.counter('test_requests', 'Requests', {'allowed': 5, 'rejected': 1}, 'result')
+        ]))
+
+        output = generate_latest(registry).decode()
+        self.assertIn('test_entries 3.0', output)
+        self.assertIn('test_requests_total{result="allowed"} 5.0', output)
+        self.assertIn('test_requests_total{result="rejected"} 1.0', output)
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, Mock
+from urllib.parse import parse_qs
+
+from biasight.bias import BiasAnalyzer
+from biasight.cache import ContentCache, MemoryCacheBackend
+from biasight.limit import RateLimiter
+from biasight.notify import Notification, QueuedNotifier, TelegramNotifier
+from biasight.parse import ParsedPage
+from biasight.service import AnalysisService
+from tests.test_service import GEMINI_REPLY
+
+TELEGRAM_LATENCY = 1.0
+
+
+class SlowTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SlowTelegramHandler)
+        self.messages = []
+
+
+class SlowTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        time.sleep(TELEGRAM_LATENCY)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.messages.append(parse_qs(body.decode())['text'][0])
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *_):
+        pass
+
+
+class RecordingNotifier(QueuedNotifier):
+
+    def __init__(self, send_seconds: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.send_seconds = send_seconds
+        self.batches = []
+        self.send_times = []
+
+    async def _send(self, notifications: list[Notification]):
+        self.send_times.append(time.monotonic())
+        await asyncio.sleep(self.send_seconds)
+        self.batches.append([notification.uri for notification in notifications])
+
+
+class TestQueuedNotifier(unittest.IsolatedAsyncioTestCase):
+
+    async def test_notifications_are_batched(self):
+        notifier = RecordingNotifier(batch_size=2, batch_interval=0.05, min_interval=0)
+        for uri in 'abcde':
+            notifier.notify_analysis(uri)
+        await notifier.aclose()
+
+        self.assertEqual([['a', 'b'], ['c', 'd'], ['e']], notifier.batches)
+        self.assertEqual((5, 3, 0), (notifier.sent, notifier.messages, notifier.dropped))
+
+    async def test_overflow(self):
+        for overflow, expected in [('drop_oldest', ['c', 'd']), ('drop_newest', ['a', 'b'])]:
+            notifier = RecordingNotifier(queue_size=2, batch_interval=0, min_interval=0, overflow=overflow)
+            # the worker does not run before the test awaits, so the queue fills up
+            for uri in 'abcd':
+                notifier.notify_analysis(uri)
+            await notifier.aclose()
+
+            self.assertEqual([expected], notifier.batches)
+            self.assertEqual(2, notifier.dropped)
+
+    async def test_rate_cap(self):
+        notifier = RecordingNotifier(batch_size=1, batch_interval=0, min_interval=0.1)
+        for uri in 'abc':
+            notifier.notify_analysis(uri)
+        await notifier.aclose()
+
+        self.assertEqual(3, len(notifier.send_times))
+        for previous, current in zip(notifier.send_times, notifier.send_times[1:]):
+            self.assertGreaterEqual(current - previous, 0.09)
+
+    async def test_send_failures_are_counted(self):
+        notifier = RecordingNotifier(batch_interval=0, min_interval=0)
+        notifier._send = AsyncMock(side_effect=RuntimeError('unavailable'))
+        notifier.notify_analysis('a')
+        await notifier.aclose()
+
+        self.assertEqual((0, 1), (notifier.sent, notifier.failed))
+
+    async def test_flush_timeout(self):
+        notifier = RecordingNotifier(send_seconds=10, batch_size=1, batch_interval=0, min_interval=0, flush_timeout=0.1)
+        notifier.notify_analysis('a')
+        notifier.notify_analysis('b')
+
+        start = time.monotonic()
+        await notifier.aclose()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(1, notifier.dropped)
+
+
+class TestTelegramNotifier(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = SlowTelegramServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    async def test_request_latency_does_not_depend_on_notifier(self):
+        notifier = TelegramNotifier(
+            'token',
+            '1',
+            api_url=f'http://127.0.0.1:{self.server.server_address[1]}',
+            batch_interval=0.05,
+            min_interval=0
+        )
+        web_parser = Mock()
+        web_parser.parse_page = AsyncMock(side_effect=lambda uri: ParsedPage(uri, f'Text of {uri}'))
+        llm_backend = Mock()
+        llm_backend.get_chat_response_async = AsyncMock(return_value=GEMINI_REPLY)
+        bias_analyzer = BiasAnalyzer(llm_backend)
+        service = AnalysisService(
+            web_parser,
+            bias_analyzer,
+            RateLimiter(100),
+            notifier,
+            MemoryCacheBackend(10, 60),
+            ContentCache(MemoryCacheBackend(10, 60), 'model', bias_analyzer.prompt_fingerprint)
+        )
+
+        uris = [f'https://example.com/{i}' for i in range(3)] * 2
+        latencies = []
+        for uri in uris:
+            start = time.monotonic()
+            await service.analyze(uri)
+            latencies.append(time.monotonic() - start)
+
+        self.assertLess(max(latencies), TELEGRAM_LATENCY / 4)
+
+        await notifier.aclose()
+        self.assertEqual(6, notifier.sent)
+        self.assertEqual(6, sum(message.count('https://example.com/') for message in self.server.messages))
+        self.assertIn('https://example.com/0 (cache hit)', self.server.messages[-1])
@@ -0,0 +1,178 @@
+import gzip
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from biasight.cache import MemoryCacheBackend
+from biasight.parse import AsyncWebParser, WebParser, retryable_fetch_error
+from biasight.resilience import RetryPolicy
+
+PAGE = ('<html><head><title>Title</title></head><body>' + '<p>She is an engineer.</p>' * 500 + '</body></html>').encode()
+ETAG = '"v1"'
+UNICODE_PAGE = ('<html><body><p>' + 'Ingenieurin für Brücken ' * 200 + '</p></body></html>').encode()
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), CountingHandler)
+        self.connections = 0
+        self.bytes_sent = 0
+        self.statuses = []
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == '/unicode':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self._respond(200, UNICODE_PAGE)
+            return
+
+        if self.headers.get('If-None-Match') == ETAG:
+            self._respond(304, b'')
+            return
+
+        body = PAGE
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', ETAG)
+        self._respond(200, body)
+
+    def _respond(self, status: int, body: bytes):
+        if status != 200:
+            self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        # recorded before responding, the client may check the counters as soon as it has the response
+        self.server.bytes_sent += len(body)
+        self.server.statuses.append(status)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = CountingServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.uri = f'http://127.0.0.1:{self.server.server_address[1]}/page'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def assert_revalidated(self, first: str, second: str):
+        self.assertIn('She is an engineer.', first)
+        self.assertEqual(first, second)
+        self.assertEqual([200, 304], self.server.statuses)
+        # the page is transferred once and compressed, the second request reuses the connection
+        self.assertEqual(len(gzip.compress(PAGE)), self.server.bytes_sent)
+        self.assertLess(self.server.bytes_sent, len(PAGE) / 10)
+        self.assertEqual(1, self.server.connections)
+
+
+class TestWebParser(ServerTestCase):
+
+    def test_revalidates_with_pooled_session(self):
+        web_parser = WebParser(1048576, 8192, validators=MemoryCacheBackend(10, 60))
+
+        first = web_parser.parse(self.uri)
+        second = web_parser.parse(self.uri)
+        web_parser.close()
+
+        self.assert_revalidated(first, second)
+
+    def test_content_length_is_counted_in_bytes(self):
+        web_parser = WebParser(1000, 256)
+
+        text = web_parser.parse(self.uri.replace('/page', '/unicode'))
+        web_parser.close()
+
+        self.assertTrue(text.startswith('Ingenieurin für Brücken'))
+        self.assertLessEqual(len(text.encode()), 1000)
+        self.assertNotIn('\N{REPLACEMENT CHARACTER}', text)
+
+    def test_stops_at_text_budget(self):
+        web_parser = WebParser(1048576, 256, max_text_length=100)
+
+        text = web_parser.parse(self.uri.replace('/page', '/unicode'))
+        web_parser.close()
+
+        self.assertEqual(100, len(text))
+
+
+class TestAsyncWebParser(ServerTestCase, unittest.IsolatedAsyncioTestCase):
+
+    async def test_revalidates_with_pooled_client(self):
+        web_parser = AsyncWebParser(1048576, 8192, validators=MemoryCacheBackend(10, 60))
+
+        first = await web_parser.parse(self.uri)
+        second = await web_parser.parse(self.uri)
+        await web_parser.aclose()
+
+        self.assert_revalidated(first, second)
+
+    async def test_without_validators_downloads_again(self):
+        web_parser = AsyncWebParser(1048576, 8192)
+
+        await web_parser.parse(self.uri)
+        await web_parser.parse(self.uri)
+        await web_parser.aclose()
+
+        self.assertEqual([200, 200], self.server.statuses)
+
+    async def test_invalid_uri(self):
+        web_parser = AsyncWebParser(1048576, 8192)
+
+        # the service answers 400 for pages that could not be parsed
+        for uri in ['http://example.com:99999/', 'http://example.com:abc/', 'http://[::1', 'http://[::1]x/']:
+            self.assertIsNone(await web_parser.parse_page(uri))
+        await web_parser.aclose()
+
+
+class TestFetchRetries(unittest.IsolatedAsyncioTestCase):
+
+    async def parse(self, statuses: list[int]) -> tuple[str | None, int]:
+        responses = iter(statuses)
+        requests = 0
+
+        def handler(_: httpx.Request) -> httpx.Response:
+            nonlocal requests
+            requests += 1
+            return httpx.Response(next(responses), content=PAGE)
+
+        web_parser = AsyncWebParser(
+            1048576,
+            8192,
+            httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            retry_policy=RetryPolicy('Fetch', base_delay=0.01, retryable=retryable_fetch_error)
+        )
+        text = await web_parser.parse('https://example.com/')
+        await web_parser.aclose()
+        return text, requests
+
+    async def test_transient_errors_are_retried(self):
+        text, requests = await self.parse([503, 502, 200])
+        self.assertIn('She is an engineer.', text)
+        self.assertEqual(3, requests)
+
+    async def test_client_errors_are_not_retried(self):
+        self.assertEqual((None, 1), await self.parse([404]))
+
+    async def test_gives_up_after_attempts(self):
+        self.assertEqual((None, 3), await self.parse([503] * 5))
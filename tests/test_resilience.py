@@ -0,0 +1,143 @@
+import asyncio
+import time
+import unittest
+
+from biasight.resilience import CircuitBreaker, CircuitOpenError, Hedger, RetryPolicy
+
+
+class Flaky:
+
+    def __init__(self, failures: int, error: Exception | None = None, seconds: float = 0.0):
+        self.failures = failures
+        self.error = error or ConnectionError('unavailable')
+        self.seconds = seconds
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.seconds)
+        if self.calls <= self.failures:
+            raise self.error
+        return 'ok'
+
+
+class TestRetryPolicy(unittest.IsolatedAsyncioTestCase):
+
+    async def test_retries_until_success(self):
+        policy = RetryPolicy('test', attempts=3, base_delay=0.01)
+        flaky = Flaky(2)
+
+        self.assertEqual('ok', await policy.run(flaky))
+        self.assertEqual((3, 2), (flaky.calls, policy.retries))
+
+    async def test_gives_up_after_attempts(self):
+        policy = RetryPolicy('test', attempts=2, base_delay=0.01)
+        flaky = Flaky(5)
+
+        with self.assertRaises(ConnectionError):
+            await policy.run(flaky)
+        self.assertEqual(2, flaky.calls)
+
+    async def test_errors_that_are_not_retryable(self):
+        policy = RetryPolicy('test', base_delay=0.01, retryable=lambda e: not isinstance(e, ValueError))
+        flaky = Flaky(1, ValueError('bad request'))
+
+        with self.assertRaises(ValueError):
+            await policy.run(flaky)
+        self.assertEqual(1, flaky.calls)
+
+    async def test_deadline(self):
+        policy = RetryPolicy('test', attempts=10, base_delay=0.01, deadline=0.1)
+        flaky = Flaky(10, seconds=0.04)
+
+        start = time.monotonic()
+        with self.assertRaises((ConnectionError, TimeoutError)):
+            await policy.run(flaky)
+        self.assertLess(time.monotonic() - start, 0.2)
+        self.assertLess(flaky.calls, 4)
+
+    def test_backoff_is_exponential_with_jitter(self):
+        policy = RetryPolicy('test', base_delay=1.0, max_delay=5.0, seed=1)
+        delays = [[policy.delay(attempt) for _ in range(200)] for attempt in range(5)]
+
+        self.assertLessEqual(max(delays[0]), 1.0)
+        self.assertLessEqual(max(delays[1]), 2.0)
+        self.assertGreater(max(delays[1]), 1.0)
+        self.assertLessEqual(max(delays[4]), 5.0)
+        self.assertGreater(len(set(delays[0])), 100)
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+
+    async def test_opens_and_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                await breaker.call(Flaky(1))
+        self.assertEqual('open', breaker.state)
+
+        # calls fail fast while open
+        flaky = Flaky(0)
+        with self.assertRaises(CircuitOpenError):
+            await breaker.call(flaky)
+        self.assertEqual((0, 1), (flaky.calls, breaker.rejected))
+
+        await asyncio.sleep(0.06)
+        self.assertEqual('ok', await breaker.call(flaky))
+        self.assertEqual(('closed', 0), (breaker.state, breaker.consecutive_failures))
+
+    async def test_failed_trial_opens_again(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        with self.assertRaises(ConnectionError):
+            await breaker.call(Flaky(1))
+
+        await asyncio.sleep(0.06)
+        with self.assertRaises(ConnectionError):
+            await breaker.call(Flaky(1))
+        self.assertEqual(('open', 2), (breaker.state, breaker.opened))
+
+    async def test_single_trial_while_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        with self.assertRaises(ConnectionError):
+            await breaker.call(Flaky(1))
+        await asyncio.sleep(0.06)
+
+        trial = asyncio.create_task(breaker.call(Flaky(0, seconds=0.02)))
+        await asyncio.sleep(0)
+        with self.assertRaises(CircuitOpenError):
+            await breaker.call(Flaky(0))
+        self.assertEqual('ok', await trial)
+
+
+class TestHedger(unittest.IsolatedAsyncioTestCase):
+
+    async def test_no_hedge_without_latencies(self):
+        hedger = Hedger(percentile=50, min_samples=3)
+        flaky = Flaky(0, seconds=0.05)
+
+        self.assertEqual('ok', await hedger.run(flaky))
+        self.assertEqual((1, 0), (flaky.calls, hedger.hedges))
+
+    async def test_slow_call_is_hedged(self):
+        hedger = Hedger(percentile=50, min_samples=3)
+        hedger.latencies.extend([0.01] * 3)
+        delays = iter([1.0, 0.01])
+
+        async def call() -> float:
+            delay = next(delays)
+            await asyncio.sleep(delay)
+            return delay
+
+        start = time.monotonic()
+        self.assertEqual(0.01, await hedger.run(call))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual((1, 1), (hedger.hedges, hedger.hedge_wins))
+
+    async def test_failed_call_is_covered_by_hedge(self):
+        hedger = Hedger(percentile=50, min_samples=3)
+        hedger.latencies.extend([0.01] * 3)
+        flaky = Flaky(1, seconds=0.03)
+
+        self.assertEqual('ok', await hedger.run(flaky))
+        self.assertEqual(2, flaky.calls)
@@ -0,0 +1,426 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+from fastapi import HTTPException
+
+from biasight.admission import AdmissionController
+from biasight.bias import BiasAnalyzer
+from biasight.cache import ContentCache, MemoryCacheBackend
+from biasight.clean import ContentCleaner
+from biasight.extract import Block
+from biasight.flight import SingleFlight
+from biasight.lexicon import GenderLexicon
+from biasight.limit import RateLimiter
+from biasight.model import AnalyzeResponse
+from biasight.notify import NoopNotifier
+from biasight.parse import ParsedPage
+from biasight.resilience import CircuitBreaker, RetryPolicy
+from biasight.service import AnalysisService
+from biasight.similar import SimilarityIndex
+
+GEMINI_REPLY = json.dumps({
+    'summary': 'x',
+    'stereotyping_feedback': 'x',
+    'stereotyping_score': 10,
+    'stereotyping_example': 'x',
+    'representation_feedback': 'x',
+    'representation_score': 10,
+    'representation_example': 'x',
+    'language_feedback': 'x',
+    'language_score': 10,
+    'language_example': 'x',
+    'framing_feedback': 'x',
+    'framing_score': 10,
+    'framing_example': 'x',
+    'positive_aspects': 'x',
+    'improvement_suggestions': 'x',
+    'male_to_female_mention_ratio': 0,
+    'gender_neutral_language_percentage': 0
+})
+
+
+class TestAnalysisService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        async def slow_reply(*_):
+            await asyncio.sleep(0.05)
+            return GEMINI_REPLY
+
+        self.gemini_client = Mock()
+        self.gemini_client.get_chat_response_async = AsyncMock(side_effect=slow_reply)
+        self.web_parser = Mock()
+        self.web_parser.parse_page = AsyncMock(return_value=ParsedPage('https://example.com/', 'Some page text'))
+        self.rate_limiter = RateLimiter(100)
+        bias_analyzer = BiasAnalyzer(self.gemini_client)
+        self.service = AnalysisService(
+            self.web_parser,
+            bias_analyzer,
+            self.rate_limiter,
+            NoopNotifier(),
+            MemoryCacheBackend(10, 60),
+            ContentCache(MemoryCacheBackend(10, 60), 'model', bias_analyzer.prompt_fingerprint)
+        )
+
+    async def test_concurrent_requests_are_coalesced(self):
+        uris = ['https://example.com/page', 'HTTPS://Example.com:443/page#top'] * 10
+
+        responses = await asyncio.gather(*(self.service.analyze(uri) for uri in uris))
+
+        self.assertEqual(1, self.gemini_client.get_chat_response_async.await_count)
+        self.assertEqual(1, self.web_parser.parse_page.await_count)
+        self.assertEqual(1, self.rate_limiter.usage)
+        self.assertEqual(1, self.service.flight.leaders)
+        self.assertEqual(19, self.service.flight.coalesced)
+        self.assertEqual(uris, [response.uri for response in responses])
+        self.assertEqual(0, self.service.flight.in_flight)
+
+    async def test_leader_failure_is_shared(self):
+        self.web_parser.parse_page.return_value = None
+
+        results = await asyncio.gather(
+            *(self.service.analyze('https://example.com/') for _ in range(5)),
+            return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, HTTPException) for result in results))
+        self.assertEqual(1, self.web_parser.parse_page.await_count)
+        self.assertEqual(1, self.service.flight.failures)
+
+        # failures are not cached, the next request starts a new analysis
+        self.web_parser.parse_page.return_value = ParsedPage('https://example.com/', 'Some page text')
+        await self.service.analyze('https://example.com/')
+        self.assertEqual(2, self.web_parser.parse_page.await_count)
+
+    async def test_rate_limit_of_the_leader_is_not_shared(self):
+        self.service.rate_limiter = RateLimiter(1)
+        await self.service.analyze('https://example.com/a', 'ip:10.0.0.1')
+
+        self.web_parser.parse_page.return_value = ParsedPage('https://example.com/b', 'Other page text')
+        limited, response = await asyncio.gather(
+            self.service.analyze('https://example.com/b', 'ip:10.0.0.1'),
+            self.service.analyze('https://example.com/b', 'ip:10.0.0.2'),
+            return_exceptions=True
+        )
+
+        self.assertEqual(429, limited.status_code)
+        self.assertEqual('https://example.com/b', response.uri)
+        self.assertEqual(2, self.gemini_client.get_chat_response_async.await_count)
+
+    async def test_rate_limit_of_the_streaming_leader_is_not_shared(self):
+        self.slow_stream()
+        self.service.rate_limiter = RateLimiter(1)
+        await self.stream('https://example.com/a')
+
+        async def slow_parse(uri):
+            await asyncio.sleep(0.02)
+            return ParsedPage(uri, 'Other page text')
+
+        self.web_parser.parse_page.side_effect = slow_parse
+        limited, events = await asyncio.gather(
+            self.stream('https://example.com/b'),
+            self.later(self.stream_as('https://example.com/b', 'ip:10.0.0.2')),
+            return_exceptions=True
+        )
+
+        self.assertEqual(429, limited.status_code)
+        # the stages are sent once, though the analysis started over
+        self.assertEqual(
+            ['fetched', 'extracted', 'llm_started'],
+            [data['stage'] for event, data in events if event == 'stage']
+        )
+        self.assertEqual('result', events[-1][0])
+
+    async def test_cache_hit_is_served_encoded(self):
+        first = await self.service.analyze_json('https://example.com/page')
+        await asyncio.sleep(0.01)
+        second = await self.service.analyze_json('HTTPS://Example.com/page#top')
+        self.assertEqual(1, self.web_parser.parse_page.await_count)
+        other = await self.service.analyze('https://example.com/other')
+
+        first, second = json.loads(first), json.loads(second)
+        self.assertEqual('https://example.com/page', first['uri'])
+        self.assertEqual('HTTPS://Example.com/page#top', second['uri'])
+        # the hit keeps the time of the analysis, every analysis gets its own
+        self.assertEqual(first['created_at'], second['created_at'])
+        self.assertGreater(other.created_at.isoformat(), first['created_at'])
+        self.assertEqual(first['result'], second['result'])
+
+    async def test_cache_hit_of_an_entry_with_uri(self):
+        # entries were cached with the URI of the analyzed request before
+        response = await self.service.analyze('https://example.com/page')
+        self.service.result_cache.set('https://example.com/page', response.model_dump_json().encode())
+
+        hit = await self.service.analyze_json('https://example.com/page#top')
+
+        self.assertEqual(1, hit.count(b'"uri"'))
+        self.assertEqual(
+            response.model_copy(update={'uri': 'https://example.com/page#top'}),
+            AnalyzeResponse.model_validate_json(hit)
+        )
+        self.assertEqual(1, self.web_parser.parse_page.await_count)
+
+    async def test_same_content_is_analyzed_once(self):
+        first = await self.service.analyze('https://example.com/article?utm_source=a')
+        second = await self.service.analyze('https://mirror.example.org/article')
+
+        self.assertEqual(1, self.gemini_client.get_chat_response_async.await_count)
+        self.assertEqual(2, self.web_parser.parse_page.await_count)
+        self.assertEqual(first.result, second.result)
+        self.assertEqual(1, self.service.content_cache.hits)
+        self.assertEqual(1, self.rate_limiter.usage)
+
+    async def test_near_duplicate_reuses_the_analysis(self):
+        self.service.similar_pages = SimilarityIndex(min_words=10)
+        text = ' '.join(f'word{chr(97 + i % 26)}{chr(97 + i // 26)}' for i in range(200))
+        self.web_parser.parse_page.side_effect = [
+            ParsedPage('https://example.com/a', text),
+            ParsedPage('https://example.com/b', f'{text} Last updated 3 May 2024'),
+            ParsedPage('https://example.com/c', 'A different page ' * 20)
+        ]
+
+        first = await self.service.analyze('https://example.com/a')
+        second = await self.service.analyze('https://example.com/b')
+        third = await self.service.analyze('https://example.com/c')
+
+        self.assertEqual(2, self.gemini_client.get_chat_response_async.await_count)
+        self.assertEqual(first.result, second.result)
+        self.assertEqual('https://example.com/a', second.derived_from)
+        self.assertGreater(second.similarity, 0.95)
+        self.assertIsNone(first.derived_from)
+        self.assertIsNone(third.derived_from)
+        self.assertEqual(2, len(self.service.similar_pages))
+        # the near-duplicate is a single miss of the content cache, though its analysis is reused
+        content_cache = self.service.content_cache
+        self.assertEqual((0, 3), (content_cache.hits, content_cache.misses))
+        self.assertGreater(content_cache.saved_llm_seconds, 0)
+
+    async def test_near_duplicate_counts_its_own_language(self):
+        self.service.similar_pages = SimilarityIndex(min_words=10)
+        self.service.bias_analyzer.lexicon = GenderLexicon()
+        self.service.bias_analyzer.lexicon_mode = 'replace'
+        text = ' '.join(f'word{chr(97 + i % 26)}{chr(97 + i // 26)}' for i in range(200))
+        self.web_parser.parse_page.side_effect = [
+            ParsedPage('https://example.com/a', text),
+            ParsedPage('https://example.com/b', f'{text} his brother')
+        ]
+
+        first = await self.service.analyze('https://example.com/a')
+        second = await self.service.analyze('https://example.com/b')
+
+        self.assertEqual('https://example.com/a', second.derived_from)
+        self.assertEqual(1, self.gemini_client.get_chat_response_async.await_count)
+        self.assertEqual(0, first.result.language_metrics.male_mentions)
+        self.assertEqual(2, second.result.language_metrics.male_mentions)
+        self.assertNotEqual(first.result.male_to_female_mention_ratio, second.result.male_to_female_mention_ratio)
+        self.assertEqual(
+            second.result.language_metrics.male_to_female_mention_ratio,
+            second.result.male_to_female_mention_ratio
+        )
+        self.assertEqual(first.result.stereotyping_score, second.result.stereotyping_score)
+
+    async def test_quick_analysis_does_not_call_the_llm(self):
+        self.service.quick_rate_limiter = quick_rate_limiter = RateLimiter(1)
+        self.service.quick_cache = MemoryCacheBackend(10, 60)
+        self.web_parser.parse_page.return_value = ParsedPage('https://example.com/', 'She and her brother')
+
+        response = await self.service.analyze_quick('https://example.com/')
+
+        self.assertEqual((1, 2), (response.language_metrics.male_mentions, response.language_metrics.female_mentions))
+        self.assertEqual(0, self.gemini_client.get_chat_response_async.await_count)
+        self.assertEqual((0, 1), (self.rate_limiter.usage, quick_rate_limiter.usage))
+
+        # cached counts are neither fetched again nor limited
+        cached = await self.service.analyze_quick('HTTPS://Example.com/#top')
+        self.assertEqual('HTTPS://Example.com/#top', cached.uri)
+        self.assertEqual(response.language_metrics, cached.language_metrics)
+        self.assertEqual(1, self.web_parser.parse_page.await_count)
+
+        with self.assertRaises(HTTPException) as raised:
+            await self.service.analyze_quick('https://example.com/other')
+        self.assertEqual(429, raised.exception.status_code)
+        self.assertEqual(1, self.web_parser.parse_page.await_count)
+
+    async def test_cleaned_text_is_analyzed(self):
+        self.service.content_cleaner = ContentCleaner(min_words=1)
+        self.web_parser.parse_page.return_value = ParsedPage(
+            'https://example.com/',
+            'Home Jobs Some page text',
+            blocks=[Block('Home Jobs', 9, 'menu'), Block('Some page text')]
+        )
+
+        await self.service.analyze('https://example.com/')
+
+        prompt = self.gemini_client.get_chat_response_async.await_args.args[1]
+        self.assertIn('Some page text', prompt)
+        self.assertNotIn('Home Jobs', prompt)
+        self.assertEqual(10, self.service.content_cleaner.saved_characters)
+
+    async def test_stream(self):
+        async def stream_reply(*_):
+            for i in range(0, len(GEMINI_REPLY), 16):
+                yield GEMINI_REPLY[i:i + 16]
+
+        self.gemini_client.stream_chat_response_async = stream_reply
+
+        events = [event async for event in self.service.analyze_stream('https://example.com/')]
+
+        names = [event for event, _ in events]
+        self.assertEqual(['stage', 'stage', 'stage'], names[:3])
+        self.assertEqual(['fetched', 'extracted', 'llm_started'], [data['stage'] for _, data in events[:3]])
+        self.assertEqual(
+            ['stereotyping', 'representation', 'language', 'framing'],
+            [data['category'] for event, data in events if event == 'category']
+        )
+        self.assertEqual({'score': 10, 'feedback': 'x', 'example': 'x'}, {
+            key: value for key, value in events[4][1].items() if key != 'category'
+        })
+        self.assertEqual(
+            ['summary', 'positive_aspects', 'improvement_suggestions', 'male_to_female_mention_ratio',
+             'gender_neutral_language_percentage'],
+            [data['name'] for event, data in events if event == 'field']
+        )
+        self.assertEqual(('result', 10), (names[-1], events[-1][1]['result']['overall_score']))
+        self.assertEqual(1, self.rate_limiter.usage)
+
+        # the result is cached like one of /analyze
+        events = [event async for event in self.service.analyze_stream('https://example.com/')]
+        self.assertEqual(['result'], [event for event, _ in events])
+        response = await self.service.analyze('https://example.com/')
+        self.assertEqual(10, response.result.overall_score)
+        self.assertEqual(1, self.rate_limiter.usage)
+
+    def slow_stream(self) -> list:
+        calls = []
+
+        async def stream_reply(*_):
+            calls.append(1)
+            for i in range(0, len(GEMINI_REPLY), 16):
+                await asyncio.sleep(0.001)
+                yield GEMINI_REPLY[i:i + 16]
+
+        self.gemini_client.stream_chat_response_async = stream_reply
+        return calls
+
+    async def stream(self, uri: str) -> list:
+        return await self.stream_as(uri)
+
+    async def stream_as(self, uri: str, client: str = 'default') -> list:
+        return [event async for event in self.service.analyze_stream(uri, client)]
+
+    @staticmethod
+    async def later(awaitable):
+        # starts once the first call is in flight
+        await asyncio.sleep(0.01)
+        return await awaitable
+
+    async def test_concurrent_streams_are_coalesced(self):
+        calls = self.slow_stream()
+
+        first, second = await asyncio.gather(
+            self.stream('https://example.com/page'),
+            self.later(self.stream('HTTPS://Example.com/page#top'))
+        )
+
+        # the later stream replays the events it missed
+        self.assertEqual(first[:-1], second[:-1])
+        self.assertIn('llm_started', [data.get('stage') for _, data in second])
+        self.assertEqual(('result', 'HTTPS://Example.com/page#top'), (second[-1][0], second[-1][1]['uri']))
+        self.assertEqual(first[-1][1]['result'], second[-1][1]['result'])
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, self.rate_limiter.usage)
+        self.assertEqual(1, self.service.flight.coalesced)
+        self.assertEqual(0, self.service.flight.in_flight)
+        self.assertEqual({}, self.service.streams)
+
+    async def test_streams_and_requests_share_analyses(self):
+        calls = self.slow_stream()
+
+        # a request waits for a streamed analysis
+        events, response = await asyncio.gather(
+            self.stream('https://example.com/a'),
+            self.later(self.service.analyze('https://example.com/a'))
+        )
+        self.assertEqual(('result', 10), (events[-1][0], response.result.overall_score))
+        self.assertEqual(1, len(calls))
+
+        # a stream waits for the analysis of a request, it has no events to replay
+        self.web_parser.parse_page.return_value = ParsedPage('https://example.com/b', 'Other page text')
+        response, events = await asyncio.gather(
+            self.service.analyze('https://example.com/b'),
+            self.later(self.stream('https://example.com/b'))
+        )
+        self.assertEqual(['result'], [event for event, _ in events])
+        self.assertEqual(response.model_dump(mode='json'), events[0][1])
+        self.assertEqual(1, self.gemini_client.get_chat_response_async.await_count)
+        self.assertEqual(2, self.rate_limiter.usage)
+
+    async def test_llm_errors_are_retried_without_fetching_again(self):
+        self.service.bias_analyzer.retry_policy = RetryPolicy('LLM call', base_delay=0.01)
+        # a failed call and a malformed reply
+        self.gemini_client.get_chat_response_async.side_effect = [
+            ConnectionError('unavailable'),
+            '{"summary":',
+            GEMINI_REPLY
+        ]
+
+        response = await self.service.analyze('https://example.com/')
+
+        self.assertEqual(10, response.result.overall_score)
+        self.assertEqual(3, self.gemini_client.get_chat_response_async.await_count)
+        self.assertEqual(1, self.web_parser.parse_page.await_count)
+        self.assertEqual(1, self.rate_limiter.usage)
+
+    async def test_open_circuit_fails_fast(self):
+        self.service.bias_analyzer.circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.gemini_client.get_chat_response_async.side_effect = ConnectionError('unavailable')
+
+        with self.assertRaises(HTTPException) as context:
+            await self.service.analyze('https://example.com/first')
+        self.assertEqual(500, context.exception.status_code)
+
+        with self.assertRaises(HTTPException) as context:
+            await self.service.analyze('https://example.com/second')
+        self.assertEqual(503, context.exception.status_code)
+        self.assertEqual('60', context.exception.headers['Retry-After'])
+        self.assertEqual(1, self.gemini_client.get_chat_response_async.await_count)
+
+    async def test_analyses_are_shed_when_the_llm_queue_is_full(self):
+        self.web_parser.parse_page.side_effect = lambda uri: ParsedPage(uri, f'Text of {uri}')
+        self.service.admission = AdmissionController(max_concurrent=1, queue_size=1)
+        await self.service.analyze('https://example.com/cached')
+
+        results = await asyncio.gather(
+            *(self.service.analyze(f'https://example.com/{i}') for i in range(3)),
+            self.service.analyze('https://example.com/cached'),
+            return_exceptions=True
+        )
+
+        # one analysis runs, one waits, one is shed and the cached result does not wait at all
+        self.assertEqual(10, results[0].result.overall_score)
+        self.assertEqual(10, results[1].result.overall_score)
+        self.assertEqual(503, results[2].status_code)
+        self.assertEqual('1', results[2].headers['Retry-After'])
+        self.assertEqual('https://example.com/cached', results[3].uri)
+        # shed requests are not counted by the rate limiter
+        self.assertEqual(3, self.rate_limiter.usage)
+        self.assertEqual((0, 0), (self.service.admission.active, self.service.admission.queued))
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cancelled_caller_does_not_cancel_shared_work(self):
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 42
+
+        leader = asyncio.create_task(flight.do('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do('key', work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual((42, True), await follower)
@@ -0,0 +1,92 @@
+import random
+import unittest
+
+from biasight.similar import SimilarityIndex, similarity, simhash
+
+VOCABULARY = [''.join(random.Random(i).choices('abcdefghijklmnopqrstuvwxyz', k=6)) for i in range(2000)]
+
+
+def page(seed: int, words: int = 400) -> str:
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def edit(text: str, changes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return ' '.join(words)
+
+
+class TestSimHash(unittest.TestCase):
+
+    def test_small_edits_keep_the_fingerprint_close(self):
+        text = page(1)
+
+        self.assertEqual(simhash(text), simhash(text.upper()))
+        # numbers and punctuation do not count
+        self.assertEqual(simhash(text)[0], simhash(f'{text}, 12. 2024')[0])
+        self.assertGreater(similarity(simhash(text)[0], simhash(edit(text, 2))[0]), 0.9)
+        self.assertLess(similarity(simhash(text)[0], simhash(page(2))[0]), 0.8)
+
+    def test_short_text(self):
+        self.assertEqual((0, 0), simhash('two words'))
+        self.assertEqual(1, simhash('three words here')[1])
+
+
+class TestSimilarityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SimilarityIndex(max_distance=3, max_entries=3, min_words=50)
+
+    def test_near_duplicate_is_found(self):
+        text = page(1)
+        self.index.put(self.index.fingerprint(text), 'key', 'https://example.com/')
+
+        similar = self.index.get(self.index.fingerprint(edit(text, 1)))
+
+        self.assertEqual(('key', 'https://example.com/'), (similar.key, similar.uri))
+        self.assertGreaterEqual(similar.similarity, 1 - 3 / 64)
+        self.assertIsNone(self.index.get(self.index.fingerprint(page(2))))
+        self.assertEqual((1, 1), (self.index.hits, self.index.misses))
+
+    def test_every_fingerprint_within_max_distance_is_found(self):
+        rng = random.Random(0)
+        fingerprint = rng.getrandbits(64)
+        self.index.put(fingerprint, 'key', 'uri')
+
+        for _ in range(200):
+            bits = rng.sample(range(64), 3)
+            near = fingerprint ^ sum(1 << bit for bit in bits)
+            far = near ^ 1 << next(bit for bit in range(64) if bit not in bits)
+            self.assertEqual(3, self.index.nearest(near)[1])
+            self.assertIsNone(self.index.nearest(far))
+
+    def test_nearest_fingerprint_wins(self):
+        self.index.put(0b111, 'far', 'uri')
+        self.index.put(0b1, 'near', 'uri')
+
+        self.assertEqual('near', self.index.get(0).key)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        # 32 bits apart from each other
+        for i in range(3):
+            self.index.put(0xffff << i * 16, f'key-{i}', 'uri')
+        self.index.get(0xffff)
+        self.index.put(0xffff << 48, 'key-3', 'uri')
+
+        self.assertEqual(3, len(self.index))
+        self.assertEqual(1, self.index.evictions)
+        self.assertIsNone(self.index.nearest(0xffff << 16))
+        self.assertEqual('key-0', self.index.get(0xffff).key)
+        # evicted fingerprints are removed from every band
+        self.assertEqual(3, sum(len(bucket) for bucket in self.index.tables[0].values()))
+
+    def test_short_texts_are_not_fingerprinted(self):
+        self.assertIsNone(self.index.fingerprint(page(1, words=40)))
+        self.assertIsNotNone(self.index.fingerprint(page(1, words=60)))
+
+    def test_max_distance_is_validated(self):
+        with self.assertRaises(ValueError):
+            SimilarityIndex(max_distance=32)
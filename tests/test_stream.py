@@ -0,0 +1,40 @@
+import json
+import unittest
+
+from biasight.stream import JSONObjectStream, sse_event
+
+DOCUMENT = {
+    'summary': 'Quotes " and braces { } [ ], commas, and a backslash \\\\ stay in the string',
+    'stereotyping_score': 95,
+    'nested': {'list': [1, 2, {'a': 'b'}], 'empty': {}},
+    'ratio': 0.5,
+    'flag': True,
+    'nothing': None,
+    'unicode': 'café ☃'
+}
+
+
+class TestJSONObjectStream(unittest.TestCase):
+
+    def test_members_for_any_chunking(self):
+        text = json.dumps(DOCUMENT, indent=1)
+        for size in [1, 2, 3, 7, 64, len(text)]:
+            parser = JSONObjectStream()
+            members = []
+            for i in range(0, len(text), size):
+                members.extend(parser.feed(text[i:i + size]))
+            self.assertEqual(list(DOCUMENT.items()), members, size)
+            self.assertEqual(text, parser.text)
+
+    def test_member_is_returned_once_complete(self):
+        parser = JSONObjectStream()
+
+        self.assertEqual([], parser.feed('{"summary": "x'))
+        self.assertEqual([('summary', 'x')], parser.feed('", "score": 9'))
+        # the number might still continue, only the separator completes it
+        self.assertEqual([('score', 95)], parser.feed('5,'))
+        self.assertEqual([('example', 'y')], parser.feed(' "example": "y"}'))
+        self.assertEqual([], parser.feed(' trailing'))
+
+    def test_sse_event(self):
+        self.assertEqual('event: field\ndata: {"name": "a\\nb"}\n\n', sse_event('field', {'name': 'a\nb'}))
@@ -0,0 +1,18 @@
+import unittest
+
+from biasight.util import normalize_uri
+
+
+class TestNormalizeUri(unittest.TestCase):
+
+    def test_normalize_uri(self):
+        self.assertEqual('https://example.com/page', normalize_uri(' HTTPS://Example.com:443/page#top '))
+        self.assertEqual('http://example.com:8080/?a=1', normalize_uri('http://example.com:8080?a=1'))
+
+    def test_invalid_port(self):
+        self.assertEqual('http://example.com:99999/', normalize_uri('http://example.com:99999/'))
+        self.assertEqual('http://example.com:abc/', normalize_uri(' http://example.com:abc/'))
+
+    def test_ipv6(self):
+        self.assertEqual('http://[::1]:8080/', normalize_uri('http://[::1]:8080/'))
+        self.assertEqual('http://[2001:db8::1]/', normalize_uri('HTTP://[2001:DB8::1]:80'))